@@ -0,0 +1,16 @@
+"""
+Image-to-3D tooling for the WaveShooter creature models.
+Every module here is also a standalone script and imports its siblings by plain
+module name, so the package puts its own directory on sys.path. Nothing heavy
+(torch, trimesh, open3d) is imported until a command needs it.
+Unified CLI (see __main__.py):
+    python -m image_to_3d <command> [args]       # from src/utils
+    python src/utils/image_to_3d <command> [args]
+"""
+
+import os
+import sys
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+if _HERE not in sys.path:
+    sys.path.insert(0, _HERE)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Unified command line for the image-to-3D tools. Each command is the main() of one
+module, imported only when that command runs, so `--help` and light commands
+start without loading torch or trimesh.
+Meshing backends for `reconstruct`: trimesh (--mesher auto|surface),
+open3d (--mesher open3d) and TSDF fusion (--fusion tsdf).
+Run:
+    python -m image_to_3d reconstruct images/roach --model stub
+    python -m image_to_3d cache
+"""
+
+import sys
+import importlib
+
+COMMANDS = {
+    "reconstruct": ("image_to_3d_trimesh", "Multi-view images to OBJ/PLY/GLB with LODs"),
+    "single": ("image_to_3d_open3d", "One image to an Open3D alpha-shape mesh"),
+    "batch": ("batch_image_to_3d", "Reconstruct a creature roster with one shared depth model"),
+    "colmap": ("colmap_reconstruction", "Checkpointed COLMAP photogrammetry for one or more image sets"),
+    "meshroom": ("meshroom_reconstruction", "Meshroom photogrammetry with streamed logs and node timings"),
+    "glb": ("mesh_to_glb", "Photogrammetry mesh to a cropped, decimated game-ready GLB"),
+    "reduce": ("ply_reduce", "Out-of-core voxel reduction of large binary PLY clouds"),
+    "serve": ("depth_server", "Keep a depth model resident on a Unix socket"),
+    "cache": ("depth_cache", "Inspect or clear the depth-map cache"),
+    "generate": ("batch_gen_auto", "Creature x view reference images from Stable Diffusion"),
+    "gen-bench": ("sd_benchmark", "Image generation throughput per client concurrency"),
+    "drift": ("depth_drift_report", "Speed and accuracy drift of optimized depth inference"),
+}
+
+def usage():
+    lines = ["usage: image_to_3d <command> [args]", "", "commands:"]
+    lines += [f"  {name:<12} {help_text}" for name, (_, help_text) in COMMANDS.items()]
+    lines += ["", "Run `image_to_3d <command> --help` for a command's options."]
+    return "\n".join(lines)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0
+    if argv[0] not in COMMANDS:
+        print(f"image_to_3d: unknown command {argv[0]!r}\n\n{usage()}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(COMMANDS[argv[0]][0])
+    # argparse takes its prog name from argv[0]
+    sys.argv[0] = f"image_to_3d {argv[0]}"
+    return module.main(argv[1:])
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,105 +1,131 @@
-import requests
-import base64
+#!/usr/bin/env python3
+"""
+Generate multi-view reference images for the creature roster with the Stable
+Diffusion web UI img2img API (see sd_client.py).
+A config file (default generation_config.json) lists the creatures, the views and
+a prompt template; every creature x view pair becomes one prompt, e.g.
+"{description}, {view}". Per-creature entries may override "params", restrict
+"views" to a subset, add "view_descriptions" or ask for several "images_per_view"
+(seeds seed, seed + 1, ...). Output goes to <output_dir>/<creature>/<view>.png (or
+<view>_<n>.png), the layout batch_image_to_3d.py reconstructs from: images_to_3d
+takes each image's camera pose from the view in its file name
+(image_to_3d_trimesh.view_name), with a manifest.json per run.
+Each reference image is encoded once. Results are cached by payload (see
+generation_cache.py), and views that differ only in seed are sent as one
+server-side batch (--max-batch-size / --max-n-iter). Responses are decoded to
+disk as they stream in; --png-workers validates and recompresses the results.
+Run:
+    python batch_gen_auto.py [--config generation_config.json] [--creatures cockroach] [--dry-run]
+    SD_API_URL=http://127.0.0.1:7861 python batch_gen_auto.py   # against mock_sd_server.py
+"""
+
 import os
+import json
+import base64
 import zipfile
-from concurrent.futures import ThreadPoolExecutor
-import requests, base64
-
-API_URL = "http://127.0.0.1:7860/sdapi/v1/img2img"
-REFERENCE_IMAGE = "RoachSample.png"
-
-
-with open(REFERENCE_IMAGE, "rb") as f:
-    img_base64 = base64.b64encode(f.read()).decode("utf-8")
-
-payload = {
-    "prompt": "test image",
-    "init_images": [img_base64],
-    "steps": 20,
-    "width": 512,
-    "height": 512
-}
-
-response = requests.post(API_URL, json=payload)
-print(response.status_code)
-print(response.text[:500])  # Preview response
-
-
-try:
-    response = requests.get(API_URL)
-    print("Status:", response.status_code)
-    print("Response:", response.text)
-except Exception as e:
-    print("Error:", e)
-
-
-OUTPUT_DIR = "generated_images"
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-prompts = [
-    "A photorealistic image of a brown low-poly cockroach, front view, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, front-left view at 45 degrees, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, left side view, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, back-left view at 45 degrees, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, back view, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, back-right view at 45 degrees, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, right side view, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, front-right view at 45 degrees, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, top-down view, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, bottom-up view, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, close-up of head and antennae, consistent lighting, same polygonal style, high detail, sharp focus, studio background",
-    "A photorealistic image of a brown low-poly cockroach, close-up of legs and body texture, consistent lighting, same polygonal style, high detail, sharp focus, studio background"
-]
-
-params = {
-    "steps": 30,
-    "sampler_name": "DPM++ 2M Karras",
-    "cfg_scale": 7,
-    "width": 768,
-    "height": 768,
-    "seed": 1220520759,
-    "denoising_strength": 0.5
-}
-
-with open(REFERENCE_IMAGE, "rb") as img_file:
-    img_base64 = base64.b64encode(img_file.read()).decode("utf-8")
-
-def generate_image(idx, prompt):
-    payload = params.copy()
-    payload.update({
-        "prompt": prompt,
-        "init_images": [img_base64]
-    })
-
-    try:
-        response = requests.post(API_URL, json=payload)
-        if response.status_code == 200:
-            r = response.json()
-            image_base64 = r["images"][0]
-            image_data = base64.b64decode(image_base64)
-            image_path = os.path.join(OUTPUT_DIR, f"cockroach_angle_{idx}.png")
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-            print(f"✅ Saved: {image_path}")
-            return image_path
-        else:
-            print(f"❌ Failed for {idx}: {response.status_code}")
-            return None
-    except Exception as e:
-        print(f"❌ Error for {idx}: {e}")
-        return None
-
-image_paths = []
-with ThreadPoolExecutor(max_workers=4) as executor:
-    futures = [executor.submit(generate_image, idx, prompt) for idx, prompt in enumerate(prompts, start=1)]
-    for future in futures:
-        result = future.result()
-        if result:
-            image_paths.append(result)
-
-zip_path = "cockroach_angles.zip"
-with zipfile.ZipFile(zip_path, "w") as zipf:
-    for img_path in image_paths:
-        zipf.write(img_path, os.path.basename(img_path))
-
-print(f"✅ Batch generation complete. ZIP file created: {zip_path}")
\ No newline at end of file
+from pathlib import Path
+
+DEFAULT_CONFIG = Path(__file__).with_name("generation_config.json")
+DEFAULT_API_URL = os.environ.get("SD_API_URL", "http://127.0.0.1:7860")
+DEFAULT_CONCURRENCY = int(os.environ.get("SD_CONCURRENCY", "4"))
+
+def load_config(path):
+    path = Path(path)
+    with open(path) as f:
+        config = json.load(f)
+    config["root"] = path.parent
+    return config
+
+def expand_matrix(config, names=None):
+    """Single-image (output_path, payload) jobs for every creature x view x image.
+
+    Reference images are resolved relative to the config file and encoded once,
+    so all of a creature's payloads share one base64 string.
+    """
+    root = config["root"]
+    output_dir = root / config.get("output_dir", "generated_images")
+    template = config["prompt_template"]
+    encoded = {}
+    jobs = []
+    for name, creature in config["creatures"].items():
+        if names and name not in names:
+            continue
+        reference = (root / creature["reference"]).resolve()
+        if reference not in encoded:
+            encoded[reference] = base64.b64encode(reference.read_bytes()).decode("utf-8")
+        views = dict(config["views"], **creature.get("view_descriptions", {}))
+        params = dict(config.get("params", {}), **creature.get("params", {}))
+        count = int(creature.get("images_per_view", config.get("images_per_view", 1)))
+        for view in creature.get("views", list(views)):
+            prompt = template.format(description=creature.get("description", name), view=views[view], name=name)
+            for i in range(count):
+                payload = dict(params, prompt=prompt, init_images=[encoded[reference]])
+                if count > 1:
+                    if payload.get("seed", -1) != -1:
+                        payload["seed"] = payload["seed"] + i
+                    filename = f"{view}_{i + 1}.png"
+                else:
+                    filename = f"{view}.png"
+                jobs.append((str(output_dir / name / filename), payload))
+    return jobs, output_dir
+
+def zip_creatures(image_paths, output_dir):
+    """One <creature>_angles.zip per creature directory."""
+    by_creature = {}
+    for path in image_paths:
+        by_creature.setdefault(Path(path).parent.name, []).append(path)
+    for creature, paths in sorted(by_creature.items()):
+        zip_path = output_dir / f"{creature}_angles.zip"
+        with zipfile.ZipFile(zip_path, "w") as zipf:
+            for img_path in sorted(paths):
+                zipf.write(img_path, os.path.basename(img_path))
+        print(f"📦 {zip_path}")
+
+def main(argv=None):
+    import argparse
+    from sd_client import generate_images, plan_requests
+    from generation_cache import GenerationCache, DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Generate creature view images with Stable Diffusion img2img")
+    parser.add_argument("--config", default=str(DEFAULT_CONFIG), help=f"Creature x view config (default: {DEFAULT_CONFIG.name})")
+    parser.add_argument("--creatures", help="Comma-separated subset of creatures (default: all)")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL, help=f"Web UI address (default: $SD_API_URL or {DEFAULT_API_URL})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help=f"Requests in flight (default: $SD_CONCURRENCY or {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--max-batch-size", type=int, default=4, help="Images per server-side batch; bounded by GPU memory (default: 4)")
+    parser.add_argument("--max-n-iter", type=int, default=4, help="Batches per request (default: 4)")
+    parser.add_argument("--png-workers", type=int, default=0, help="Threads that validate and recompress new PNGs (default: 0, keep as received)")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"Generation cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Regenerate everything and leave the cache untouched")
+    parser.add_argument("--zip", action="store_true", help="Also write <creature>_angles.zip archives")
+    parser.add_argument("--dry-run", action="store_true", help="Print the request plan without contacting the server")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    names = set(args.creatures.split(",")) if args.creatures else None
+    jobs, output_dir = expand_matrix(config, names)
+    if not jobs:
+        raise SystemExit("Nothing to generate; check --creatures against the config")
+    cache = None if args.no_cache else GenerationCache(args.cache_dir)
+
+    if args.dry_run:
+        hits, batched, _ = plan_requests(jobs, cache, args.max_batch_size, args.max_n_iter)
+        print(f"{len(jobs)} images: {len(hits)} cached, {len(jobs) - len(hits)} to generate in {len(batched)} requests")
+        for paths, payload, _ in batched:
+            print(f"  {payload['batch_size']}x{payload['n_iter']} seed {payload.get('seed')}: {paths[0]}"
+                  + (f" (+{len(paths) - 1})" if len(paths) > 1 else ""))
+        return
+
+    results, stats = generate_images(jobs, args.api_url, args.concurrency, cache=cache,
+                                     manifest_path=output_dir / "manifest.json",
+                                     max_batch_size=args.max_batch_size, max_n_iter=args.max_n_iter,
+                                     png_workers=args.png_workers)
+    image_paths = sorted(str(path) for path, error in results if error is None)
+    print(f"{len(image_paths)}/{len(jobs)} images in {stats['seconds']:.1f}s ({stats['cache_hits']} cached, "
+          f"{stats['batches']} batches, {stats['requests']} requests, {stats['retries']} retries)")
+    if args.zip:
+        zip_creatures(image_paths, output_dir)
+    if len(image_paths) < len(jobs):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Reconstruct a whole creature roster with image_to_3d_trimesh.images_to_3d.
+Creatures are the image subdirectories of a root directory, or the entries of a
+JSON manifest. The depth model is loaded once, on first use, and shared by every
+job (its load is timed as the model_load stage of the creature that triggers it);
+creatures run on a thread pool sized from a CPU budget, and each job's meshing
+KD-tree queries are capped at its share of the CPUs. Each finished
+creature is checkpointed in a state file, so a rerun skips creatures whose images
+and settings are unchanged and retries the ones that failed.
+Manifest format (paths relative to the manifest):
+    {"creatures": [{"name": "roach", "input_dir": "roach_views", "output_dir": "...", "prefix": "model"}]}
+Run:
+    python batch_image_to_3d.py /path/to/creatures [--output-root models] [--cpus 8] [--workers 2]
+    python batch_image_to_3d.py --manifest creatures.json --model stub --no-cache
+Writes {output_root}/batch_state.json (checkpoints) and batch_summary.json.
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
+import traceback
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from depth_cache import DepthCache
+from depth_model import predict_depth
+from image_to_3d_trimesh import images_to_3d, find_images, add_pipeline_arguments, depth_source, pipeline_options
+
+class SharedDepthModel:
+    """One depth model shared by concurrent jobs: loaded on the first prediction,
+    with inference serialized so jobs never run the network at the same time.
+
+    Usable as an images_to_3d model_loader; it hands itself out as a remote-style
+    model (transform=None). The network is loaded when images_to_3d first asks for
+    the model, inside that job's model_load stage, so a fully cached creature never
+    triggers the load and the load is not counted as depth inference.
+    """
+
+    def __init__(self, loader, num_threads=None):
+        self._loader = loader
+        self.num_threads = num_threads
+        self._lock = threading.Lock()
+        self._model = None
+        self.loads = 0
+        self.load_seconds = 0.0
+        self.predictions = 0
+
+    def __call__(self):
+        with self._lock:
+            self._load()
+        return self, None
+
+    def _load(self):
+        if self._model is None:
+            start = time.perf_counter()
+            self._model = self._loader()
+            torch = sys.modules.get("torch")
+            if torch is not None and self.num_threads:
+                torch.set_num_threads(self.num_threads)
+            self.load_seconds = time.perf_counter() - start
+            self.loads += 1
+
+    def predict(self, img):
+        with self._lock:
+            self._load()
+            self.predictions += 1
+            midas, transform = self._model
+            return predict_depth(img, midas, transform)
+
+def discover_creatures(root):
+    """One creature per subdirectory of root that contains images."""
+    return [{"name": d.name, "input_dir": str(d)}
+            for d in sorted(Path(root).iterdir()) if d.is_dir() and find_images(d)]
+
+def load_manifest(path):
+    path = Path(path)
+    with open(path) as f:
+        data = json.load(f)
+    entries = data["creatures"] if isinstance(data, dict) else data
+    creatures = []
+    for entry in entries:
+        entry = {"input_dir": entry} if isinstance(entry, str) else dict(entry)
+        entry["input_dir"] = str(path.parent / entry["input_dir"])
+        if entry.get("output_dir"):
+            entry["output_dir"] = str(path.parent / entry["output_dir"])
+        entry.setdefault("name", Path(entry["input_dir"]).name)
+        creatures.append(entry)
+    return creatures
+
+def fingerprint(input_dir, settings):
+    """Hash of the image files (name, size, mtime) and the reconstruction settings."""
+    h = hashlib.sha256(json.dumps(settings, sort_keys=True, default=str).encode())
+    for image in find_images(input_dir):
+        st = image.stat()
+        h.update(f"{image.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+class BatchState:
+    """Per-creature checkpoints, rewritten atomically after every job."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.creatures = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                self.creatures = json.load(f).get("creatures", {})
+
+    def is_done(self, name, digest, output_dir):
+        entry = self.creatures.get(name)
+        return (entry is not None and entry["status"] == "done" and entry["fingerprint"] == digest
+                and (Path(output_dir) / "metadata.json").exists())
+
+    def record(self, name, entry):
+        with self._lock:
+            self.creatures[name] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump({"creatures": self.creatures}, f, indent=2)
+            os.replace(tmp, self.path)
+
+def run_creature(creature, output_dir, digest, cache, shared_model, model_type, options, state, workers=-1):
+    name = creature["name"]
+    start = time.perf_counter()
+    entry = {"input_dir": creature["input_dir"], "output_dir": str(output_dir), "fingerprint": digest}
+    if options.get("trace_path"):
+        # One trace per creature, named like the requested file
+        options = dict(options, trace_path=str(Path(output_dir) / Path(options["trace_path"]).name))
+    try:
+        images_to_3d(creature["input_dir"], output_dir, creature.get("prefix", "model"), cache=cache,
+                     model_loader=shared_model, model_type=model_type, workers=workers, **options)
+        with open(Path(output_dir) / "metadata.json") as f:
+            metadata = json.load(f)
+        entry.update(status="done", mesh_vertices=metadata["mesh_vertices"], mesh_faces=metadata["mesh_faces"])
+    except Exception as e:
+        traceback.print_exc()
+        entry.update(status="failed", error=f"{type(e).__name__}: {e}")
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+    entry["finished"] = str(time.strftime("%Y-%m-%dT%H:%M:%S"))
+    state.record(name, entry)
+    return name, entry
+
+def run_batch(creatures, output_root, cache, model_loader, model_type, options,
+              cpus=None, workers=None, state_file=None, force=False):
+    """Reconstruct every creature; returns the summary dict written to batch_summary.json."""
+    output_root = Path(output_root)
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, min(workers or max(1, cpus // 4), len(creatures) or 1))
+    threads_per_job = max(1, cpus // workers)
+    options = dict(options, decode_workers=min(options.get("decode_workers", 4), threads_per_job))
+
+    state = BatchState(state_file or output_root / "batch_state.json")
+    shared_model = SharedDepthModel(model_loader, num_threads=threads_per_job)
+    settings = dict(options, model_type=model_type)
+    results = {}
+    pending = []
+    for creature in creatures:
+        output_dir = Path(creature.get("output_dir") or output_root / creature["name"])
+        digest = fingerprint(creature["input_dir"], settings)
+        if not force and state.is_done(creature["name"], digest, output_dir):
+            results[creature["name"]] = dict(state.creatures[creature["name"]], status="skipped")
+        else:
+            pending.append((creature, output_dir, digest))
+    print(f"{len(creatures)} creatures: {len(results)} up to date, {len(pending)} to run "
+          f"on {workers} workers ({threads_per_job} threads each)")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for creature, output_dir, digest in pending:
+            # Separate cache objects keep hit/miss counts per creature; the directory is shared
+            job_cache = None if cache is None else DepthCache(cache.cache_dir, max_bytes=cache.max_bytes)
+            futures.append(pool.submit(run_creature, creature, output_dir, digest, job_cache,
+                                       shared_model, model_type, options, state, threads_per_job))
+        for future in as_completed(futures):
+            name, entry = future.result()
+            results[name] = entry
+            print(f"[{entry['status']}] {name} in {entry['seconds']:.1f}s")
+
+    summary = {
+        "output_root": str(output_root),
+        "cpus": cpus,
+        "workers": workers,
+        "wall_seconds": round(time.perf_counter() - start, 3),
+        "model_loads": shared_model.loads,
+        "model_load_seconds": round(shared_model.load_seconds, 3),
+        "depth_predictions": shared_model.predictions,
+        "counts": {s: sum(1 for r in results.values() if r["status"] == s) for s in ("done", "skipped", "failed")},
+        "creatures": {c["name"]: results[c["name"]] for c in creatures},
+    }
+    output_root.mkdir(parents=True, exist_ok=True)
+    with open(output_root / "batch_summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def print_summary(summary):
+    print(f"\n{'creature':<24} {'status':<8} {'seconds':>8} {'faces':>8}")
+    for name, entry in summary["creatures"].items():
+        print(f"{name:<24} {entry['status']:<8} {entry.get('seconds', 0):>8.1f} {entry.get('mesh_faces', '-'):>8}")
+        if entry["status"] == "failed":
+            print(f"    {entry['error']}")
+    counts = summary["counts"]
+    print(f"done {counts['done']}, skipped {counts['skipped']}, failed {counts['failed']} "
+          f"in {summary['wall_seconds']:.1f}s; model loaded {summary['model_loads']}x")
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Batch-convert a roster of creature view directories to 3D models")
+    parser.add_argument("root", nargs="?", help="Directory whose image subdirectories are creatures")
+    parser.add_argument("--manifest", help="JSON manifest of creatures instead of a root directory")
+    parser.add_argument("--output-root", default="models", help="Directory for per-creature outputs and batch reports (default: models)")
+    parser.add_argument("--cpus", type=int, help="CPU budget shared by all jobs (default: all cores)")
+    parser.add_argument("--workers", type=int, help="Creatures reconstructed concurrently (default: cpus / 4)")
+    parser.add_argument("--state-file", help="Checkpoint file (default: {output_root}/batch_state.json)")
+    parser.add_argument("--force", action="store_true", help="Ignore checkpoints and rebuild every creature")
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+    if bool(args.root) == bool(args.manifest):
+        parser.error("give either a root directory or --manifest")
+
+    creatures = load_manifest(args.manifest) if args.manifest else discover_creatures(args.root)
+    if not creatures:
+        raise SystemExit("No creatures found")
+    cache, model_loader, model_type = depth_source(args)
+    summary = run_batch(creatures, args.output_root, cache, model_loader, model_type, pipeline_options(args),
+                        cpus=args.cpus, workers=args.workers, state_file=args.state_file, force=args.force)
+    print_summary(summary)
+    raise SystemExit(1 if summary["counts"]["failed"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -3,148 +3,544 @@
 COLMAP 3D Reconstruction Script
 CPU-friendly alternative to Meshroom that works without NVIDIA GPU.
 
+Each COLMAP stage (feature extraction, matching, mapping, undistortion, stereo,
+fusion, meshing) is checkpointed: when a stage finishes, {output_dir}/stages/{stage}.json
+records its command, a fingerprint chained from the images and every earlier
+stage, and hashes of its outputs (SHA-256 of files; the file list with sizes and
+mtimes of directories). A rerun skips stages whose checkpoint still matches,
+so a failure in poisson_mesher no longer repeats feature extraction and matching.
+A stage that reruns first deletes what it writes (database.db, sparse/, dense/, ...):
+COLMAP skips images and image pairs already in the database, so an edited image
+would otherwise keep its old keypoints and matches. For the same reason a stale
+matcher restarts from feature extraction, which recreates the database.
+Stage logs go to {output_dir}/logs/{stage}.log.
+Thread counts are passed explicitly (--SiftExtraction.num_threads and friends).
+Matching: views are in ring order (front, front-left, left, ... as
+image_to_3d_trimesh.py assumes; files named after the views are sorted that way,
+others naturally by name), so sets larger than --exhaustive-max use
+sequential_matcher, which pairs each image with its next --overlap neighbours
+instead of all n^2 pairs. The ring is closed with a vocabulary tree
+(--vocab-tree, COLMAP's loop detection) or, without one, by matching the
+wrap-around pairs between the end and the start of the ring (matches_importer).
+Only the eight azimuth views (and unnamed frames) form the ring: top, bottom and
+close-ups are staged after it and, in the pairs file, matched with every ring view.
+Small or --ordering unordered sets keep exhaustive_matcher.
+--max-edge adds a pre-stage that downscales the images in parallel (so feature
+extraction and dense stereo work on fewer pixels); it and sequential matching
+stage the images as {output_dir}/images/NNNN_name so COLMAP sees the ring order.
+Several image sets can be reconstructed at once; the CPU budget (--cpus) is
+split evenly between the concurrent sets (--workers).
+After a successful run mesh.ply is cropped, decimated to --face-budget triangles and
+written as {--glb-dir}/{image dir name}.glb (mesh_to_glb.py); --no-glb skips this.
+Set --colmap (or $COLMAP) to another executable, e.g. stub_colmap.py for testing.
+
 Requirements:
 - Install COLMAP: conda install -c conda-forge colmap
 - Or download from: https://github.com/colmap/colmap/releases
+- patch_match_stereo needs a CUDA build of COLMAP
 
 Usage:
     python colmap_reconstruction.py /path/to/images --output-dir colmap_output
+    python colmap_reconstruction.py images/roach images/beetle --cpus 16 --workers 2
+    python colmap_reconstruction.py turntable_frames/ --max-edge 1600 [--vocab-tree vocab_tree.bin]
 """
 
 import os
+import re
+import json
+import shutil
+import time
+import hashlib
+import threading
 import subprocess
-import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from mesh_to_glb import try_reconstruction_to_glb, add_glb_arguments, glb_options
+
+COLMAP = os.environ.get("COLMAP", "colmap")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+# View names in capture order, as assumed by image_to_3d_trimesh.py; only the
+# azimuth views form the ring that sequential matching walks and closes
+RING_VIEWS = ["front", "front_left", "left", "back_left", "back", "back_right", "right", "front_right"]
+OFF_RING_VIEWS = ["top", "bottom"]
+VIEW_ORDER = RING_VIEWS + OFF_RING_VIEWS
+MATCHERS = ["auto", "exhaustive", "sequential"]
+EXHAUSTIVE_MAX_IMAGES = 30
+# COLMAP option taking the thread count, per stage (None: the stage has no such option)
+THREAD_OPTIONS = {
+    "feature_extractor": "--SiftExtraction.num_threads",
+    "exhaustive_matcher": "--SiftMatching.num_threads",
+    "sequential_matcher": "--SiftMatching.num_threads",
+    "matches_importer": "--SiftMatching.num_threads",
+    "mapper": "--Mapper.num_threads",
+    "image_undistorter": None,
+    "patch_match_stereo": None,
+    "stereo_fusion": "--StereoFusion.num_threads",
+    "poisson_mesher": "--PoissonMeshing.num_threads",
+}
+
+def _natural_key(name):
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name.lower())]
+
+def _view_stem(path):
+    return Path(path).stem.lower().replace("-", "_")
+
+def is_off_ring(path):
+    """Top, bottom and close-up views are not part of the azimuth ring."""
+    stem = _view_stem(path)
+    return stem in OFF_RING_VIEWS or "close" in stem
+
+def ordered_images(image_dir):
+    """Images of image_dir in capture order: the ring views in RING_VIEWS order,
+    then other frames by natural name order (frame_2 before frame_10), then the
+    off-ring views (top, bottom, close-ups)."""
+    images = [p for p in Path(image_dir).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS]
+
+    def key(path):
+        stem = _view_stem(path)
+        if stem in RING_VIEWS:
+            return (0, RING_VIEWS.index(stem), [])
+        if is_off_ring(path):
+            return (2, OFF_RING_VIEWS.index(stem) if stem in OFF_RING_VIEWS else len(OFF_RING_VIEWS), _natural_key(path.name))
+        return (1, 0, _natural_key(path.name))
+    return sorted(images, key=key)
+
+def choose_matcher(num_images, matcher="auto", ordering="ring", exhaustive_max=EXHAUSTIVE_MAX_IMAGES):
+    """Exhaustive matching is O(n^2) in images; use it for small or unordered sets only."""
+    if matcher != "auto":
+        return matcher
+    return "sequential" if ordering == "ring" and num_images > exhaustive_max else "exhaustive"
+
+def loop_closure_pairs(names, overlap, off_ring=()):
+    """Image pairs that wrap from the end of the ring back to its start, plus each
+    off_ring name (top, bottom, close-ups) paired with every ring image, which
+    sequential matching would only pair with the end of the ring."""
+    off_ring = set(off_ring)
+    ring = [name for name in names if name not in off_ring]
+    n = len(ring)
+    pairs = []
+    for i in range(max(0, n - overlap), n):
+        for j in range(0, overlap):
+            if j < i and (j - i) % n <= overlap:
+                pairs.append((ring[i], ring[j]))
+    pairs += [(extra, name) for extra in names if extra in off_ring for name in ring]
+    return pairs
+
+def _stage_image(args):
+    source, target, max_edge = args
+    target.unlink(missing_ok=True)
+    if max_edge:
+        import cv2
+        img = cv2.imread(str(source), cv2.IMREAD_UNCHANGED)
+        if img is None:
+            raise ValueError(f"Could not read {source}")
+        h, w = img.shape[:2]
+        if max(h, w) > max_edge:
+            scale = max_edge / max(h, w)
+            img = cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+            cv2.imwrite(str(target), img)
+            return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def prepare_images(images, work_dir, max_edge=None, threads=None, pairs_path=None, overlap=10):
+    """Stage images into work_dir as NNNN_name in capture order, downscaled in
+    parallel to max_edge (others hard-linked). With pairs_path, also write the
+    ring's loop-closure and off-ring pairs for matches_importer."""
+    work_dir = Path(work_dir)
+    if work_dir.exists():
+        shutil.rmtree(work_dir)
+    work_dir.mkdir(parents=True)
+    names = [f"{i:04d}_{image.name}" for i, image in enumerate(images)]
+    jobs = [(image, work_dir / name, max_edge) for image, name in zip(images, names)]
+    with ThreadPoolExecutor(max_workers=threads or os.cpu_count() or 1) as pool:
+        list(pool.map(_stage_image, jobs))
+    if pairs_path is not None:
+        with open(pairs_path, "w") as f:
+            off_ring = [name for image, name in zip(images, names) if is_off_ring(image)]
+            f.writelines(f"{a} {b}\n" for a, b in loop_closure_pairs(names, overlap, off_ring))
+
+def colmap_stages(image_dir, output_dir, matcher="exhaustive", overlap=10, vocab_tree=None, max_edge=None):
+    """The reconstruction pipeline as a list of stages, in order.
+
+    Each stage is {"name", "description", "args", "outputs"}; "clean" lists paths
+    deleted before the stage reruns, "mkdir" lists directories COLMAP expects to
+    exist before the stage starts, and a stage with "run" is a Python callable
+    (given the thread count) instead of a COLMAP command.
+    """
+    database_path = output_dir / "database.db"
+    sparse_dir = output_dir / "sparse"
+    dense_dir = output_dir / "dense"
+    fused_ply = output_dir / "fused.ply"
+    mesh_ply = output_dir / "mesh.ply"
+    stages = []
+    pairs_path = output_dir / "loop_pairs.txt" if matcher == "sequential" and not vocab_tree else None
+    if max_edge or matcher == "sequential":
+        images = ordered_images(image_dir)
+        work_dir = output_dir / "images"
+        stages.append(
+            {"name": "prepare_images", "description": f"Staging {len(images)} images"
+                                                      + (f" at max edge {max_edge}" if max_edge else ""),
+             "args": [str(max_edge), overlap, pairs_path] + [image.name for image in images],
+             "outputs": [work_dir] + ([pairs_path] if pairs_path else []),
+             "run": lambda threads: prepare_images(images, work_dir, max_edge, threads, pairs_path, overlap)})
+        image_dir = work_dir
+
+    stages.append(
+        {"name": "feature_extractor", "description": "Extracting features",
+         "args": ["--database_path", database_path, "--image_path", image_dir,
+                  "--ImageReader.single_camera", "1",  # Assume single camera
+                  "--SiftExtraction.use_gpu", "0"],  # CPU only
+         "outputs": [database_path], "clean": [database_path]})
+    if matcher == "sequential":
+        args = ["--database_path", database_path, "--SiftMatching.use_gpu", "0",
+                "--SequentialMatching.overlap", overlap]
+        if vocab_tree:
+            args += ["--SequentialMatching.loop_detection", "1", "--SequentialMatching.vocab_tree_path", vocab_tree]
+        stages.append({"name": "sequential_matcher", "description": "Matching ring neighbours",
+                       "args": args, "outputs": [database_path]})
+        if pairs_path:
+            stages.append({"name": "matches_importer", "description": "Closing the ring",
+                           "args": ["--database_path", database_path, "--match_list_path", pairs_path,
+                                    "--match_type", "pairs", "--SiftMatching.use_gpu", "0"],
+                           "outputs": [database_path]})
+    else:
+        stages.append(
+            {"name": "exhaustive_matcher", "description": "Matching features",
+             "args": ["--database_path", database_path,
+                      "--SiftMatching.use_gpu", "0"],  # CPU only
+             "outputs": [database_path]})
+    return stages + [
+        {"name": "mapper", "description": "Sparse reconstruction (SfM)",
+         "args": ["--database_path", database_path, "--image_path", image_dir, "--output_path", sparse_dir],
+         "outputs": [sparse_dir], "clean": [sparse_dir], "mkdir": [sparse_dir]},
+        {"name": "image_undistorter", "description": "Dense reconstruction",
+         "args": ["--image_path", image_dir, "--input_path", sparse_dir / "0", "--output_path", dense_dir],
+         "outputs": [dense_dir / "images", dense_dir / "sparse"], "clean": [dense_dir]},
+        {"name": "patch_match_stereo", "description": "Stereo fusion",
+         "args": ["--workspace_path", dense_dir],
+         "outputs": [dense_dir / "stereo"],
+         # The undistorter's patch-match.cfg in stereo/ must survive
+         "clean": [dense_dir / "stereo" / sub for sub in ("depth_maps", "normal_maps", "consistency_graphs")]},
+        {"name": "stereo_fusion", "description": "Creating point cloud",
+         "args": ["--workspace_path", dense_dir, "--output_path", fused_ply],
+         "outputs": [fused_ply], "clean": [fused_ply]},
+        {"name": "poisson_mesher", "description": "Creating mesh",
+         "args": ["--input_path", fused_ply, "--output_path", mesh_ply],
+         "outputs": [mesh_ply], "clean": [mesh_ply]},
+    ]
+
+def path_digest(path):
+    """SHA-256 of a file's content, or of a directory's file names, sizes and mtimes
+    (dense workspaces run to gigabytes); None if the path is missing."""
+    path = Path(path)
+    h = hashlib.sha256()
+    if path.is_file():
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    elif path.is_dir():
+        for child in sorted(p for p in path.rglob("*") if p.is_file()):
+            st = child.stat()
+            h.update(f"{child.relative_to(path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    else:
+        return None
+    return h.hexdigest()
+
+def images_fingerprint(image_dir):
+    h = hashlib.sha256()
+    for image in sorted(Path(image_dir).iterdir()):
+        if image.suffix.lower() in IMAGE_EXTENSIONS:
+            st = image.stat()
+            h.update(f"{image.name}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()
+
+class StageCheckpoints:
+    """Completion markers of one reconstruction, one JSON file per stage."""
+
+    def __init__(self, output_dir):
+        self.dir = Path(output_dir) / "stages"
+
+    def _path(self, name):
+        return self.dir / f"{name}.json"
+
+    def load(self, name):
+        try:
+            with open(self._path(name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_done(self, name, fingerprint, outputs, verify):
+        """A stage is done if its marker has this fingerprint, its outputs exist and
+        those in verify (the ones no later stage rewrites) still hash as recorded."""
+        marker = self.load(name)
+        if marker is None or marker["fingerprint"] != fingerprint:
+            return None
+        if not all(Path(o).exists() for o in outputs):
+            return None
+        for output in verify:
+            if path_digest(output) != marker["outputs"].get(str(output)):
+                return None
+        return marker
+
+    def record(self, name, marker):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        tmp = self._path(name).with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(marker, f, indent=2)
+        os.replace(tmp, self._path(name))
 
-def run_colmap_reconstruction(image_dir, output_dir):
+    def clear(self, name):
+        self._path(name).unlink(missing_ok=True)
+
+def remove_path(path):
+    path = Path(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink(missing_ok=True)
+
+def stage_command(stage, colmap=COLMAP, threads=None):
+    command = [colmap, stage["name"]] + [str(a) for a in stage["args"]]
+    option = THREAD_OPTIONS.get(stage["name"])
+    if threads and option:
+        command += [option, str(threads)]
+    return command
+
+def run_stages(stages, image_dir, output_dir, colmap=COLMAP, threads=None, force=False, log=print):
+    """Run stages in order, skipping those whose checkpoint is still valid.
+
+    Everything from the first stale stage on is rerun, starting earlier if that
+    stage updates an output an earlier stage created (a matcher and the database),
+    and each rerun stage deletes its "clean" paths first.
+    Returns a list of {"stage", "status" ("done"/"skipped"), "seconds"}; a failing
+    stage raises subprocess.CalledProcessError (or FileNotFoundError if colmap is
+    missing) after clearing its marker.
+    """
+    output_dir = Path(output_dir)
+    checkpoints = StageCheckpoints(output_dir)
+    log_dir = output_dir / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
+    # Outputs rewritten by a later stage (the matcher updates the database) are
+    # verified by that stage only
+    last_writer, first_writer = {}, {}
+    for index, stage in enumerate(stages):
+        for output in stage["outputs"]:
+            last_writer[str(output)] = stage["name"]
+            first_writer.setdefault(str(output), index)
+
+    def fingerprint_of(upstream, stage):
+        # Thread counts do not change results, so they stay out of the fingerprint
+        return hashlib.sha256(json.dumps([upstream, stage["name"], [str(a) for a in stage["args"]]]).encode()).hexdigest()
+
+    def chain(fingerprint, marker):
+        # Downstream stages depend on exactly these outputs
+        return hashlib.sha256((fingerprint + json.dumps(marker["outputs"], sort_keys=True)).encode()).hexdigest()
+
+    # Checkpointed prefix of the pipeline
+    upstream = images_fingerprint(image_dir)
+    markers = []
+    for stage in [] if force else stages:
+        fingerprint = fingerprint_of(upstream, stage)
+        verify = [o for o in stage["outputs"] if last_writer[str(o)] == stage["name"]]
+        marker = checkpoints.is_done(stage["name"], fingerprint, stage["outputs"], verify)
+        if marker is None:
+            break
+        markers.append(marker)
+        upstream = chain(fingerprint, marker)
+    restart = len(markers)
+    if restart < len(stages):
+        restart = min([restart] + [first_writer[str(o)] for o in stages[restart]["outputs"]])
+
+    upstream = images_fingerprint(image_dir)
+    results = []
+    for step, stage in enumerate(stages, start=1):
+        name = stage["name"]
+        fingerprint = fingerprint_of(upstream, stage)
+        if step - 1 < restart:
+            marker = markers[step - 1]
+            log(f"Step {step}: {stage['description']}... already done, skipping")
+            results.append({"stage": name, "status": "skipped", "seconds": marker["seconds"]})
+        else:
+            log(f"Step {step}: {stage['description']}...")
+            checkpoints.clear(name)
+            for path in stage.get("clean", []):
+                remove_path(path)
+            for directory in stage.get("mkdir", []):
+                Path(directory).mkdir(parents=True, exist_ok=True)
+            start = time.perf_counter()
+            if "run" in stage:
+                command = [name] + [str(a) for a in stage["args"]]
+                stage["run"](threads)
+            else:
+                command = stage_command(stage, colmap, threads)
+                with open(log_dir / f"{name}.log", "w") as log_file:
+                    subprocess.run(command, check=True, stdout=log_file, stderr=subprocess.STDOUT)
+            seconds = round(time.perf_counter() - start, 3)
+            marker = {
+                "stage": name, "command": command, "fingerprint": fingerprint, "threads": threads,
+                "outputs": {str(o): path_digest(o) for o in stage["outputs"]},
+                "seconds": seconds, "finished": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+            checkpoints.record(name, marker)
+            results.append({"stage": name, "status": "done", "seconds": seconds})
+        upstream = chain(fingerprint, marker)
+    return results
+
+def run_colmap_reconstruction(image_dir, output_dir, threads=None, colmap=COLMAP, force=False, log=print,
+                              matcher="auto", ordering="ring", overlap=10, vocab_tree=None, max_edge=None,
+                              exhaustive_max=EXHAUSTIVE_MAX_IMAGES, glb=None):
     """
     Run COLMAP automatic reconstruction pipeline.
 
     Args:
         image_dir: Directory containing input images
         output_dir: Directory for output
+        threads: Threads per stage (default: COLMAP's own, all cores)
+        colmap: COLMAP executable
+        force: Ignore checkpoints and rerun every stage
+        matcher: One of MATCHERS; "auto" picks with choose_matcher
+        ordering: "ring" if the views follow capture order, else "unordered"
+        overlap: Neighbours each image is matched with by sequential matching
+        vocab_tree: COLMAP vocabulary tree for loop detection
+        max_edge: Downscale images to this longest side before extraction
+        glb: mesh_to_glb.reconstruction_to_glb options for converting mesh.ply
+             to {glb_dir}/{image dir name}.glb afterwards; None skips it. A failed
+             conversion is a warning and does not change the result.
     """
 
     image_dir = Path(image_dir)
     output_dir = Path(output_dir)
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    # Database file
-    database_path = output_dir / "database.db"
+    log(f"Running COLMAP reconstruction...")
+    log(f"Input images: {image_dir}")
+    log(f"Output directory: {output_dir}")
+    if not image_dir.is_dir():
+        log(f"❌ Input directory not found: {image_dir}")
+        return False
 
-    print(f"Running COLMAP reconstruction...")
-    print(f"Input images: {image_dir}")
-print(f"Output directory: {output_dir}")
-
-try:
-    # Step 1: Feature extraction
-    print("Step 1: Extracting features...")
-    cmd1 = [
-        "colmap", "feature_extractor",
-        "--database_path", str(database_path),
-        "--image_path", str(image_dir),
-        "--ImageReader.single_camera", "1",  # Assume single camera
-        "--SiftExtraction.use_gpu", "0"  # CPU only
-    ]
-    subprocess.run(cmd1, check=True)
-
-    # Step 2: Feature matching
-    print("Step 2: Matching features...")
-    cmd2 = [
-        "colmap", "exhaustive_matcher",
-        "--database_path", str(database_path),
-        "--SiftMatching.use_gpu", "0"  # CPU only
-    ]
-    subprocess.run(cmd2, check=True)
+    try:
+        num_images = len(ordered_images(image_dir))
+        matcher = choose_matcher(num_images, matcher, ordering, exhaustive_max)
+        log(f"{num_images} images, {matcher} matching")
+        stages = colmap_stages(image_dir, output_dir, matcher, overlap, vocab_tree, max_edge)
+        results = run_stages(stages, image_dir, output_dir, colmap=colmap, threads=threads, force=force, log=log)
 
-    # Step 3: Sparse reconstruction (Structure from Motion)
-    sparse_dir = output_dir / "sparse"
-    print("Step 3: Sparse reconstruction (SfM)...")
-    cmd3 = [
-        "colmap", "mapper",
-        "--database_path", str(database_path),
-        "--image_path", str(image_dir),
-        "--output_path", str(sparse_dir)
-    ]
-    subprocess.run(cmd3, check=True)
+        log("✅ COLMAP reconstruction completed successfully!")
+        log(f"📁 Output directory: {output_dir}")
+        log(f"🔵 Point cloud: {output_dir / 'fused.ply'}")
+        log(f"🟢 Mesh: {output_dir / 'mesh.ply'}")
+        log("⏱  " + ", ".join(f"{r['stage']} {r['seconds']:.1f}s" + (" (cached)" if r["status"] == "skipped" else "")
+                              for r in results))
+        if glb is None:
+            log("💡 Next steps:")
+            log("1. Open mesh.ply in Meshlab or Blender")
+            log("2. Clean up the mesh if needed")
+            log("3. Export as .obj or .glb for your game")
+        else:
+            try_reconstruction_to_glb(output_dir / "mesh.ply", image_dir.name, log=log, **glb)
+        return True
 
-    # Step 4: Dense reconstruction
-    dense_dir = output_dir / "dense"
-    print("Step 4: Dense reconstruction...")
-    cmd4 = [
-        "colmap", "image_undistorter",
-        "--image_path", str(image_dir),
-        "--input_path", str(sparse_dir / "0"),
-        "--output_path", str(dense_dir)
-    ]
-    subprocess.run(cmd4, check=True)
+    except subprocess.CalledProcessError as e:
+        log(f"❌ COLMAP failed: {e}")
+        log(f"   Log: {output_dir / 'logs' / (e.cmd[1] + '.log')}")
+        log("💡 Troubleshooting:")
+        log("1. Make sure COLMAP is installed: conda install -c conda-forge colmap")
+        log("2. Check that all images are in the input directory")
+        log("3. Ensure images have sufficient overlap (60-80%)")
+        log("Completed stages are checkpointed; rerun the same command to resume.")
+        return False
 
-    # Step 5: Stereo fusion
-    print("Step 5: Stereo fusion...")
-    cmd5 = [
-        "colmap", "patch_match_stereo",
-        "--workspace_path", str(dense_dir)
-    ]
-    subprocess.run(cmd5, check=True)
+    except FileNotFoundError as e:
+        # subprocess reports a missing executable with its name as the filename
+        if e.filename != colmap:
+            log(f"❌ Not found: {e.filename or e}")
+            return False
+        log(f"❌ COLMAP not found: {colmap}")
+        log("💡 Install COLMAP:")
+        log("   conda install -c conda-forge colmap")
+        log("   OR download from: https://github.com/colmap/colmap/releases")
+        return False
 
-    # Step 6: Create dense point cloud
-    print("Step 6: Creating point cloud...")
-    fused_ply = output_dir / "fused.ply"
-    cmd6 = [
-        "colmap", "stereo_fusion",
-        "--workspace_path", str(dense_dir),
-        "--output_path", str(fused_ply)
-    ]
-    subprocess.run(cmd6, check=True)
+    except (OSError, ValueError) as e:
+        # e.g. an unreadable image while staging, or an unwritable workspace
+        log(f"❌ {type(e).__name__}: {e}")
+        return False
 
-    # Step 7: Create mesh (optional)
-    print("Step 7: Creating mesh...")
-    mesh_ply = output_dir / "mesh.ply"
-    cmd7 = [
-        "colmap", "poisson_mesher",
-        "--input_path", str(fused_ply),
-        "--output_path", str(mesh_ply)
-    ]
-    subprocess.run(cmd7, check=True)
-
-    print("✅ COLMAP reconstruction completed successfully!")
-    print(f"📁 Output directory: {output_dir}")
-    print(f"🔵 Point cloud: {fused_ply}")
-    print(f"🟢 Mesh: {mesh_ply}")
-    print("💡 Next steps:")
-    print("1. Open mesh.ply in Meshlab or Blender")
-    print("2. Clean up the mesh if needed")
-    print("3. Export as .obj or .glb for your game")
-
-    return True
-
-except subprocess.CalledProcessError as e:
-    print(f"❌ COLMAP failed: {e}")
-    print("💡 Troubleshooting:")
-    print("1. Make sure COLMAP is installed: conda install -c conda-forge colmap")
-    print("2. Check that all images are in the input directory")
-    print("3. Ensure images have sufficient overlap (60-80%)")
-    return False
-
-except FileNotFoundError:
-    print("❌ COLMAP not found in PATH")
-    print("💡 Install COLMAP:")
-    print("   conda install -c conda-forge colmap")
-    print("   OR download from: https://github.com/colmap/colmap/releases")
-    return False
+def run_many(jobs, cpus=None, workers=None, colmap=COLMAP, force=False, **options):
+    """Reconstruct several (image_dir, output_dir) jobs concurrently; each gets
+    cpus // workers threads. options go to run_colmap_reconstruction.
+    Returns {image_dir: success}."""
+    cpus = cpus or os.cpu_count() or 1
+    workers = max(1, min(workers or 1, len(jobs), cpus))
+    threads = max(1, cpus // workers)
+    print(f"{len(jobs)} image sets on {workers} workers ({threads} threads each)")
+    print_lock = threading.Lock()
 
-if __name__ == "__main__":
+    def run(image_dir, output_dir):
+        tag = Path(image_dir).name
+
+        def log(message):
+            with print_lock:
+                print(f"[{tag}] {message}" if workers > 1 else message)
+        try:
+            return run_colmap_reconstruction(image_dir, output_dir, threads, colmap, force, log, **options)
+        except Exception as e:
+            # One broken set must not abort the others
+            log(f"❌ {type(e).__name__}: {e}")
+            return False
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, image_dir, output_dir): image_dir for image_dir, output_dir in jobs}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+    return results
+
+def main(argv=None):
+    import argparse
     parser = argparse.ArgumentParser(description="Run COLMAP 3D reconstruction (CPU-friendly)")
-    parser.add_argument("input_dir", help="Directory containing input images")
-    parser.add_argument("--output-dir", help="Output directory (default: colmap_output)")
+    parser.add_argument("input_dirs", nargs="+", help="Directories containing input images (one reconstruction each)")
+    parser.add_argument("--output-dir", help="Output directory (default: colmap_output_<input name>); "
+                                             "with several inputs, each goes to a subdirectory")
+    parser.add_argument("--cpus", type=int, help="CPU budget shared by all reconstructions (default: all cores)")
+    parser.add_argument("--workers", type=int, default=1, help="Image sets reconstructed concurrently (default: 1)")
+    parser.add_argument("--colmap", default=COLMAP, help=f"COLMAP executable (default: $COLMAP or {COLMAP})")
+    parser.add_argument("--force", action="store_true", help="Ignore stage checkpoints and rerun everything")
+    parser.add_argument("--matcher", choices=MATCHERS, default="auto", help=f"Feature matcher; auto uses exhaustive up to --exhaustive-max images, sequential above (default: auto)")
+    parser.add_argument("--ordering", choices=["ring", "unordered"], default="ring", help="Whether the views follow capture order (default: ring)")
+    parser.add_argument("--exhaustive-max", type=int, default=EXHAUSTIVE_MAX_IMAGES, help=f"Largest set matched exhaustively by --matcher auto (default: {EXHAUSTIVE_MAX_IMAGES})")
+    parser.add_argument("--overlap", type=int, default=10, help="Ring neighbours matched per image by sequential matching (default: 10)")
+    parser.add_argument("--vocab-tree", help="COLMAP vocabulary tree for loop detection (default: match the ring's wrap-around pairs)")
+    parser.add_argument("--max-edge", type=int, help="Downscale images to this longest side first (default: full size; drops EXIF)")
+    add_glb_arguments(parser)
+
+    args = parser.parse_args(argv)
 
-    args = parser.parse_args()
+    jobs = []
+    for input_dir in args.input_dirs:
+        name = Path(input_dir).name
+        if args.output_dir:
+            output_dir = args.output_dir if len(args.input_dirs) == 1 else str(Path(args.output_dir) / name)
+        else:
+            output_dir = f"colmap_output_{name}"
+        jobs.append((input_dir, output_dir))
 
-    output_dir = args.output_dir or f"colmap_output_{Path(args.input_dir).name}"
+    results = run_many(jobs, args.cpus, args.workers, args.colmap, args.force, matcher=args.matcher,
+                       ordering=args.ordering, overlap=args.overlap, vocab_tree=args.vocab_tree,
+                       max_edge=args.max_edge, exhaustive_max=args.exhaustive_max,
+                       glb=None if args.no_glb else glb_options(args))
+    success = all(results.values())
 
-    success = run_colmap_reconstruction(args.input_dir, output_dir)
+    if not success:
+        print("🔄 Alternative: Try online services like Sketchfab")
+        print("   Upload your images to https://sketchfab.com/create")
+        print("   Select 'Photogrammetry' and let them process it for free!")
+    raise SystemExit(0 if success else 1)
 
-if not success:
-    print("🔄 Alternative: Try online services like Sketchfab")
-    print("   Upload your images to https://sketchfab.com/create")
-    print("   Select 'Photogrammetry' and let them process it for free!")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
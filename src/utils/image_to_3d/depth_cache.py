@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for MiDaS depth maps.
+Depth maps are keyed by the SHA-256 of the image bytes plus the model type and
+transform version, so re-running reconstruction with different meshing settings
+skips inference entirely. Entries are stored as compressed .npz files and the
+least recently used ones are evicted once the cache grows past its size limit.
+The cache size is tracked as a running total (one directory scan when the cache
+is opened), so a put only scans the directory again when it crosses the limit,
+and eviction then frees down to EVICT_TO of it. The total and the hit/miss
+counters are guarded by a lock, since depth maps are read and written from
+parallel decode threads.
+Run:
+    python depth_cache.py [--cache-dir DIR] [--clear]
+"""
+
+import os
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("IMAGE_TO_3D_CACHE", Path.home() / ".cache" / "image_to_3d" / "depth"))
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GiB
+EVICT_TO = 0.9  # eviction frees down to this fraction of max_bytes, so scans are rare
+
+class DepthCache:
+    """Content-addressed store of depth maps with size-based LRU eviction."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total = None if max_bytes is None else self.size_bytes()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_bytes, model_type, transform_version):
+        """Hash image content together with everything that affects the depth output."""
+        h = hashlib.sha256()
+        h.update(image_bytes)
+        h.update(b"\0" + model_type.encode("utf-8"))
+        h.update(b"\0" + transform_version.encode("utf-8"))
+        return h.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.npz"
+
+    def __contains__(self, key):
+        return self._path(key).exists()
+
+    def get(self, key):
+        """Return the cached depth map for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                depth = data["depth"]
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        # Refresh mtime so eviction treats this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return depth
+
+    def put(self, key, depth):
+        """Store a depth map atomically, then evict old entries if over budget."""
+        path = self._path(key)
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, depth=np.asarray(depth, dtype=np.float32))
+            size = os.path.getsize(tmp_name)
+            os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+        if self._total is not None:
+            with self._lock:
+                self._total += size - replaced
+                if self._total > self.max_bytes:
+                    self._evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in EVICT_TO * max_bytes.
+
+        Rescans the directory, which also corrects the running total for entries
+        written or removed by other processes.
+        """
+        if self.max_bytes is None:
+            return 0
+        with self._lock:
+            return self._evict()
+
+    def _evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes * EVICT_TO:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._total = total
+        return removed
+
+    def entries(self):
+        """List (path, size, mtime) for every cached depth map, oldest first."""
+        entries = []
+        for path in self.cache_dir.glob("*.npz"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path, st.st_size, st.st_mtime))
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            path.unlink(missing_ok=True)
+        if self._total is not None:
+            with self._lock:
+                self._total = 0
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or clear the depth-map cache")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"Cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached depth maps")
+    args = parser.parse_args(argv)
+    cache = DepthCache(args.cache_dir, max_bytes=None)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared depth cache at {cache.cache_dir}")
+    else:
+        entries = cache.entries()
+        print(f"Depth cache: {cache.cache_dir}")
+        print(f"  {len(entries)} entries, {sum(e[1] for e in entries) / 1024 ** 2:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Compare fast depth-inference variants against the float32 baseline.
+Runs the eager float32 model and each requested variant (--optimize mode and
+--input-size, see depth_model.py) over a reference image set and reports CPU
+throughput and accuracy drift. MiDaS predicts relative inverse depth, so each
+variant's map is resized to the baseline's and fitted to it with a least-squares
+scale and shift before the errors are measured:
+    abs_rel  - mean |variant - baseline| / |baseline|
+    rmse_rel - RMS error as a fraction of the baseline's depth range
+    pearson  - correlation of the raw maps
+Run:
+    python depth_drift_report.py reference_images/ --variants script,script@192,@320 [--weights midas.pt]
+"""
+
+import time
+import json
+import cv2
+import numpy as np
+from depth_model import OPTIMIZE_MODES, load_midas_model, predict_depth, model_variant, add_model_arguments
+from image_to_3d_trimesh import find_images, decode_image
+
+def parse_variant(spec):
+    """"script@192" -> ("script", 192); a bare size ("@320") runs the eager model."""
+    optimize, _, size = spec.partition("@")
+    optimize = optimize or "none"
+    if optimize not in OPTIMIZE_MODES:
+        raise ValueError(f"Unknown optimize mode {optimize!r} in variant {spec!r}; choose from {OPTIMIZE_MODES}")
+    return optimize, int(size) if size else None
+
+def align_scale_shift(pred, target):
+    """Least-squares s, t minimising |s * pred + t - target|."""
+    a = np.stack([pred.ravel(), np.ones(pred.size)], axis=1).astype(np.float64)
+    (s, t), *_ = np.linalg.lstsq(a, target.ravel().astype(np.float64), rcond=None)
+    return s * pred + t
+
+def drift(pred, baseline):
+    if pred.shape != baseline.shape:
+        pred = cv2.resize(pred, (baseline.shape[1], baseline.shape[0]), interpolation=cv2.INTER_LINEAR)
+    aligned = align_scale_shift(pred, baseline)
+    base = baseline.astype(np.float64)
+    depth_range = float(base.max() - base.min()) or 1.0
+    valid = np.abs(base) > 1e-6
+    return {
+        "abs_rel": float(np.mean(np.abs(aligned - base)[valid] / np.abs(base[valid]))),
+        "rmse_rel": float(np.sqrt(np.mean((aligned - base) ** 2)) / depth_range),
+        "pearson": float(np.corrcoef(pred.ravel(), base.ravel())[0, 1]),
+    }
+
+def run_model(midas, transform, images, repeat=1):
+    """Depth maps for images plus the best per-pass throughput (images/sec)."""
+    predict_depth(images[0], midas, transform)  # warm-up; also builds traces
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        depths = [predict_depth(img, midas, transform) for img in images]
+        best = min(best, time.perf_counter() - start)
+    return depths, len(images) / best
+
+def drift_report(images, model_type, variants, weights_path=None, repo_dir=None, repeat=3):
+    variants = [parse_variant(spec) for spec in variants]  # reject bad specs before the baseline run
+    midas, transform = load_midas_model(model_type, weights_path, repo_dir)
+    baseline, baseline_ips = run_model(midas, transform, images, repeat)
+    report = {"model": model_type, "images": len(images),
+              "baseline": {"images_per_sec": baseline_ips}, "variants": {}}
+    for optimize, input_size in variants:
+        midas, transform = load_midas_model(model_type, weights_path, repo_dir, optimize, input_size)
+        depths, ips = run_model(midas, transform, images, repeat)
+        per_image = [drift(d, b) for d, b in zip(depths, baseline)]
+        report["variants"][model_variant(model_type, optimize, input_size)] = {
+            "images_per_sec": ips,
+            "speedup": ips / baseline_ips,
+            **{k: float(np.mean([m[k] for m in per_image])) for k in ("abs_rel", "rmse_rel", "pearson")},
+            "worst_abs_rel": float(max(m["abs_rel"] for m in per_image)),
+        }
+    return report
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Report speed and accuracy drift of optimized depth inference")
+    parser.add_argument("reference_dir", help="Directory of reference images")
+    parser.add_argument("--variants", default="script,script@192", help="Comma-separated optimize[@input_size] variants (default: script,script@192)")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the set; the fastest counts (default: 3)")
+    parser.add_argument("--output", help="Also write the report as JSON")
+    add_model_arguments(parser, optimize=False)
+    args = parser.parse_args(argv)
+
+    images = [decode_image(str(f))[0] for f in find_images(args.reference_dir)]
+    if not images:
+        raise SystemExit(f"No images found in {args.reference_dir}")
+    report = drift_report(images, args.model, args.variants.split(","), args.weights, args.midas_repo, args.repeat)
+    print(f"{report['model']} float32: {report['baseline']['images_per_sec']:.2f} images/s on {len(images)} images")
+    print(f"{'variant':<28} {'img/s':>7} {'speedup':>8} {'abs_rel':>8} {'rmse_rel':>9} {'pearson':>8}")
+    for name, v in report["variants"].items():
+        print(f"{name:<28} {v['images_per_sec']:>7.2f} {v['speedup']:>7.2f}x {v['abs_rel']:>8.4f} "
+              f"{v['rmse_rel']:>9.4f} {v['pearson']:>8.4f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
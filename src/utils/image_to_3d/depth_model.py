@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+MiDaS model loading shared by the image-to-3D scripts.
+Supports three ways of getting a depth model:
+    - torch.hub (default, needs network or a populated hub cache)
+    - fully offline from a local weights file, optionally with a local MiDaS checkout
+    - a cheap stub model for tests and dry runs
+Opt-in fast CPU inference (--optimize script) runs a frozen TorchScript trace of
+the model. There is no int8 mode: dynamic quantization only covers Linear layers,
+and convolutional MiDaS_small has almost none. --input-size changes the network
+input resolution (default 256).
+Measure the speed/accuracy trade-off with depth_drift_report.py.
+Offline example (after one online run has populated the hub cache):
+    --midas-repo ~/.cache/torch/hub/intel-isl_MiDaS_master
+    --weights ~/.cache/torch/hub/checkpoints/midas_v21_small_256.pt
+torch and cv2 are imported on first use (the networks live in depth_networks.py),
+so importing this module for its constants and CLI flags stays cheap.
+"""
+
+import functools
+import numpy as np
+from pathlib import Path
+
+MODEL_TYPE = "MiDaS_small"  # lightweight version
+STUB_MODEL_TYPE = "stub"
+# Bump whenever preprocessing changes so stale cached depths are not reused
+TRANSFORM_VERSION = "small_transform-v1"
+
+_NET_SIZE = 256
+_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+def _constrain_to_multiple_of(x, multiple=32, max_val=None):
+    y = int(np.round(x / multiple) * multiple)
+    if max_val is not None and y > max_val:
+        y = int(np.floor(x / multiple) * multiple)
+    if y < multiple:
+        y = multiple
+    return y
+
+OPTIMIZE_MODES = ["none", "script"]
+
+def small_transform(img, net_size=_NET_SIZE):
+    """Local equivalent of MiDaS `small_transform`, so no hub download is needed.
+
+    Resizes to fit within net_size x net_size keeping aspect ratio (sides multiple
+    of 32), normalizes with ImageNet statistics and returns a 1x3xHxW float tensor.
+    """
+    import cv2
+    h, w = img.shape[:2]
+    scale = min(net_size / h, net_size / w)
+    new_h = _constrain_to_multiple_of(scale * h, max_val=net_size)
+    new_w = _constrain_to_multiple_of(scale * w, max_val=net_size)
+    resized = cv2.resize(img.astype(np.float32) / 255.0, (new_w, new_h), interpolation=cv2.INTER_CUBIC)
+    normalized = (resized - _MEAN) / _STD
+    chw = np.ascontiguousarray(normalized.transpose(2, 0, 1))
+    import torch
+    return torch.from_numpy(chw).unsqueeze(0)
+
+def optimize_model(midas, mode):
+    """Wrap an eager float32 model for faster CPU inference; mode is one of OPTIMIZE_MODES."""
+    import torch
+    from depth_networks import TracedDepthModel
+    if mode == "none" or isinstance(midas, torch.jit.ScriptModule):
+        return midas
+    if mode != "script":
+        raise ValueError(f"Unknown optimize mode {mode!r}; choose from {OPTIMIZE_MODES}")
+    return TracedDepthModel(midas).eval()
+
+def model_variant(model_type=MODEL_TYPE, optimize="none", input_size=None):
+    """Name of a model configuration; it keys the depth cache, so optimized or
+    resized variants never reuse float32 depth maps (and vice versa)."""
+    variant = model_type
+    if optimize != "none":
+        variant += f"+{optimize}"
+    if input_size and input_size != _NET_SIZE:
+        variant += f"@{input_size}"
+    return variant
+
+def _hub_repo_dir():
+    """Return the cached MiDaS hub checkout if one exists."""
+    import torch
+    repo = Path(torch.hub.get_dir()) / "intel-isl_MiDaS_master"
+    return repo if (repo / "hubconf.py").exists() else None
+
+def _load_weights(model, weights_path):
+    import torch
+    state = torch.load(weights_path, map_location="cpu")
+    if isinstance(state, dict) and "state_dict" in state:
+        state = state["state_dict"]
+    model.load_state_dict(state)
+    return model
+
+def load_midas_model(model_type=MODEL_TYPE, weights_path=None, repo_dir=None, optimize="none", input_size=None):
+    """Load a depth model and its input transform.
+
+    optimize and input_size select the fast inference variant (see the module
+    docstring); input_size always uses the local small_transform.
+    """
+    midas, transform = _load_eager(model_type, weights_path, repo_dir)
+    if input_size and input_size != _NET_SIZE:
+        transform = functools.partial(small_transform, net_size=_constrain_to_multiple_of(input_size))
+    return optimize_model(midas, optimize), transform
+
+def _load_eager(model_type, weights_path, repo_dir):
+    """Load the float32 model and its input transform.
+
+    Args:
+        model_type: MiDaS hub entry point, or "stub" for the test model
+        weights_path: Local weights; a TorchScript archive, a pickled module or a
+            state dict (the latter needs the MiDaS code from repo_dir or the hub cache)
+        repo_dir: Local MiDaS checkout used instead of downloading from GitHub
+    """
+    import torch
+    if model_type == STUB_MODEL_TYPE:
+        from depth_networks import StubDepthModel
+        return StubDepthModel().eval(), small_transform
+
+    if weights_path is None and repo_dir is None:
+        midas = torch.hub.load("intel-isl/MiDaS", model_type)
+        midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
+        return midas.eval(), midas_transforms.small_transform
+
+    repo_dir = Path(repo_dir) if repo_dir else _hub_repo_dir()
+    transform = small_transform
+    if repo_dir is not None:
+        midas_transforms = torch.hub.load(str(repo_dir), "transforms", source="local")
+        transform = midas_transforms.small_transform
+
+    if weights_path is None:
+        midas = torch.hub.load(str(repo_dir), model_type, source="local")
+        return midas.eval(), transform
+
+    weights_path = Path(weights_path)
+    if not weights_path.exists():
+        raise FileNotFoundError(f"MiDaS weights {weights_path} not found")
+    try:
+        return torch.jit.load(str(weights_path), map_location="cpu").eval(), transform
+    except RuntimeError:
+        pass  # not TorchScript
+    obj = torch.load(weights_path, map_location="cpu", weights_only=False)
+    if isinstance(obj, torch.nn.Module):
+        return obj.eval(), transform
+    if repo_dir is None:
+        raise FileNotFoundError(
+            f"{weights_path} is a state dict; pass --midas-repo pointing at a local MiDaS checkout")
+    midas = torch.hub.load(str(repo_dir), model_type, source="local", pretrained=False)
+    return _load_weights(midas, weights_path).eval(), transform
+
+def predict_depth(img, midas, transform):
+    """Run depth inference on an RGB uint8 image and return a float32 HxW array.
+
+    Remote models (depth_server.DepthClient) take the raw image and are passed
+    with transform=None.
+    """
+    if transform is None:
+        return midas.predict(img)
+    import torch
+    input_batch = transform(img).to("cpu")
+    with torch.no_grad():
+        prediction = midas(input_batch)
+        depth = prediction.squeeze().cpu().numpy()
+    return depth.astype(np.float32, copy=False)
+
+def add_model_arguments(parser, optimize=True):
+    """Register the model-selection flags shared by the image-to-3D CLIs
+    (optimize=False leaves out the fast-inference flags)."""
+    parser.add_argument("--model", default=MODEL_TYPE, help=f"MiDaS model type, or '{STUB_MODEL_TYPE}' for the test model (default: {MODEL_TYPE})")
+    parser.add_argument("--weights", help="Local MiDaS weights file; loads without network access")
+    parser.add_argument("--midas-repo", help="Local MiDaS checkout to build the model from (default: torch hub cache)")
+    if not optimize:
+        return
+    parser.add_argument("--optimize", choices=OPTIMIZE_MODES, default="none", help="Fast CPU inference: frozen TorchScript trace (default: none)")
+    parser.add_argument("--input-size", type=int, help=f"Network input resolution, a multiple of 32 (default: {_NET_SIZE})")
+
+def model_from_args(args):
+    """(loader, model_variant) for the flags registered by add_model_arguments."""
+    loader = lambda: load_midas_model(args.model, args.weights, args.midas_repo, args.optimize, args.input_size)
+    return loader, model_variant(args.model, args.optimize, args.input_size)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+torch modules used by depth_model.py, kept apart so torch is only imported when a
+model is actually built.
+"""
+
+import torch
+
+class StubDepthModel(torch.nn.Module):
+    """Stand-in for MiDaS: inverse-depth from image brightness. Instant to build, for tests."""
+
+    def forward(self, x):
+        # Brighter pixels read as closer, like MiDaS relative inverse depth
+        return (x.mean(dim=1) + 3.0) * 100.0
+
+class TracedDepthModel(torch.nn.Module):
+    """Runs a frozen, inference-optimized TorchScript trace of model.
+
+    Traces bake in the input shape, and MiDaS input shapes follow each image's
+    aspect ratio, so one trace is kept per shape (creature views share a size).
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self._traced = {}
+
+    def forward(self, x):
+        traced = self._traced.get(tuple(x.shape))
+        if traced is None:
+            with torch.no_grad():
+                traced = torch.jit.optimize_for_inference(torch.jit.trace(self.model, x, check_trace=False))
+            self._traced[tuple(x.shape)] = traced
+        return traced(x)
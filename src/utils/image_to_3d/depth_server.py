@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Long-lived depth estimation worker on a Unix socket.
+Keeps a MiDaS model resident so batch jobs pay model construction once instead of
+per asset. Clients send raw RGB images and get float32 depth maps back.
+Run:
+    python depth_server.py [--socket /tmp/image_to_3d_depth.sock] [--weights midas.pt] [--model stub]
+    python image_to_3d_trimesh.py images/roach --server /tmp/image_to_3d_depth.sock
+Wire format, both directions: 4-byte big-endian header length, JSON header, raw payload
+of header["nbytes"] bytes.
+"""
+
+import os
+import json
+import socket
+import struct
+import threading
+import socketserver
+import numpy as np
+
+DEFAULT_SOCKET = "/tmp/image_to_3d_depth.sock"
+
+def _recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    while n:
+        got = sock.recv_into(view, n)
+        if got == 0:
+            raise ConnectionError("socket closed mid-message")
+        view = view[got:]
+        n -= got
+    return buf
+
+def send_message(sock, header, payload=b""):
+    header = dict(header, nbytes=len(payload))
+    data = json.dumps(header).encode("utf-8")
+    sock.sendall(struct.pack(">I", len(data)) + data)
+    if payload:
+        sock.sendall(payload)
+
+def recv_message(sock):
+    (length,) = struct.unpack(">I", _recv_exact(sock, 4))
+    header = json.loads(_recv_exact(sock, length).decode("utf-8"))
+    payload = _recv_exact(sock, header.get("nbytes", 0))
+    return header, payload
+
+class DepthClient:
+    """Client for depth_server.py; usable anywhere a (midas, transform=None) pair is."""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=300):
+        self.socket_path = socket_path
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(socket_path)
+        self.model_type = self._request({"op": "ping"})[0]["model_type"]
+
+    def _request(self, header, payload=b""):
+        send_message(self.sock, header, payload)
+        reply, data = recv_message(self.sock)
+        if not reply.get("ok"):
+            raise RuntimeError(f"depth server error: {reply.get('error')}")
+        return reply, data
+
+    def predict(self, img):
+        img = np.ascontiguousarray(img, dtype=np.uint8)
+        reply, data = self._request({"op": "predict", "shape": list(img.shape)}, img.tobytes())
+        return np.frombuffer(data, dtype=np.float32).reshape(reply["shape"])
+
+    def shutdown(self):
+        self._request({"op": "shutdown"})
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class _DepthRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server
+        while True:
+            try:
+                header, payload = recv_message(self.request)
+            except (ConnectionError, struct.error):
+                return
+            op = header.get("op")
+            try:
+                if op == "ping":
+                    send_message(self.request, {"ok": True, "model_type": server.model_type})
+                elif op == "predict":
+                    img = np.frombuffer(payload, dtype=np.uint8).reshape(header["shape"])
+                    with server.model_lock:
+                        depth = server.predict(img)
+                    depth = np.ascontiguousarray(depth, dtype=np.float32)
+                    send_message(self.request, {"ok": True, "shape": list(depth.shape)}, depth.tobytes())
+                elif op == "shutdown":
+                    send_message(self.request, {"ok": True})
+                    threading.Thread(target=server.shutdown, daemon=True).start()
+                    return
+                else:
+                    send_message(self.request, {"ok": False, "error": f"unknown op {op!r}"})
+            except Exception as e:
+                send_message(self.request, {"ok": False, "error": str(e)})
+
+class DepthServer(socketserver.ThreadingUnixStreamServer):
+    """Unix-socket server holding one resident depth model; inference is serialized."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, midas, transform, model_type):
+        from depth_model import predict_depth
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        super().__init__(socket_path, _DepthRequestHandler)
+        self.socket_path = socket_path
+        self.model_type = model_type
+        self.model_lock = threading.Lock()
+        self.predict = lambda img: predict_depth(img, midas, transform)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+def main(argv=None):
+    import argparse
+    from depth_model import model_from_args, add_model_arguments
+    parser = argparse.ArgumentParser(description="Serve MiDaS depth estimation over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help=f"Socket path (default: {DEFAULT_SOCKET})")
+    add_model_arguments(parser)
+    args = parser.parse_args(argv)
+    model_loader, model_type = model_from_args(args)
+    midas, transform = model_loader()
+    with DepthServer(args.socket, midas, transform, model_type) as server:
+        print(f"Depth server ({model_type}) listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    print("Depth server stopped")
+
+if __name__ == "__main__":
+    main()
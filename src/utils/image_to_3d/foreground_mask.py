@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Foreground segmentation for the generated creature views.
+The batch_gen_auto.py renders sit on a plain "studio background"; masking the
+subject before back-projection keeps those pixels out of the point cloud.
+Methods, in the order "auto" tries them:
+    alpha - use the image's alpha channel when it has real transparency
+    color - key out the background colour sampled from the image border
+    depth - Otsu threshold on MiDaS inverse depth, keeping the largest component
+cv2 is imported where it is used, so importing this module for MASK_METHODS
+(as the CLIs do) stays cheap.
+"""
+
+import numpy as np
+
+MASK_METHODS = ["auto", "alpha", "color", "depth", "none"]
+
+# Border colour spread (per-channel std, 0-255) below which the background is
+# treated as a flat colour that can be keyed out
+_FLAT_BORDER_STD = 12.0
+
+def largest_component(mask):
+    """Keep only the largest 8-connected region of a boolean mask."""
+    import cv2
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask.astype(np.uint8), connectivity=8)
+    if count <= 1:
+        return mask.astype(bool)
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    return labels == largest
+
+def _clean(mask, kernel_size=5):
+    import cv2
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+    mask = cv2.morphologyEx(mask.astype(np.uint8), cv2.MORPH_OPEN, kernel)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    return largest_component(mask)
+
+def _border_pixels(img, width=4):
+    return np.concatenate([
+        img[:width].reshape(-1, img.shape[2]), img[-width:].reshape(-1, img.shape[2]),
+        img[:, :width].reshape(-1, img.shape[2]), img[:, -width:].reshape(-1, img.shape[2]),
+    ])
+
+def has_flat_background(img):
+    return bool(np.all(_border_pixels(img).std(axis=0) < _FLAT_BORDER_STD))
+
+def alpha_mask(alpha, threshold=127):
+    return _clean(alpha > threshold)
+
+def color_key_mask(img, tolerance=40.0):
+    """Mask pixels further than tolerance (RGB distance) from the median border colour."""
+    background = np.median(_border_pixels(img), axis=0).astype(np.float32)
+    distance = np.linalg.norm(img.astype(np.float32) - background, axis=2)
+    return _clean(distance > tolerance)
+
+def depth_mask(depth):
+    """Otsu split of relative inverse depth (nearer is larger), largest component kept."""
+    import cv2
+    lo, hi = float(depth.min()), float(depth.max())
+    if hi <= lo:
+        return np.ones(depth.shape, dtype=bool)
+    scaled = ((depth - lo) * (255.0 / (hi - lo))).astype(np.uint8)
+    _, near = cv2.threshold(scaled, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return _clean(near.astype(bool))
+
+def foreground_mask(img, alpha=None, depth=None, method="auto"):
+    """Return (mask, method_used) with mask at the resolution of depth if given, else img.
+
+    Returns (None, "none") when masking is disabled or nothing usable was found.
+    """
+    target_shape = depth.shape if depth is not None else img.shape[:2]
+    mask = None
+    if method == "auto":
+        if alpha is not None and alpha.min() < 255:
+            method = "alpha"
+        elif has_flat_background(img):
+            method = "color"
+        elif depth is not None:
+            method = "depth"
+        else:
+            method = "none"
+
+    if method == "alpha" and alpha is not None:
+        mask = alpha_mask(alpha)
+    elif method == "color":
+        mask = color_key_mask(img)
+    elif method == "depth" and depth is not None:
+        mask = depth_mask(depth)
+    else:
+        return None, "none"
+
+    if not mask.any():
+        return None, "none"
+    if mask.shape != tuple(target_shape):
+        import cv2
+        mask = cv2.resize(mask.astype(np.uint8), (target_shape[1], target_shape[0]),
+                          interpolation=cv2.INTER_NEAREST).astype(bool)
+    return mask, method
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for Stable Diffusion img2img results.
+With a fixed seed the web UI is deterministic, so a generation is keyed by the
+SHA-256 of its full payload: every parameter plus the hashes of the init images
+(and mask), not their base64 text. A re-run only calls the server for payloads
+it has not seen; cached images are copied straight to the output path.
+Each entry is <key>.png next to a <key>.json record of the prompt, seed, init
+image hashes and parameters that produced it.
+Run:
+    python generation_cache.py [--cache-dir DIR] [--clear]
+"""
+
+import os
+import json
+import time
+import shutil
+import base64
+import hashlib
+import tempfile
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("SD_CACHE_DIR", Path.home() / ".cache" / "image_to_3d" / "sd"))
+# Payload fields holding base64 images; they are keyed by content hash
+IMAGE_FIELDS = ("init_images", "mask")
+
+def image_sha256(image_base64):
+    return hashlib.sha256(base64.b64decode(image_base64)).hexdigest()
+
+def describe_payload(payload):
+    """The payload with base64 images replaced by their SHA-256 (small and stable)."""
+    described = dict(payload)
+    for field in IMAGE_FIELDS:
+        value = described.get(field)
+        if isinstance(value, list):
+            described[field] = [image_sha256(v) for v in value]
+        elif isinstance(value, str):
+            described[field] = image_sha256(value)
+    return described
+
+class GenerationCache:
+    """Content-addressed store of generated images, keyed by request payload."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(payload):
+        """Hash everything that affects the generated image."""
+        canonical = json.dumps(describe_payload(payload), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.png"
+
+    def __contains__(self, key):
+        return self._path(key).exists()
+
+    def fetch(self, key, output_path):
+        """Copy the cached image for key to output_path; False on a miss."""
+        output_path = Path(output_path)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            shutil.copyfile(self._path(key), output_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def put(self, key, image_path, payload):
+        """Store a generated image and its parameters atomically."""
+        record = {"key": key, "created": time.time(), "payload": describe_payload(payload)}
+        fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f, open(image_path, "rb") as src:
+                shutil.copyfileobj(src, f)
+            os.replace(tmp_name, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+            raise
+        self._path(key).with_suffix(".json").write_text(json.dumps(record, indent=2))
+
+    def record(self, key):
+        """Parameters stored with an entry, or None."""
+        try:
+            return json.loads(self._path(key).with_suffix(".json").read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def entries(self):
+        """List (path, size) for every cached image."""
+        return [(path, path.stat().st_size) for path in sorted(self.cache_dir.glob("*.png"))]
+
+    def clear(self):
+        for path in list(self.cache_dir.glob("*.png")) + list(self.cache_dir.glob("*.json")):
+            path.unlink(missing_ok=True)
+
+def write_manifest(path, entries):
+    """Write the run manifest: one entry per output image with its key, source
+    ("cache" or "generated", or the error), prompt, seed and init image hashes."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps({"generated_at": time.time(), "images": entries}, indent=2))
+    os.replace(tmp, path)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Inspect or clear the image generation cache")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"Cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--clear", action="store_true", help="Delete all cached generations")
+    args = parser.parse_args(argv)
+    cache = GenerationCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print(f"Cleared generation cache at {cache.cache_dir}")
+    else:
+        entries = cache.entries()
+        print(f"Generation cache: {cache.cache_dir}")
+        print(f"  {len(entries)} images, {sum(e[1] for e in entries) / 1024 ** 2:.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+GLB writers for the image-to-3D exports.
+export_lod_glb re-opens a trimesh-written GLB to add an MSFT_lod chain.
+write_optimized_glb is a standalone writer for runtime use: welded vertices,
+vertex-cache and fetch-ordered indices, and KHR_mesh_quantization attributes.
+"""
+
+import json
+import struct
+import numpy as np
+from collections import deque
+
+GLB_MAGIC = 0x46546C67  # "glTF"
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+def read_glb(data):
+    """Split GLB bytes into (gltf dict, binary chunk bytes)."""
+    magic, version, _ = struct.unpack_from("<III", data, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError("not a glTF 2.0 binary")
+    offset = 12
+    gltf, binary = None, b""
+    while offset < len(data):
+        length, chunk_type = struct.unpack_from("<II", data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        if chunk_type == CHUNK_JSON:
+            gltf = json.loads(chunk.decode("utf-8"))
+        elif chunk_type == CHUNK_BIN:
+            binary = bytes(chunk)
+        offset += 8 + length
+    return gltf, binary
+
+def write_glb(gltf, binary=b""):
+    """Pack a gltf dict and binary buffer into GLB bytes (4-byte aligned chunks)."""
+    json_bytes = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_bytes += b" " * (-len(json_bytes) % 4)
+    binary = bytes(binary) + b"\0" * (-len(binary) % 4)
+    chunks = struct.pack("<II", len(json_bytes), CHUNK_JSON) + json_bytes
+    if binary:
+        chunks += struct.pack("<II", len(binary), CHUNK_BIN) + binary
+    return struct.pack("<III", GLB_MAGIC, 2, 12 + len(chunks)) + chunks
+
+def export_lod_glb(meshes, path, coverages=None):
+    """Write meshes (finest first) into one GLB as an MSFT_lod chain.
+
+    The first mesh's node is the only scene root and lists the coarser nodes in
+    its MSFT_lod extension. coverages (one per mesh) are written as
+    MSFT_screencoverage extras so loaders know when to switch levels.
+    """
+    import trimesh
+
+    names = [f"lod{i}" for i in range(len(meshes))]
+    scene = trimesh.Scene()
+    for name, mesh in zip(names, meshes):
+        scene.add_geometry(mesh, node_name=name, geom_name=name)
+    gltf, binary = read_glb(scene.export(file_type="glb"))
+
+    node_index = {node.get("name"): i for i, node in enumerate(gltf["nodes"])}
+    root = gltf["nodes"][node_index[names[0]]]
+    root.setdefault("extensions", {})["MSFT_lod"] = {"ids": [node_index[n] for n in names[1:]]}
+    if coverages is not None:
+        root.setdefault("extras", {})["MSFT_screencoverage"] = list(coverages)
+    # Coarser levels are reached through the extension, not the scene graph
+    lod_nodes = {node_index[n] for n in names[1:]}
+    for node in gltf["nodes"]:
+        if "children" in node:
+            node["children"] = [c for c in node["children"] if c not in lod_nodes]
+            if not node["children"]:
+                del node["children"]
+    for scene_def in gltf.get("scenes", []):
+        scene_def["nodes"] = [n for n in scene_def["nodes"] if n not in lod_nodes]
+    used = gltf.setdefault("extensionsUsed", [])
+    if "MSFT_lod" not in used:
+        used.append("MSFT_lod")
+
+    with open(path, "wb") as f:
+        f.write(write_glb(gltf, binary))
+
+# glTF enums
+_FLOAT, _BYTE, _UNSIGNED_BYTE, _UNSIGNED_SHORT, _UNSIGNED_INT = 5126, 5120, 5121, 5123, 5125
+_ARRAY_BUFFER, _ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+def weld_vertices(vertices, faces, *attributes):
+    """Merge vertices whose position and every attribute are identical.
+
+    Returns (vertices, faces, attributes...) with unused vertices dropped.
+    """
+    columns = [np.ascontiguousarray(vertices)] + [np.ascontiguousarray(a) for a in attributes]
+    rows = np.concatenate([c.reshape(len(vertices), -1).view(np.uint8).reshape(len(vertices), -1) for c in columns], axis=1)
+    _, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    welded_faces = inverse[faces]
+    return (vertices[first], welded_faces) + tuple(a[first] for a in attributes)
+
+def acmr(faces, cache_size=16):
+    """Average cache miss ratio (misses per triangle) for a FIFO post-transform cache."""
+    cache = deque()
+    resident = set()
+    misses = 0
+    for v in np.asarray(faces).ravel().tolist():
+        if v not in resident:
+            misses += 1
+            cache.append(v)
+            resident.add(v)
+            if len(cache) > cache_size:
+                resident.discard(cache.popleft())
+    return misses / max(len(faces), 1)
+
+def optimize_vertex_cache(faces, num_vertices, cache_size=16):
+    """Reorder triangles for post-transform cache reuse (Tipsify, Sander et al. 2007)."""
+    faces = np.asarray(faces, dtype=np.int64)
+    num_faces = len(faces)
+    if num_faces == 0:
+        return faces
+    # Vertex -> triangle adjacency in CSR form
+    corner_vertex = faces.ravel()
+    order = np.argsort(corner_vertex, kind="stable")
+    adjacency = (order // 3).tolist()
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(corner_vertex, minlength=num_vertices))]).tolist()
+    live = np.bincount(corner_vertex, minlength=num_vertices).tolist()
+    cache_time = [0] * num_vertices
+    emitted = [False] * num_faces
+    tri = faces.tolist()
+    dead_end = []
+    output = []
+    stamp = cache_size + 1
+    cursor = 0
+    fan = int(corner_vertex[0])
+
+    while fan >= 0:
+        candidates = []
+        for t in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            output.append(t)
+            for v in tri[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if stamp - cache_time[v] > cache_size:
+                    cache_time[v] = stamp
+                    stamp += 1
+        # Next fanning vertex: the candidate still in cache with the most use left
+        fan, best = -1, -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = stamp - cache_time[v] if stamp - cache_time[v] + 2 * live[v] <= cache_size else 0
+                if priority > best:
+                    best, fan = priority, v
+        if fan == -1:
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+        if fan == -1:
+            while cursor < num_vertices:
+                if live[cursor] > 0:
+                    fan = cursor
+                    break
+                cursor += 1
+    return faces[output]
+
+def optimize_vertex_fetch(faces, *attributes):
+    """Renumber vertices in order of first use so vertex fetches walk memory linearly."""
+    flat = faces.ravel()
+    _, first = np.unique(flat, return_index=True)
+    order = flat[np.sort(first)]
+    remap = np.empty(len(attributes[0]), dtype=np.int64)
+    remap[order] = np.arange(len(order))
+    return (remap[faces],) + tuple(a[order] for a in attributes)
+
+def _mesh_arrays(mesh):
+    vertices = np.asarray(mesh.vertices, dtype=np.float64)
+    faces = np.asarray(mesh.faces, dtype=np.int64)
+    normals = np.asarray(mesh.vertex_normals, dtype=np.float64)
+    colors = None
+    if getattr(mesh.visual, "kind", None) == "vertex":
+        colors = np.asarray(mesh.visual.vertex_colors, dtype=np.uint8)
+    return vertices, faces, normals, colors
+
+class _BufferBuilder:
+    """Accumulates aligned bufferViews and accessors for one binary buffer."""
+
+    def __init__(self):
+        self.chunks = []
+        self.length = 0
+        self.buffer_views = []
+        self.accessors = []
+
+    def add(self, array, component_type, accessor_type, target, normalized=False,
+            byte_stride=None, count=None, min_max=True):
+        data = np.ascontiguousarray(array)
+        raw = data.tobytes()
+        self.length += -self.length % 4
+        self.chunks.append((self.length, raw))
+        view = {"buffer": 0, "byteOffset": self.length, "byteLength": len(raw), "target": target}
+        if byte_stride:
+            view["byteStride"] = byte_stride
+        self.buffer_views.append(view)
+        self.length += len(raw)
+        accessor = {
+            "bufferView": len(self.buffer_views) - 1,
+            "componentType": component_type,
+            "count": int(count if count is not None else len(data)),
+            "type": accessor_type,
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if min_max:
+            values = data.reshape(accessor["count"], -1)[:, :{"SCALAR": 1, "VEC3": 3, "VEC4": 4}[accessor_type]]
+            accessor["min"] = values.min(axis=0).tolist()
+            accessor["max"] = values.max(axis=0).tolist()
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+    def tobytes(self):
+        out = bytearray(self.length)
+        for offset, raw in self.chunks:
+            out[offset:offset + len(raw)] = raw
+        return bytes(out)
+
+def _pad_to_stride(array, width):
+    """Pad Nxk rows to width columns so attribute strides stay 4-byte aligned."""
+    if array.shape[1] == width:
+        return array
+    padded = np.zeros((len(array), width), dtype=array.dtype)
+    padded[:, :array.shape[1]] = array
+    return padded
+
+def _encode_mesh(builder, mesh, quantize, cache_size, measure_acmr):
+    """Weld, reorder and encode one mesh; returns (gltf mesh dict, node transform, report)."""
+    vertices, faces, normals, colors = _mesh_arrays(mesh)
+    report = {"vertices_before": int(len(vertices))}
+    if measure_acmr:
+        report["acmr_before"] = acmr(faces, cache_size)
+    node = {}
+
+    if quantize:
+        lo = vertices.min(axis=0)
+        extent = float((vertices.max(axis=0) - lo).max()) or 1.0
+        scale = extent / 65535.0
+        positions = np.round((vertices - lo) / scale).astype(np.uint16)
+        normal_q = np.round(np.clip(normals, -1, 1) * 127).astype(np.int8)
+        node = {"translation": lo.tolist(), "scale": [scale] * 3}
+    else:
+        positions = vertices.astype(np.float32)
+        normal_q = normals.astype(np.float32)
+    attributes = [normal_q] + ([colors] if colors is not None else [])
+    positions, faces, *attributes = weld_vertices(positions, faces, *attributes)
+    faces = optimize_vertex_cache(faces, len(positions), cache_size)
+    faces, positions, *attributes = optimize_vertex_fetch(faces, positions, *attributes)
+    normal_q = attributes[0]
+    colors = attributes[1] if colors is not None else None
+    report["vertices_after"] = int(len(positions))
+    if measure_acmr:
+        report["acmr_after"] = acmr(faces, cache_size)
+
+    gltf_attributes = {}
+    if quantize:
+        gltf_attributes["POSITION"] = builder.add(_pad_to_stride(positions, 4), _UNSIGNED_SHORT, "VEC3", _ARRAY_BUFFER, byte_stride=8)
+        gltf_attributes["NORMAL"] = builder.add(_pad_to_stride(normal_q, 4), _BYTE, "VEC3", _ARRAY_BUFFER, normalized=True, byte_stride=4, min_max=False)
+    else:
+        gltf_attributes["POSITION"] = builder.add(positions, _FLOAT, "VEC3", _ARRAY_BUFFER)
+        gltf_attributes["NORMAL"] = builder.add(normal_q, _FLOAT, "VEC3", _ARRAY_BUFFER, min_max=False)
+    if colors is not None:
+        gltf_attributes["COLOR_0"] = builder.add(_pad_to_stride(colors, 4), _UNSIGNED_BYTE, "VEC4", _ARRAY_BUFFER, normalized=True, min_max=False)
+    index_type = np.uint16 if len(positions) < 65535 else np.uint32
+    indices = builder.add(faces.astype(index_type).ravel(), _UNSIGNED_SHORT if index_type is np.uint16 else _UNSIGNED_INT,
+                          "SCALAR", _ELEMENT_ARRAY_BUFFER, min_max=False)
+    primitive = {"attributes": gltf_attributes, "indices": indices, "material": 0, "mode": 4}
+    return {"primitives": [primitive]}, node, report
+
+def write_optimized_glb(meshes, path, quantize=True, cache_size=16, lod_coverages=None, measure_acmr=False):
+    """Write one mesh, or an MSFT_lod chain of meshes (finest first), as a runtime-optimized GLB.
+
+    Duplicate vertices are welded, triangles reordered for the post-transform
+    vertex cache (Tipsify) and vertices for fetch locality. With quantize,
+    positions become uint16 (dequantized by the node scale/translation), normals
+    int8 and colours uint8 via KHR_mesh_quantization.
+    The reorder is a per-triangle Python loop, so callers pass meshes that are
+    already decimated (each LOD is reordered on its own, after decimation).
+    Returns a report with before/after bytes and vertex counts per mesh, plus the
+    before/after ACMR with measure_acmr (another Python loop per mesh, so off by default).
+    """
+    if not isinstance(meshes, (list, tuple)):
+        meshes = [meshes]
+    builder = _BufferBuilder()
+    gltf = {
+        "asset": {"version": "2.0", "generator": "image_to_3d glb_export"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [],
+        "meshes": [],
+        "materials": [{"pbrMetallicRoughness": {"baseColorFactor": [1, 1, 1, 1], "metallicFactor": 0.0, "roughnessFactor": 1.0}}],
+    }
+    reports = []
+    for i, mesh in enumerate(meshes):
+        gltf_mesh, node, report = _encode_mesh(builder, mesh, quantize, cache_size, measure_acmr)
+        gltf["meshes"].append(gltf_mesh)
+        gltf["nodes"].append(dict(node, name=f"lod{i}" if len(meshes) > 1 else "mesh", mesh=i))
+        report["bytes_before"] = len(mesh.export(file_type="glb"))
+        reports.append(report)
+    if len(meshes) > 1:
+        gltf["nodes"][0]["extensions"] = {"MSFT_lod": {"ids": list(range(1, len(meshes)))}}
+        if lod_coverages is not None:
+            gltf["nodes"][0]["extras"] = {"MSFT_screencoverage": list(lod_coverages)}
+        gltf["extensionsUsed"] = ["MSFT_lod"]
+    if quantize:
+        gltf.setdefault("extensionsUsed", []).append("KHR_mesh_quantization")
+        gltf["extensionsRequired"] = ["KHR_mesh_quantization"]
+    binary = builder.tobytes()
+    gltf["buffers"] = [{"byteLength": len(binary)}]
+    gltf["bufferViews"] = builder.buffer_views
+    gltf["accessors"] = builder.accessors
+    data = write_glb(gltf, binary)
+    with open(path, "wb") as f:
+        f.write(data)
+    return {"bytes_after": len(data), "bytes_before": sum(r["bytes_before"] for r in reports), "meshes": reports}
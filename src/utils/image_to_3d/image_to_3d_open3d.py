@@ -1,71 +1,90 @@
 #!/usr/bin/env python3
 """
 Convert an image to a 3D mesh using MiDaS depth estimation and Open3D.
+Decoding, depth inference and back-projection are shared with image_to_3d_trimesh.py;
+this module adds the Open3D meshers, which also serve as the "open3d" mesher of
+the multi-view pipeline (--mesher open3d). open3d is imported only when meshing.
 Dependencies:
     pip install torch torchvision torchaudio
     pip install opencv-python
     pip install open3d
 Run:
-    python image_to_3d.py input.jpg --output output.obj
+    python image_to_3d_open3d.py input.jpg --output output.obj [--weights midas.pt | --server /tmp/image_to_3d_depth.sock]
 """
 
-import os
-import cv2
-import torch
 import numpy as np
-import open3d as o3d
-
-def load_midas_model():
-    model_type = "MiDaS_small"  # lightweight version
-    midas = torch.hub.load("intel-isl/MiDaS", model_type)
-    midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-    transform = midas_transforms.small_transform
-    return midas, transform
+from depth_model import load_midas_model, predict_depth, add_model_arguments, model_from_args
+from image_to_3d_trimesh import decode_image, depth_to_point_cloud
 
 def estimate_depth(image_path, midas, transform):
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    input_batch = transform(img).to("cpu")
-    with torch.no_grad():
-        prediction = midas(input_batch)
-        depth = prediction.squeeze().cpu().numpy()
+    img = decode_image(image_path)[0]
+    depth = predict_depth(img, midas, transform)
     return depth, img
 
-def depth_to_point_cloud(depth, img):
-    h, w = depth.shape
-    fx = fy = w
-    cx, cy = w / 2, h / 2
-    points = []
-    colors = []
-    for y in range(0, h, 4):  # downsample for speed
-        for x in range(0, w, 4):
-            Z = depth[y, x]
-            X = (x - cx) * Z / fx
-            Y = (y - cy) * Z / fy
-            points.append([X, -Y, Z])
-            colors.append(img[y, x] / 255.0)
-    return np.array(points), np.array(colors)
+def _o3d_point_cloud(points, colors=None):
+    import open3d as o3d
+    pcd = o3d.geometry.PointCloud()
+    pcd.points = o3d.utility.Vector3dVector(np.asarray(points, dtype=np.float64))
+    if colors is not None:
+        pcd.colors = o3d.utility.Vector3dVector(np.asarray(colors, dtype=np.float64) / 255.0)
+    return pcd
 
 def reconstruct_mesh(points):
-    pcd = o3d.geometry.PointCloud()
-    pcd.points = o3d.utility.Vector3dVector(points)
+    import open3d as o3d
+    pcd = _o3d_point_cloud(points)
     pcd.estimate_normals()
     mesh = o3d.geometry.TriangleMesh.create_from_point_cloud_alpha_shape(pcd, alpha=0.03)
     mesh.compute_vertex_normals()
     return mesh
 
-def image_to_3d(image_path, output_path="output.obj"):
-    midas, transform = load_midas_model()
+def create_open3d_mesh(points, colors=None, depth=8, density_quantile=0.02):
+    """Screened Poisson reconstruction of a combined cloud, returned as a trimesh.Trimesh.
+
+    Vertices in the lowest density_quantile of Poisson support (surface the solver
+    invented far from any point) are removed.
+    """
+    import open3d as o3d
+    import trimesh
+
+    pcd = _o3d_point_cloud(points, colors)
+    pcd.estimate_normals()
+    pcd.orient_normals_towards_camera_location(pcd.get_center())
+    # Normals now point at the centroid; flip them outwards
+    pcd.normals = o3d.utility.Vector3dVector(-np.asarray(pcd.normals))
+    mesh, densities = o3d.geometry.TriangleMesh.create_from_point_cloud_poisson(pcd, depth=depth)
+    densities = np.asarray(densities)
+    mesh.remove_vertices_by_mask(densities < np.quantile(densities, density_quantile))
+    vertex_colors = None
+    if colors is not None and mesh.has_vertex_colors():
+        vertex_colors = np.clip(np.asarray(mesh.vertex_colors) * 255.0, 0, 255).astype(np.uint8)
+    result = trimesh.Trimesh(vertices=np.asarray(mesh.vertices), faces=np.asarray(mesh.triangles),
+                             vertex_colors=vertex_colors)
+    print(f"Created Open3D Poisson mesh with {len(result.vertices)} vertices and {len(result.faces)} faces")
+    return result
+
+def image_to_3d(image_path, output_path="output.obj", model_loader=load_midas_model):
+    import open3d as o3d
+    midas, transform = model_loader()
     depth, img = estimate_depth(image_path, midas, transform)
     points, colors = depth_to_point_cloud(depth, img)
     mesh = reconstruct_mesh(points)
     o3d.io.write_triangle_mesh(output_path, mesh)
     print(f"3D model saved to {output_path}")
 
-if __name__ == "__main__":
+def main(argv=None):
     import argparse
     parser = argparse.ArgumentParser(description="Convert image to 3D mesh")
     parser.add_argument("image", help="Path to input image")
     parser.add_argument("--output", default="output.obj", help="Path to output OBJ file")
-    args = parser.parse_args()
-    image_to_3d(args.image, args.output)
+    add_model_arguments(parser)
+    parser.add_argument("--server", help="Unix socket of a running depth_server.py to use instead of loading a model")
+    args = parser.parse_args(argv)
+    if args.server:
+        from depth_server import DepthClient
+        model_loader = lambda: (DepthClient(args.server), None)
+    else:
+        model_loader, _ = model_from_args(args)
+    image_to_3d(args.image, args.output, model_loader)
+
+if __name__ == "__main__":
+    main()
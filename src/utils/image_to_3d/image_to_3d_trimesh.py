@@ -2,37 +2,80 @@
 """
 Convert multiple images from different views to a 3D mesh using MiDaS depth estimation and Trimesh.
 Combines point clouds from multiple views for better reconstruction.
-Assumes images are in order: front, front-left, left, back-left, back, back-right, right, front-right, top, bottom, close-ups.
-Creates organized output directory structure with OBJ, PLY, GLB, and metadata files.
+Each image's camera pose comes from its file name when that names a view (front.png,
+front_left.png, 03-back.png, top_2.png, head_closeup.png), as batch_gen_auto.py writes
+them; other files are assumed to be in order: front, front-left, left, back-left, back,
+back-right, right, front-right, top, bottom, close-ups.
+Creates organized output directory structure with OBJ, PLY, GLB (select with --formats), and metadata files.
 Dependencies:
     pip install torch torchvision torchaudio
     pip install opencv-python
     pip install trimesh
 Run:
     python image_to_3d_trimesh.py /path/to/image_directory [--output-dir models/custom_name] [--prefix model_name]
+Depth maps are cached on disk (see depth_cache.py), so re-runs with different meshing
+settings skip MiDaS inference. Use --no-cache to disable or --cache-dir to relocate it.
+Use --weights/--midas-repo to load MiDaS offline, or --server to reuse a warm depth_server.py.
+Use --fusion tsdf to fuse views into a bounded-memory TSDF volume (tsdf_fusion.py) instead
+of concatenating point clouds.
+GLBs are written quantized (KHR_mesh_quantization) with vertex-cache ordered indices;
+use --glb-writer trimesh for a plain float32 export.
+metadata.json records per-stage timings and peak memory; --trace writes a Chrome trace
+and IMAGE_TO_3D_PROFILE=dir (or --profile-dir) dumps a cProfile file per stage.
 """
 
 import os
-import cv2
-import torch
+import re
+import contextlib
+import queue
+import threading
 import numpy as np
-import trimesh
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from depth_cache import DepthCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from depth_model import MODEL_TYPE, TRANSFORM_VERSION, load_midas_model, predict_depth, add_model_arguments, model_from_args
+from point_cloud import PointCloud, max_points_per_view, preprocess_for_meshing, write_binary_ply
+from foreground_mask import foreground_mask, MASK_METHODS
+from tsdf_fusion import TSDFVolume
+from surface_reconstruction import reconstruct_surface
+from decimation import build_lod_chain, lod_screen_coverages, DEFAULT_LOD_RATIOS
+from glb_export import export_lod_glb, write_optimized_glb
+from mesh_to_glb import center_and_scale
+from stage_profiler import StageProfiler, PROFILE_ENV
 
-def load_midas_model():
-    model_type = "MiDaS_small"  # lightweight version
-    midas = torch.hub.load("intel-isl/MiDaS", model_type)
-    midas_transforms = torch.hub.load("intel-isl/MiDaS", "transforms")
-    transform = midas_transforms.small_transform
-    return midas, transform
-
-def estimate_depth(image_path, midas, transform):
-    img = cv2.imread(image_path)
-    img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    input_batch = transform(img).to("cpu")
-    with torch.no_grad():
-        prediction = midas(input_batch)
-        depth = prediction.squeeze().cpu().numpy()
+def depth_cache_key(image_path, model_type=MODEL_TYPE):
+    """Cache key for an image under the given model and current transform."""
+    return DepthCache.make_key(Path(image_path).read_bytes(), model_type, TRANSFORM_VERSION)
+
+def decode_image(image_path, cache=None, model_type=MODEL_TYPE):
+    """Read and decode an image, returning (rgb, alpha_or_None, cache_key, cached_depth_or_None)."""
+    import cv2
+    data = np.frombuffer(Path(image_path).read_bytes(), dtype=np.uint8)
+    img = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError(f"Could not decode {image_path}")
+    alpha = None
+    if img.dtype != np.uint8:
+        img = cv2.convertScaleAbs(img, alpha=255.0 / np.iinfo(img.dtype).max)
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+    elif img.shape[2] == 4:
+        alpha = img[:, :, 3].copy()
+        img = cv2.cvtColor(img, cv2.COLOR_BGRA2RGB)
+    else:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    if cache is None:
+        return img, alpha, None, None
+    key = DepthCache.make_key(data, model_type, TRANSFORM_VERSION)
+    return img, alpha, key, cache.get(key)
+
+def estimate_depth(image_path, midas, transform, cache=None, model_type=MODEL_TYPE):
+    img, _, key, depth = decode_image(image_path, cache, model_type)
+    if depth is not None:
+        return depth, img
+    depth = predict_depth(img, midas, transform)
+    if cache is not None:
+        cache.put(key, depth)
     return depth, img
 
 def get_camera_pose(view_name):
@@ -123,15 +166,21 @@ def get_camera_pose(view_name):
 
 def transform_point_cloud(points, colors, pose):
     """Transform point cloud from camera coordinates to world coordinates."""
-    rotation = pose['rotation']
-    translation = pose['position']
+    rotation = pose['rotation'].astype(points.dtype)
+    translation = pose['position'].astype(points.dtype)
     
-    # Apply rotation and translation
-    world_points = (rotation @ points.T).T + translation
+    # Apply rotation and translation (row vectors, so multiply by R^T)
+    world_points = points @ rotation.T + translation
     
     return world_points, colors
 
-def depth_to_point_cloud(depth, img, max_depth=None):
+def depth_to_point_cloud(depth, img, max_depth=None, step=4, mask=None):
+    """Back-project a depth map to float32 camera-space points and uint8 RGB colours.
+
+    mask (boolean, same shape as depth) restricts back-projection to the subject.
+    Colours are sampled from img at the matching position, since MiDaS returns
+    depth at network resolution rather than image resolution.
+    """
     h, w = depth.shape
     fx = fy = w
     cx, cy = w / 2, h / 2
@@ -139,20 +188,35 @@ def depth_to_point_cloud(depth, img, max_depth=None):
     if max_depth is None:
         max_depth = np.max(depth)
     
-    points = []
-    colors = []
-    for y in range(0, h, 4):  # downsample for speed
-        for x in range(0, w, 4):
-            Z = depth[y, x]
-            if Z > max_depth * 0.1:  # Filter out very close points
-                X = (x - cx) * Z / fx
-                Y = (y - cy) * Z / fy
-                points.append([X, -Y, Z])  # Y flipped for correct orientation
-                colors.append(img[y, x] / 255.0)
-    return np.array(points), np.array(colors)
-
-def create_mesh_from_point_cloud(points, colors):
-    """Create a mesh from combined point cloud using better reconstruction."""
+    # Vectorized back-projection of every step-th pixel (downsample for speed)
+    ys, xs = np.mgrid[0:h:step, 0:w:step]
+    Z = depth[ys, xs].astype(np.float32, copy=False)
+    keep = Z > max_depth * 0.1  # Filter out very close points
+    if mask is not None:
+        keep &= mask[ys, xs]
+    ys, xs, Z = ys[keep], xs[keep], Z[keep]
+    points = np.empty((len(Z), 3), dtype=np.float32)
+    points[:, 0] = (xs.astype(np.float32) - cx) * Z / fx
+    points[:, 1] = -(ys.astype(np.float32) - cy) * Z / fy  # Y flipped for correct orientation
+    points[:, 2] = Z
+    ih, iw = img.shape[:2]
+    colors = img[ys * ih // h, xs * iw // w]
+    return points, colors
+
+def create_mesh_from_point_cloud(points, colors, method="auto", workers=-1):
+    """Create a mesh from combined point cloud using better reconstruction.
+
+    method="auto" tries alpha shape, then convex hull, then surface reconstruction;
+    method="surface" goes straight to surface reconstruction and method="open3d"
+    uses Open3D Poisson reconstruction (see image_to_3d_open3d.py).
+    workers bounds the KD-tree threads of surface reconstruction (-1: all cores).
+    """
+    import trimesh
+    if method == "surface":
+        return create_surface_mesh_from_points(points, colors, workers=workers)
+    if method == "open3d":
+        from image_to_3d_open3d import create_open3d_mesh
+        return create_open3d_mesh(points, colors)
     try:
         # Create point cloud
         cloud = trimesh.PointCloud(points, colors=colors)
@@ -176,7 +240,7 @@ def create_mesh_from_point_cloud(points, colors):
         if len(mesh.faces) < 50:
             print("Convex hull too simple, creating detailed surface mesh...")
             # Create a more detailed mesh by connecting nearby points
-            mesh = create_surface_mesh_from_points(points, colors)
+            mesh = create_surface_mesh_from_points(points, colors, workers=workers)
 
         return mesh
 
@@ -184,53 +248,174 @@ def create_mesh_from_point_cloud(points, colors):
         print(f"Mesh creation failed: {e}, exporting point cloud only")
         return trimesh.Trimesh(vertices=points, faces=[])
 
-def create_surface_mesh_from_points(points, colors):
-    """Create a surface mesh by triangulating nearby points."""
+def create_surface_mesh_from_points(points, colors, resolution=128, workers=-1):
+    """Create a surface mesh from all points via KD-tree normals and a signed-distance
+    reconstruction (see surface_reconstruction.py)."""
+    import trimesh
     try:
-        # Use Delaunay triangulation in 3D
-        from scipy.spatial import Delaunay
-
-        # Simplify point cloud for triangulation
-        if len(points) > 1000:
-            # Random sampling
-            indices = np.random.choice(len(points), 1000, replace=False)
-            points_subset = points[indices]
-            colors_subset = colors[indices]
-        else:
-            points_subset = points
-            colors_subset = colors
-
-        # Create 2D projection for triangulation (simple projection onto XY plane)
-        points_2d = points_subset[:, :2]  # Use X,Y coordinates
-
-        # Triangulate
-        tri = Delaunay(points_2d)
-        faces = tri.simplices
-
-        # Filter faces to avoid degenerate triangles
-        valid_faces = []
-        for face in faces:
-            # Check triangle quality
-            p0, p1, p2 = points_subset[face]
-            # Compute triangle area
-            area = 0.5 * np.linalg.norm(np.cross(p1 - p0, p2 - p0))
-            if area > 1e-6:  # Filter very small triangles
-                valid_faces.append(face)
-
-        mesh = trimesh.Trimesh(vertices=points_subset, faces=valid_faces)
-        print(f"Created triangulated mesh with {len(mesh.vertices)} vertices and {len(mesh.faces)} faces")
-
+        vertices, faces, vertex_colors = reconstruct_surface(points, colors, resolution=resolution, workers=workers)
+        mesh = trimesh.Trimesh(vertices=vertices, faces=faces, vertex_colors=vertex_colors)
+        print(f"Created reconstructed surface mesh with {len(mesh.vertices)} vertices and {len(mesh.faces)} faces")
         return mesh
 
     except ImportError:
-        print("scipy not available for advanced triangulation, using basic mesh")
+        print("scipy/scikit-image not available for surface reconstruction, using basic mesh")
         return trimesh.Trimesh(vertices=points, faces=[])
     except Exception as e:
         print(f"Surface mesh creation failed: {e}")
         return trimesh.Trimesh(vertices=points, faces=[])
 
-def images_to_3d(image_dir, output_dir=None, output_prefix="model"):
-    """Process multiple images from different views to create 3D model."""
+def iter_view_point_clouds(views, midas, transform, cloud=None, tsdf=None, cache=None, model_type=MODEL_TYPE,
+                           decode_workers=4, queue_size=4, mask_method="auto", profiler=None):
+    """Run decode, depth inference and back-projection as overlapping stages.
+
+    views is a list of (image_path, view_name). Images are decoded (and looked up
+    in the depth cache) on a thread pool, inference runs on its own thread and
+    back-projection plus the world transform on a third, all connected by bounded
+    queues so disk I/O and NumPy work overlap with the model forward pass.
+    World points are appended to cloud (a PointCloud) in view order; its storage is
+    reserved for every view from the first depth map's size. If tsdf (a TSDFVolume)
+    is given, each depth map is also integrated into it as it arrives. Background
+    pixels are masked out before back-projection (see foreground_mask.py).
+    Each stage's spans are recorded on profiler (a StageProfiler) if given.
+    Yields (index, samples_added, mask_method, error), exactly one item per view in view order.
+    """
+    timed = profiler.stage if profiler is not None else (lambda name: contextlib.nullcontext())
+    done = object()
+    decoded = queue.Queue(maxsize=queue_size)
+    inferred = queue.Queue(maxsize=queue_size)
+    results = queue.Queue()
+
+    def decode(image_path):
+        with timed("decode"):
+            return decode_image(image_path, cache, model_type)
+
+    def feed(pool):
+        for i, (image_path, _) in enumerate(views):
+            decoded.put((i, pool.submit(decode, str(image_path))))
+        decoded.put(done)
+
+    def infer():
+        while (item := decoded.get()) is not done:
+            i, future = item
+            try:
+                img, alpha, key, depth = future.result()
+                if depth is None:
+                    with timed("depth_inference"):
+                        depth = predict_depth(img, midas, transform)
+                    if cache is not None:
+                        cache.put(key, depth)
+                inferred.put((i, depth, img, alpha, None))
+            except Exception as e:
+                inferred.put((i, None, None, None, e))
+        inferred.put(done)
+
+    def project():
+        while (item := inferred.get()) is not done:
+            i, depth, img, alpha, error = item
+            if error is not None:
+                results.put((i, 0, None, error))
+                continue
+            try:
+                pose = get_camera_pose(views[i][1])
+                with timed("masking"):
+                    mask, method = foreground_mask(img, alpha, depth, mask_method)
+                added = 0
+                if tsdf is not None:
+                    with timed("fusion"):
+                        added = tsdf.integrate(depth, pose, img, mask)
+                if cloud is not None:
+                    with timed("back_projection"):
+                        points, colors = depth_to_point_cloud(depth, img, mask=mask)
+                        world_points, world_colors = transform_point_cloud(points, colors, pose)
+                    with timed("fusion"):
+                        cloud.reserve(cloud.count + (len(views) - i) * max_points_per_view(depth.shape))
+                        added = cloud.append(world_points, world_colors)
+                results.put((i, added, method, None))
+            except Exception as e:
+                results.put((i, 0, None, e))
+
+    with ThreadPoolExecutor(max_workers=decode_workers) as pool:
+        stages = [threading.Thread(target=feed, args=(pool,), daemon=True),
+                  threading.Thread(target=infer, daemon=True),
+                  threading.Thread(target=project, daemon=True)]
+        for stage in stages:
+            stage.start()
+        for _ in views:
+            yield results.get()
+        for stage in stages:
+            stage.join()
+
+EXPORT_FORMATS = ("obj", "ply", "glb")
+MESHERS = ["auto", "surface", "open3d"]
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
+
+def find_images(image_dir):
+    """Sorted image files directly inside image_dir."""
+    image_files = []
+    for ext in IMAGE_EXTENSIONS:
+        image_files.extend(Path(image_dir).glob(f"*{ext}"))
+    # Remove duplicates and sort
+    return sorted(set(image_files))
+
+# View names in capture order; unnamed images are assigned these by position
+VIEW_ORDER = ['front', 'front-left', 'left', 'back-left', 'back', 'back-right', 'right', 'front-right', 'top', 'bottom']
+
+def view_name(image_path):
+    """View named by an image's file stem, or None.
+
+    Case, "_" or "-" separators, an index prefix (03_back) and an image-number
+    suffix (front_2) are ignored; stems mentioning a close-up map to 'close-up'.
+    """
+    stem = re.sub(r"[\s_]+", "-", Path(image_path).stem.lower())
+    stem = re.sub(r"-\d+$", "", re.sub(r"^\d+-", "", stem))
+    if stem in VIEW_ORDER:
+        return stem
+    if "close" in stem:
+        return "close-up"
+    return None
+
+def image_views(image_files):
+    """Pose name for each image: view_name when the file names its view, otherwise
+    its position in VIEW_ORDER (extended with close-ups)."""
+    positional = VIEW_ORDER + ['close-up'] * max(0, len(image_files) - len(VIEW_ORDER))
+    return [view_name(path) or positional[i] for i, path in enumerate(image_files)]
+
+def images_to_3d(image_dir, output_dir=None, output_prefix="model", cache=None,
+                 model_loader=load_midas_model, model_type=MODEL_TYPE, decode_workers=4,
+                 voxel_size=None, nb_neighbors=20, std_ratio=2.0, mask_method="auto",
+                 fusion="points", tsdf_resolution=128, tsdf_bound=None, mesher="auto",
+                 lod_ratios=DEFAULT_LOD_RATIOS, lod_format="files", glb_writer="optimized", glb_acmr=False,
+                 trace_path=None, profile_dir=None, formats=EXPORT_FORMATS, workers=-1):
+    """Process multiple images from different views to create 3D model.
+
+    model_loader is a zero-argument callable returning (midas, transform); it is
+    only called when at least one image is missing from the DepthCache (if given).
+    voxel_size, nb_neighbors and std_ratio control the cleanup applied to the
+    combined cloud before meshing (see point_cloud.preprocess_for_meshing).
+    mask_method selects background removal per view (see foreground_mask.py).
+    fusion="tsdf" integrates views into a TSDFVolume of tsdf_resolution^3 voxels
+    and extracts the mesh with marching cubes instead of meshing a combined cloud;
+    tsdf_bound fixes the volume's half-size instead of deriving it from the views.
+    mesher is passed to create_mesh_from_point_cloud as its method.
+    lod_ratios lists triangle ratios for the quadric-decimated LOD chain, written as
+    separate {prefix}_lod{i}.glb files (lod_format="files") or as MSFT_lod nodes in
+    {prefix}.glb itself (lod_format="msft_lod"), with MSFT_screencoverage
+    thresholds from decimation.lod_screen_coverages.
+    glb_writer="optimized" writes every GLB with glb_export.write_optimized_glb
+    (welded, cache-ordered, KHR_mesh_quantization); "trimesh" uses mesh.export.
+    glb_acmr also reports its vertex-cache miss ratio before and after reordering.
+    formats selects which of obj, ply and glb (plus its LODs) are written; they are
+    exported concurrently, the PLY as a streamed binary cloud.
+    workers caps the threads of the KD-tree queries in outlier removal, surface
+    reconstruction and LOD measurement (-1: all cores); batch runs pass their
+    per-job CPU budget.
+    Stage timings and peak memory go into metadata.json under "timings"; trace_path
+    also writes them as a Chrome trace, and profile_dir (or $IMAGE_TO_3D_PROFILE)
+    dumps a cProfile file per stage (see stage_profiler.py).
+    """
+    profiler = StageProfiler(profile_dir)
     # Create output directory
     if output_dir is None:
         # Use input directory name as output folder
@@ -249,87 +434,162 @@ def images_to_3d(image_dir, output_dir=None, output_prefix="model"):
     if not image_dir.exists():
         raise FileNotFoundError(f"Directory {image_dir} not found")
     
-    # Find all image files
-    image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
-    image_files = []
-    for ext in image_extensions:
-        image_files.extend(image_dir.glob(f"*{ext}"))
-    
-    # Remove duplicates and sort
-    image_files = list(set(image_files))
-    image_files.sort()
-    
+    image_files = find_images(image_dir)
     if not image_files:
         raise FileNotFoundError(f"No image files found in {image_dir}")
     
     print(f"Found {len(image_files)} images: {[f.name for f in image_files]}")
     
-    # Define view order (assuming files are in this order)
-    view_order = [
-        'front', 'front-left', 'left', 'back-left',
-        'back', 'back-right', 'right', 'front-right',
-        'top', 'bottom'
-    ]
-    
-    # Extend with close-ups if more files
-    while len(view_order) < len(image_files):
-        view_order.append('close-up')
+    # Camera pose per image, from its file name or else its position
+    view_order = image_views(image_files)
     
     print(f"Output directory: {output_path}")
-    midas, transform = load_midas_model()
+    if cache is not None and all(depth_cache_key(f, model_type) in cache for f in image_files):
+        print("All depth maps found in cache, skipping MiDaS model load")
+        midas, transform = None, None
+    else:
+        with profiler.stage("model_load"):
+            midas, transform = model_loader()
     
-    all_points = []
-    all_colors = []
+    views = list(zip(image_files, view_order))
+    if fusion == "tsdf":
+        # Views are streamed into the volume; no combined cloud is kept
+        cloud, tsdf = None, TSDFVolume(resolution=tsdf_resolution, bound=tsdf_bound,
+                                       poses=[get_camera_pose(view) for view in view_order])
+    else:
+        # Combined cloud is filled in place by the back-projection stage
+        cloud, tsdf = PointCloud(), None
+    mask_methods = {}
     
-    for i, image_path in enumerate(image_files):
-        view_name = view_order[i] if i < len(view_order) else 'close-up'
-        print(f"Processing {image_path.name} as {view_name} view...")
-        
-        try:
-            pose = get_camera_pose(view_name)
-            depth, img = estimate_depth(str(image_path), midas, transform)
-            points, colors = depth_to_point_cloud(depth, img)
-            
-            # Transform to world coordinates
-            world_points, world_colors = transform_point_cloud(points, colors, pose)
-            
-            all_points.append(world_points)
-            all_colors.append(world_colors)
-            
-            print(f"  Added {len(world_points)} points from {view_name} view")
-            
-        except Exception as e:
-            print(f"  Error processing {image_path.name}: {e}")
+    for i, added, method, error in iter_view_point_clouds(
+            views, midas, transform, cloud=cloud, tsdf=tsdf, cache=cache, model_type=model_type,
+            decode_workers=decode_workers, mask_method=mask_method, profiler=profiler):
+        image_path, view_name = views[i]
+        if error is not None:
+            print(f"  Error processing {image_path.name}: {error}")
             continue
+        mask_methods[image_path.name] = method
+        print(f"  Added {added} points from {image_path.name} ({view_name} view, {method} mask)")
     
-    if not all_points:
-        raise RuntimeError("No valid point clouds generated")
-    
-    # Combine all point clouds
-    combined_points = np.vstack(all_points)
-    combined_colors = np.vstack(all_colors)
-    
-    print(f"Combined point cloud has {len(combined_points)} points")
-    
-    # Create mesh from combined point cloud
-    mesh = create_mesh_from_point_cloud(combined_points, combined_colors)
+    preprocess_stats = None
+    if tsdf is not None:
+        if tsdf.views_integrated == 0:
+            raise RuntimeError("No views integrated into the TSDF volume")
+        print(f"TSDF volume has {tsdf.num_blocks} blocks ({tsdf.nbytes / 1024 ** 2:.1f} MiB, "
+              f"voxel size {tsdf.voxel_size:.4g})")
+        if tsdf.samples_outside:
+            print(f"⚠️  {tsdf.samples_outside} of {tsdf.samples_integrated} depth samples fell outside the "
+                  f"TSDF volume and were dropped; set a larger --tsdf-bound to keep them")
+        with profiler.stage("meshing"):
+            mesh = tsdf.extract_mesh()
+        print(f"Extracted TSDF mesh with {len(mesh.vertices)} vertices and {len(mesh.faces)} faces")
+    else:
+        if len(cloud) == 0:
+            raise RuntimeError("No valid point clouds generated")
+        
+        print(f"Combined point cloud has {len(cloud)} points ({cloud.nbytes / 1024 ** 2:.1f} MiB)")
+        
+        # Downsample and drop stray points so meshing cost is bounded
+        with profiler.stage("preprocessing"):
+            mesh_cloud, preprocess_stats = preprocess_for_meshing(cloud, voxel_size, nb_neighbors, std_ratio, workers)
+        print(f"Preprocessed cloud: {len(cloud)} -> {len(mesh_cloud)} points "
+              f"(voxel size {preprocess_stats['voxel_size']:.4g})")
+        
+        # Create mesh from preprocessed point cloud
+        with profiler.stage("meshing"):
+            mesh = create_mesh_from_point_cloud(mesh_cloud.points, mesh_cloud.colors, method=mesher, workers=workers)
     
     # Center and scale
-    if len(mesh.vertices) > 0:
-        centroid = mesh.centroid
-        if not np.isnan(centroid).any():
-            mesh.apply_translation(-centroid)
-    scale_factor = 0.01
-    mesh.apply_scale(scale_factor)
+    with profiler.stage("scaling"):
+        scale_factor = center_and_scale(mesh)
     
     print(f"Final mesh has {len(mesh.vertices)} vertices and {len(mesh.faces)} faces")
     print(f"Bounding box: {mesh.bounds}")
     
-    # Export
-    mesh.export(output_obj)
-    cloud = trimesh.points.PointCloud(combined_points * scale_factor, colors=combined_colors)
-    cloud.export(output_ply)
-    mesh.export(output_glb)
+    # Export the selected formats concurrently. The writers only read the mesh, but
+    # the same trimesh object is shared by every export thread and its lazy caches
+    # (normals, adjacency, bounds) are not thread-safe, so the ones the writers use
+    # are filled here, before the pool starts. Each export is profiled in its own
+    # thread (see stage_profiler.py).
+    if len(mesh.faces) > 0:
+        _ = mesh.face_normals, mesh.vertex_normals, mesh.extents
+    glb_reports = {}
+    def export_glb(meshes, path, coverages=None):
+        if not isinstance(meshes, list) and len(meshes.faces) == 0:
+            # create_mesh_from_point_cloud's fallbacks have no faces: write a POINTS primitive
+            import trimesh
+            trimesh.PointCloud(meshes.vertices).export(path, file_type="glb")
+        elif glb_writer == "optimized":
+            report = write_optimized_glb(meshes, path, lod_coverages=coverages, measure_acmr=glb_acmr)
+            glb_reports[path.name] = report
+            acmr = ""
+            if glb_acmr:
+                acmr = ", ACMR " + ", ".join(f"{m['acmr_before']:.3f} -> {m['acmr_after']:.3f}" for m in report["meshes"])
+            print(f"  {path.name}: {report['bytes_before']} -> {report['bytes_after']} bytes{acmr}")
+        elif isinstance(meshes, list):
+            export_lod_glb(meshes, path, coverages=coverages)
+        else:
+            meshes.export(path)
+
+    def export_obj():
+        with profiler.stage("export_obj"):
+            mesh.export(output_obj)
+        return [output_obj]
+
+    def export_ply():
+        with profiler.stage("export_ply"):
+            if cloud is not None:
+                cloud.write_ply(output_ply, scale=scale_factor)
+            else:
+                # TSDF mode keeps no raw cloud; export the fused surface vertices instead
+                write_binary_ply(output_ply, mesh.vertices.astype(np.float32), mesh.visual.vertex_colors[:, :3])
+        return [output_ply]
+
+    def export_main_glb():
+        with profiler.stage("export_glb"):
+            export_glb(mesh, output_glb)
+        return [output_glb]
+
+    def export_lods():
+        """Level-of-detail chain for crowds of on-screen enemies."""
+        with profiler.stage("lod_decimation"):
+            chain = build_lod_chain(mesh, lod_ratios, workers)
+        coverages = lod_screen_coverages(chain, float(np.linalg.norm(mesh.extents)))
+        for (_, info), coverage in zip(chain, coverages):
+            info["screen_coverage"] = coverage
+        files = []
+        if lod_format == "msft_lod":
+            # The main GLB is the MSFT_lod container, so LOD0 is stored once
+            with profiler.stage("export_glb"):
+                export_glb([lod for lod, _ in chain], output_glb, coverages=coverages)
+            files.append(output_glb)
+            for _, info in chain:
+                info["file"] = str(output_glb)
+        else:
+            for level, (lod, info) in enumerate(chain):
+                if level == 0:
+                    info["file"] = str(output_glb)
+                    continue
+                lod_file = output_path / f"{output_prefix}_lod{level}.glb"
+                with profiler.stage("export_lods"):
+                    export_glb(lod, lod_file)
+                files.append(lod_file)
+                info["file"] = str(lod_file)
+        for level, (_, info) in enumerate(chain):
+            print(f"  LOD{level}: {info['faces']} faces ({info['ratio']:.0%}), "
+                  f"max vertex deviation {info['vertex_distance_max']:.4g}, "
+                  f"screen coverage >= {info['screen_coverage']:.3g}")
+        lods.extend(info for _, info in chain)
+        return files
+
+    lods = []
+    exporters = {"obj": [export_obj], "ply": [export_ply], "glb": [export_main_glb]}
+    if len(lod_ratios) > 1 and len(mesh.faces) > 0:
+        exporters["glb"] = [export_lods] if lod_format == "msft_lod" else [export_main_glb, export_lods]
+    jobs = [job for fmt in formats for job in exporters[fmt]]
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs))) as pool:
+        written = [path for paths in pool.map(lambda job: job(), jobs) for path in paths]
+    output_bytes = {path.name: path.stat().st_size for path in written}
     
     # Save metadata
     import json
@@ -338,27 +598,100 @@ def images_to_3d(image_dir, output_dir=None, output_prefix="model"):
         "output_directory": str(output_path),
         "num_images": len(image_files),
         "image_files": [str(f) for f in image_files],
-        "view_order": view_order[:len(image_files)],
-        "total_points": len(combined_points),
+        "view_order": view_order,
+        "fusion": fusion,
+        "total_points": len(cloud) if cloud is not None else None,
+        "point_cloud_bytes": cloud.nbytes if cloud is not None else None,
+        "tsdf": tsdf.stats() if tsdf is not None else None,
+        "foreground_mask": mask_methods,
+        "preprocessing": preprocess_stats,
         "mesh_vertices": len(mesh.vertices),
         "mesh_faces": len(mesh.faces),
-        "bounding_box": mesh.bounds.tolist() if len(mesh.vertices) > 0 else None,
+        "bounding_box": [mesh.vertices.min(axis=0).tolist(), mesh.vertices.max(axis=0).tolist()] if len(mesh.vertices) > 0 else None,
+        "lods": lods,
+        "formats": list(formats),
+        "output_bytes": output_bytes,
+        "glb_writer": glb_writer,
+        "glb_optimization": glb_reports,
         "scale_factor": scale_factor,
+        "depth_model": model_type,
+        "depth_cache": {"hits": cache.hits, "misses": cache.misses} if cache is not None else None,
         "processing_date": str(np.datetime64('now')),
+        "timings": profiler.summary(),
     }
     with open(metadata_file, 'w') as f:
         json.dump(metadata, f, indent=2)
     
-    print(f"3D model saved to {output_obj}")
-    print(f"Point cloud saved to {output_ply}")
-    print(f"GLB model saved to {output_glb}")
+    for path in written:
+        print(f"Saved {path} ({path.stat().st_size / 1024 ** 2:.2f} MiB)")
     print(f"Metadata saved to {metadata_file}")
+    profiler.print_table()
+    if trace_path is not None:
+        profiler.write_chrome_trace(trace_path)
+        print(f"Chrome trace saved to {trace_path}")
 
-if __name__ == "__main__":
+def add_pipeline_arguments(parser):
+    """Register the depth-source and reconstruction flags shared by the image-to-3D CLIs."""
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help=f"Depth-map cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2, help="Evict cached depth maps beyond this size in MiB")
+    parser.add_argument("--no-cache", action="store_true", help="Always run MiDaS, ignoring the depth cache")
+    add_model_arguments(parser)
+    parser.add_argument("--server", help="Unix socket of a running depth_server.py to use instead of loading a model")
+    parser.add_argument("--decode-workers", type=int, default=4, help="Threads decoding images ahead of inference (default: 4)")
+    parser.add_argument("--voxel-size", type=float, help="Voxel edge for downsampling before meshing (default: bounding-box diagonal / 128, 0 disables)")
+    parser.add_argument("--outlier-neighbors", type=int, default=20, help="Neighbours for statistical outlier removal (default: 20, 0 disables)")
+    parser.add_argument("--outlier-std", type=float, default=2.0, help="Std-dev ratio for statistical outlier removal (default: 2.0)")
+    parser.add_argument("--mask", choices=MASK_METHODS, default="auto", help="Background removal before back-projection (default: auto)")
+    parser.add_argument("--fusion", choices=["points", "tsdf"], default="points", help="How views are fused: concatenated point clouds or a TSDF volume (default: points)")
+    parser.add_argument("--tsdf-resolution", type=int, default=128, help="Voxels per side of the TSDF volume (default: 128)")
+    parser.add_argument("--tsdf-bound", type=float, help="Half the side of the TSDF volume, centred on the camera ring (default: fit the first view's depths at every pose)")
+    parser.add_argument("--mesher", choices=MESHERS, default="auto", help="Point-cloud meshing backend: trimesh alpha shape/hull fallback chain, KD-tree surface reconstruction or Open3D Poisson (default: auto)")
+    parser.add_argument("--lods", default=",".join(str(r) for r in DEFAULT_LOD_RATIOS), help="Comma-separated triangle ratios of the LOD chain (default: 1.0,0.25,0.05; '1' disables)")
+    parser.add_argument("--lod-format", choices=["files", "msft_lod"], default="files", help="Write LODs as separate GLBs or as MSFT_lod nodes in the main GLB (default: files)")
+    parser.add_argument("--formats", type=parse_formats, default=",".join(EXPORT_FORMATS), help=f"Comma-separated outputs to write from {', '.join(EXPORT_FORMATS)} (default: all)")
+    parser.add_argument("--trace", help="Also write per-stage timings as a Chrome trace JSON file")
+    parser.add_argument("--profile-dir", help=f"Dump a cProfile file per stage here (default: ${PROFILE_ENV} if set)")
+    parser.add_argument("--glb-writer", choices=["optimized", "trimesh"], default="optimized", help="GLB writer: quantized and vertex-cache ordered, or plain trimesh export (default: optimized)")
+    parser.add_argument("--glb-acmr", action="store_true", help="Report the vertex-cache miss ratio of each optimized GLB before and after reordering (slow on large meshes)")
+
+def parse_formats(value):
+    """argparse type for --formats: a comma-separated subset of EXPORT_FORMATS."""
+    formats = [f.strip().lower() for f in value.split(",") if f.strip()]
+    unknown = sorted(set(formats) - set(EXPORT_FORMATS))
+    if unknown:
+        raise ValueError(f"Unknown export format(s) {unknown}; choose from {list(EXPORT_FORMATS)}")
+    return formats
+
+def depth_source(args):
+    """(cache, model_loader, model_type) for parsed add_pipeline_arguments flags."""
+    cache = None if args.no_cache else DepthCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 ** 2)
+    if args.server:
+        from depth_server import DepthClient
+        client = DepthClient(args.server)
+        return cache, (lambda: (client, None)), client.model_type
+    model_loader, model_type = model_from_args(args)
+    return cache, model_loader, model_type
+
+def pipeline_options(args):
+    """images_to_3d keyword arguments for parsed add_pipeline_arguments flags."""
+    return dict(decode_workers=args.decode_workers,
+                voxel_size=args.voxel_size, nb_neighbors=args.outlier_neighbors, std_ratio=args.outlier_std,
+                mask_method=args.mask, fusion=args.fusion, tsdf_resolution=args.tsdf_resolution, tsdf_bound=args.tsdf_bound,
+                mesher=args.mesher, lod_ratios=[float(r) for r in args.lods.split(",")],
+                lod_format=args.lod_format, glb_writer=args.glb_writer, glb_acmr=args.glb_acmr,
+                trace_path=args.trace, profile_dir=args.profile_dir, formats=args.formats)
+
+def main(argv=None):
     import argparse
     parser = argparse.ArgumentParser(description="Convert multiple images from different views to 3D mesh and point cloud")
     parser.add_argument("input_dir", help="Path to directory containing input images from different views")
     parser.add_argument("--output-dir", help="Output directory (default: models/{input_dir_name})")
     parser.add_argument("--prefix", default="model", help="Prefix for output files (default: model)")
-    args = parser.parse_args()
-    images_to_3d(args.input_dir, args.output_dir, args.prefix)
+    add_pipeline_arguments(parser)
+    args = parser.parse_args(argv)
+    cache, model_loader, model_type = depth_source(args)
+    images_to_3d(args.input_dir, args.output_dir, args.prefix, cache=cache,
+                 model_loader=model_loader, model_type=model_type, **pipeline_options(args))
+
+if __name__ == "__main__":
+    main()
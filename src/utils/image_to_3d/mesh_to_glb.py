@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Turn a photogrammetry mesh (COLMAP's mesh.ply, Meshroom's texturedMesh.obj) into a
+game-ready GLB without a trip through Blender:
+crop to the subject, decimate to a triangle budget, recentre and scale like
+images_to_3d, then write a quantized GLB with glb_export.write_optimized_glb.
+Cropping drops disconnected fragments much smaller than the largest piece
+(background, floor patches) and faces outside the percentile box of what remains.
+Textures are baked to vertex colours, since the optimized writer stores colours per vertex.
+colmap_reconstruction.py and meshroom_reconstruction.py run this after a successful
+reconstruction (a failed conversion there is only a warning: the reconstruction
+and its exit status stand); it can also be run on its own.
+Dependencies:
+    pip install trimesh scipy
+Run:
+    python mesh_to_glb.py colmap_output_roach --name roach
+    python mesh_to_glb.py meshroom_output_roach/texturedMesh.obj --face-budget 8000 --size 1.5
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+from glb_export import write_optimized_glb
+
+DEFAULT_GLB_DIR = Path(__file__).resolve().parents[3] / "public" / "assets" / "models" / "enemy"
+DEFAULT_FACE_BUDGET = 20000
+DEFAULT_SCALE = 0.01  # images_to_3d's scale factor
+# Preferred first; fused.ply is a point cloud and never matches
+MESH_NAMES = ["mesh.ply", "texturedMesh.obj", "mesh.obj", "meshed-poisson.ply", "meshed-delaunay.ply"]
+
+def find_reconstruction_mesh(output_dir):
+    """Mesh written by a COLMAP or Meshroom run in output_dir, or None.
+
+    Meshroom keeps its node outputs under MeshroomCache, so subdirectories are
+    searched too; among equal names the newest file wins.
+    """
+    output_dir = Path(output_dir)
+    for name in MESH_NAMES:
+        if (output_dir / name).is_file():
+            return output_dir / name
+        found = sorted(output_dir.rglob(name), key=lambda p: p.stat().st_mtime, reverse=True)
+        if found:
+            return found[0]
+    return None
+
+def load_mesh(path):
+    """Load path as a single trimesh.Trimesh with vertex colours (if any)."""
+    import trimesh
+
+    mesh = trimesh.load(path, force="mesh", process=True)
+    if getattr(mesh.visual, "kind", None) == "texture":
+        mesh.visual = mesh.visual.to_color()
+    return mesh
+
+def _submesh(mesh, face_mask):
+    import trimesh
+
+    faces = np.asarray(mesh.faces)[face_mask]
+    used = np.unique(faces)
+    remap = np.full(len(mesh.vertices), -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+    colors = None
+    if getattr(mesh.visual, "kind", None) == "vertex":
+        colors = np.asarray(mesh.visual.vertex_colors)[used]
+    return trimesh.Trimesh(vertices=np.asarray(mesh.vertices)[used], faces=remap[faces],
+                           vertex_colors=colors, process=False)
+
+def crop_to_subject(mesh, min_component=0.05, percentile=1.0, margin=0.15):
+    """Keep the subject: drop connected pieces with fewer than min_component times
+    the largest piece's faces, then faces with a vertex outside the
+    [percentile, 100 - percentile] box of the remaining vertices grown by margin
+    of its size on each side. Returns (mesh, stats)."""
+    from trimesh.graph import connected_component_labels
+
+    faces = np.asarray(mesh.faces)
+    stats = {"faces_in": int(len(faces))}
+    if len(faces) == 0:
+        return mesh, dict(stats, faces_out=0, components=0, components_kept=0)
+    labels = connected_component_labels(mesh.face_adjacency, node_count=len(faces))
+    sizes = np.bincount(labels)
+    keep_faces = sizes[labels] >= min_component * sizes.max()
+    stats["components"] = int(len(sizes))
+    stats["components_kept"] = int(np.count_nonzero(sizes >= min_component * sizes.max()))
+
+    vertices = np.asarray(mesh.vertices)
+    kept = vertices[np.unique(faces[keep_faces])]
+    lo, hi = np.percentile(kept, [percentile, 100 - percentile], axis=0)
+    grow = (hi - lo) * margin
+    lo, hi = lo - grow, hi + grow
+    inside = np.all((vertices >= lo) & (vertices <= hi), axis=1)
+    keep_faces &= inside[faces].all(axis=1)
+    stats["crop_box"] = [lo.tolist(), hi.tolist()]
+    stats["faces_out"] = int(np.count_nonzero(keep_faces))
+    return _submesh(mesh, keep_faces), stats
+
+def decimate_to_budget(mesh, face_budget):
+    """Quadric-decimate mesh to at most about face_budget triangles. Returns (mesh, stats)."""
+    import trimesh
+    from decimation import decimate_quadric
+
+    if len(mesh.faces) <= face_budget:
+        return mesh, {"faces": int(len(mesh.faces)), "passes": 0, "max_quadric_error": 0.0}
+    colors = None
+    if getattr(mesh.visual, "kind", None) == "vertex":
+        colors = np.asarray(mesh.visual.vertex_colors)
+    v, f, c, stats = decimate_quadric(mesh.vertices, mesh.faces, face_budget, colors)
+    return trimesh.Trimesh(vertices=v, faces=f, vertex_colors=c, process=False), stats
+
+def center_and_scale(mesh, scale_factor=DEFAULT_SCALE, size=None):
+    """Move the mesh centroid to the origin and scale it in place, as images_to_3d
+    does. With size, the scale instead makes the largest bounding-box side that
+    long, since photogrammetry units are arbitrary. Returns the scale applied."""
+    if len(mesh.vertices) > 0:
+        centroid = mesh.centroid
+        if not np.isnan(centroid).any():
+            mesh.apply_translation(-centroid)
+        if size is not None:
+            extent = float(np.max(mesh.extents))
+            scale_factor = size / extent if extent > 0 else 1.0
+    mesh.apply_scale(scale_factor)
+    return scale_factor
+
+def asset_name(path):
+    """GLB name for a reconstruction directory: its name without the output prefix."""
+    name = Path(path).resolve().name
+    for prefix in ("colmap_output_", "meshroom_output_"):
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+def reconstruction_to_glb(source, name, glb_dir=DEFAULT_GLB_DIR, face_budget=DEFAULT_FACE_BUDGET,
+                          scale_factor=DEFAULT_SCALE, size=None, crop=True, report_path=None, log=print):
+    """Convert a reconstruction mesh (a file, or an output directory searched with
+    find_reconstruction_mesh) to {glb_dir}/{name}.glb.
+
+    The report (steps, face counts, scale, GLB bytes) is returned and written to
+    report_path, by default game_asset.json next to the source mesh.
+    Returns None if no mesh is found.
+    """
+    source = Path(source)
+    mesh_path = find_reconstruction_mesh(source) if source.is_dir() else source
+    if mesh_path is None or not mesh_path.is_file():
+        log(f"No reconstruction mesh found in {source}")
+        return None
+    glb_dir = Path(glb_dir)
+    glb_dir.mkdir(parents=True, exist_ok=True)
+    glb_path = glb_dir / f"{name}.glb"
+
+    mesh = load_mesh(mesh_path)
+    report = {"source": str(mesh_path), "glb": str(glb_path),
+              "vertices_in": int(len(mesh.vertices)), "faces_in": int(len(mesh.faces))}
+    if crop:
+        mesh, report["crop"] = crop_to_subject(mesh)
+    if len(mesh.faces) == 0:
+        raise ValueError(f"{mesh_path} has no faces" + (" left after cropping" if crop and report["faces_in"] else ""))
+    mesh, report["decimation"] = decimate_to_budget(mesh, face_budget)
+    report["scale_factor"] = center_and_scale(mesh, scale_factor, size)
+    report["faces_out"] = int(len(mesh.faces))
+    report["vertices_out"] = int(len(mesh.vertices))
+    report["bounding_box"] = mesh.bounds.tolist() if len(mesh.vertices) else None
+    report["glb_optimization"] = write_optimized_glb(mesh, glb_path)
+
+    report_path = Path(report_path) if report_path else mesh_path.parent / "game_asset.json"
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=2)
+    log(f"GLB: {glb_path} ({report['faces_in']} -> {report['faces_out']} faces, "
+        f"{report['glb_optimization']['bytes_after'] / 1024:.0f} KiB)")
+    return report
+
+def try_reconstruction_to_glb(source, name, log=print, **options):
+    """reconstruction_to_glb as a post-stage of a finished reconstruction: failures
+    are logged as a warning with the command to retry, and give None."""
+    try:
+        report = reconstruction_to_glb(source, name, log=log, **options)
+    except Exception as e:
+        log(f"⚠️  GLB conversion failed: {type(e).__name__}: {e}")
+        report = None
+    if report is None:
+        log(f"   The reconstruction is kept; retry with: python mesh_to_glb.py {source} --name {name}")
+    return report
+
+def add_glb_arguments(parser, default_enabled=True):
+    """Options shared by the reconstruction scripts' post-stage and this module's CLI."""
+    if default_enabled:
+        parser.add_argument("--no-glb", action="store_true", help="Skip converting the mesh to a game-ready GLB")
+    parser.add_argument("--glb-dir", default=str(DEFAULT_GLB_DIR), help=f"Directory the GLB is written to (default: {DEFAULT_GLB_DIR})")
+    parser.add_argument("--face-budget", type=int, default=DEFAULT_FACE_BUDGET, help=f"Decimate to at most this many triangles (default: {DEFAULT_FACE_BUDGET})")
+    parser.add_argument("--size", type=float, help=f"Scale so the largest side is this long (default: scale by {DEFAULT_SCALE} like images_to_3d)")
+    parser.add_argument("--no-crop", action="store_true", help="Keep stray fragments and outlying faces")
+
+def glb_options(args):
+    """reconstruction_to_glb keyword arguments from add_glb_arguments options."""
+    return {"glb_dir": args.glb_dir, "face_budget": args.face_budget, "size": args.size, "crop": not args.no_crop}
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert a COLMAP/Meshroom mesh to a game-ready GLB")
+    parser.add_argument("source", help="Mesh file, or a reconstruction output directory to search")
+    parser.add_argument("--name", help="GLB name without extension (default: source name without colmap_output_/meshroom_output_)")
+    parser.add_argument("--report", help="Report JSON path (default: game_asset.json next to the mesh)")
+    add_glb_arguments(parser, default_enabled=False)
+    args = parser.parse_args(argv)
+
+    source = Path(args.source)
+    name = args.name or asset_name(source if source.is_dir() else source.parent)
+    report = reconstruction_to_glb(source, name, report_path=args.report, **glb_options(args))
+    raise SystemExit(0 if report else 1)
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,19 @@
 Multi-View 3D Reconstruction using Meshroom
 This script sets up and runs Meshroom for proper 3D reconstruction from multiple views.
 
+Meshroom's output is streamed line by line into {output_dir}/logs/meshroom.log
+(rotated at --log-max-mb) instead of being buffered until the run ends. Node
+headers ("[3/13] FeatureMatching") and chunk lines drive a progress display, and
+per-node timings are written to {output_dir}/meshroom_timings.json.
+The executable found by probing the usual install locations is cached in
+{cache dir}/meshroom_toolchain.json and reused while the file is unchanged;
+--rediscover probes again.
+After a successful run the textured mesh is cropped, decimated to --face-budget
+triangles and written as {--glb-dir}/{image dir name}.glb (mesh_to_glb.py);
+--no-glb skips this. A failed conversion is reported as a warning; the README and
+exit status still reflect the reconstruction.
+Set --meshroom-exe (or $MESHROOM) to stub_meshroom.py for testing without Meshroom.
+
 Requirements:
 - Meshroom installed (https://alicevision.org/#meshroom)
 - Images in a directory
@@ -12,26 +25,155 @@ Usage:
 """
 
 import os
+import re
+import sys
+import json
+import time
+import shutil
+import logging
 import subprocess
-import argparse
 from pathlib import Path
-import json
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from mesh_to_glb import try_reconstruction_to_glb, add_glb_arguments, glb_options
+
+TOOLCHAIN_CACHE = Path(os.environ.get("IMAGE_TO_3D_CACHE_ROOT", Path.home() / ".cache" / "image_to_3d")) / "meshroom_toolchain.json"
+# Batch executables first: the GUI binary does not take --input/--output
+CANDIDATE_EXECUTABLES = [
+    "C:/Program Files/Meshroom/meshroom_batch.exe",
+    "C:/Program Files/Meshroom/Meshroom.exe",
+    "C:/Program Files (x86)/Meshroom/Meshroom.exe",
+    "/Applications/Meshroom.app/Contents/MacOS/meshroom_batch",
+    "/Applications/Meshroom.app/Contents/MacOS/Meshroom",
+    "/usr/local/bin/meshroom_batch",
+    "/usr/local/bin/meshroom",
+    "meshroom_batch",  # in PATH
+    "meshroom",
+]
+NODE_START = re.compile(r"^\s*\[(\d+)/(\d+)\]\s+(\S+)")
+NODES_TO_EXECUTE = re.compile(r"Nodes to execute:\s*\[(.*)\]")
+CHUNK = re.compile(r"process chunk (\d+)/(\d+)")
+
+def _file_signature(path):
+    st = Path(path).stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def _probe(path):
+    """Resolved path of a working Meshroom executable, or None."""
+    resolved = shutil.which(path) if not Path(path).exists() else path
+    if resolved is None:
+        return None
+    try:
+        result = subprocess.run([resolved, "--help"], capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return str(resolved) if result.returncode == 0 else None
 
-def run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=None):
-    """
-    Run Meshroom pipeline for multi-view 3D reconstruction.
+def find_meshroom(cache_path=TOOLCHAIN_CACHE, refresh=False, candidates=CANDIDATE_EXECUTABLES):
+    """Path of the Meshroom executable, or None.
 
-    Args:
-        image_dir: Directory containing input images
-        output_dir: Directory for output
-        meshroom_exe: Path to Meshroom executable (if not in PATH)
+    The probe result is cached in cache_path and trusted while the executable's
+    size and mtime are unchanged, so `--help` runs only on the first call.
     """
-
-    image_dir = Path(image_dir)
-    output_dir = Path(output_dir)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-def run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=None):
+    cache_path = Path(cache_path)
+    if not refresh:
+        try:
+            cached = json.loads(cache_path.read_text())
+            if _file_signature(cached["exe"]) == cached["signature"]:
+                return cached["exe"]
+        except (OSError, ValueError, KeyError):
+            pass
+    for candidate in candidates:
+        exe = _probe(candidate)
+        if exe is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"exe": exe, "signature": _file_signature(exe), "probed": time.time()}, indent=2))
+            os.replace(tmp, cache_path)
+            return exe
+    return None
+
+class MeshroomProgress:
+    """Turns Meshroom output lines into node timings and progress messages."""
+
+    def __init__(self, report=print, clock=time.perf_counter):
+        self.report = report
+        self.clock = clock
+        self.start = clock()
+        self.total = None
+        self.nodes = []  # {"node", "index", "status", "seconds"}
+        self._current = None
+        self._node_start = None
+
+    def feed(self, line):
+        match = NODE_START.match(line)
+        if match:
+            index, total, node = int(match.group(1)), int(match.group(2)), match.group(3)
+            self._finish("done")
+            self.total = total
+            self._current = {"node": node, "index": index, "status": "running", "seconds": None}
+            self._node_start = self.clock()
+            self.nodes.append(self._current)
+            self.report(f"[{index}/{total}] {node} ({100 * (index - 1) // total}% done, "
+                        f"{self.clock() - self.start:.0f}s elapsed)")
+            return
+        match = NODES_TO_EXECUTE.search(line)
+        if match:
+            self.total = len([n for n in match.group(1).split(",") if n.strip()])
+            self.report(f"{self.total} nodes to execute")
+            return
+        match = CHUNK.search(line)
+        if match and self._current is not None:
+            self.report(f"    {self._current['node']} chunk {match.group(1)}/{match.group(2)}")
+
+    def _finish(self, status):
+        if self._current is not None:
+            self._current["status"] = status
+            self._current["seconds"] = round(self.clock() - self._node_start, 3)
+            self._current = None
+
+    def close(self, returncode):
+        self._finish("done" if returncode == 0 else "failed")
+        return {"returncode": returncode, "total_nodes": self.total,
+                "seconds": round(self.clock() - self.start, 3), "nodes": self.nodes}
+
+def _run_logger(log_path, max_bytes, backups):
+    logger = logging.getLogger(f"meshroom.{log_path}")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    handler = RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    return logger, handler
+
+def stream_process(cmd, log_path, progress, max_bytes=10 * 1024 ** 2, backups=3, tail_lines=40):
+    """Run cmd, sending each output line to a rotating log and to progress.
+
+    Memory stays bounded by the last tail_lines lines, returned with the exit code.
+    """
+    log_path = Path(log_path)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    logger, handler = _run_logger(log_path, max_bytes, backups)
+    tail = deque(maxlen=tail_lines)
+    try:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, errors="replace", bufsize=1) as process:
+            for line in process.stdout:
+                line = line.rstrip("\n")
+                logger.info(line)
+                tail.append(line)
+                progress.feed(line)
+            returncode = process.wait()
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    return returncode, list(tail)
+
+def run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=None, rediscover=False,
+                                log_max_bytes=10 * 1024 ** 2):
     """
     Run Meshroom pipeline for multi-view 3D reconstruction.
 
@@ -39,6 +181,8 @@ def run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=None):
         image_dir: Directory containing input images
         output_dir: Directory for output
         meshroom_exe: Path to Meshroom executable (if not in PATH)
+        rediscover: Probe for the executable again instead of using the cached result
+        log_max_bytes: Size at which logs/meshroom.log is rotated
     """
 
     image_dir = Path(image_dir)
@@ -46,32 +190,14 @@ def run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=None):
     output_dir.mkdir(parents=True, exist_ok=True)
 
     # Find Meshroom executable
-    if meshroom_exe is None:
-        # Try common locations
-        common_paths = [
-            "C:/Program Files/Meshroom/Meshroom.exe",
-            "C:/Program Files (x86)/Meshroom/Meshroom.exe",
-            "/Applications/Meshroom.app/Contents/MacOS/Meshroom",
-            "/usr/local/bin/meshroom",
-            "meshroom"  # in PATH
-        ]
-        for path in common_paths:
-            if Path(path).exists() or (path == "meshroom"):
-                try:
-                    # Test if meshroom command works
-                    result = subprocess.run([path, "--help"], capture_output=True, text=True, timeout=10)
-                    if result.returncode == 0:
-                        meshroom_exe = path
-                        break
-                except:
-                    continue
+    meshroom_exe = meshroom_exe or os.environ.get("MESHROOM") or find_meshroom(refresh=rediscover)
 
     if meshroom_exe is None:
         print("Meshroom not found! Please install Meshroom from https://alicevision.org/#meshroom")
         print("\nInstallation instructions:")
         print("1. Download from: https://github.com/alicevision/Meshroom/releases")
         print("2. Extract to a folder (e.g., C:/Program Files/Meshroom/)")
-        print("3. Run this script again with --meshroom-exe pointing to Meshroom.exe")
+        print("3. Run this script again with --meshroom-exe pointing to meshroom_batch")
         print("\nAlternatively, use COLMAP or RealityCapture for 3D reconstruction.")
         return False
 
@@ -87,29 +213,50 @@ def run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=None):
         "--save", str(project_file)
     ]
 
+    log_path = output_dir / "logs" / "meshroom.log"
     print(f"Running Meshroom with command: {' '.join(cmd)}")
     print(f"Input images: {image_dir}")
     print(f"Output directory: {output_dir}")
+    print(f"Log: {log_path}")
 
+    progress = MeshroomProgress()
     try:
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True)
-        print("Meshroom reconstruction completed successfully!")
-        print("Output files:")
-        for file in output_dir.glob("*"):
-            if file.is_file():
-                print(f"  - {file.name}")
-
-    except subprocess.CalledProcessError as e:
-        print(f"Meshroom failed with error: {e}")
-        print(f"STDOUT: {e.stdout}")
-        print(f"STDERR: {e.stderr}")
+        returncode, tail = stream_process(cmd, log_path, progress, max_bytes=log_max_bytes)
+    except OSError as e:
+        print(f"Meshroom could not be started: {e}")
+        return False
+    timings = progress.close(returncode)
+    with open(output_dir / "meshroom_timings.json", "w") as f:
+        json.dump(timings, f, indent=2)
+    for node in timings["nodes"]:
+        print(f"  {node['node']:<24} {node['status']:<7} {node['seconds']:>9.1f}s")
+
+    if returncode != 0:
+        print(f"Meshroom failed with exit code {returncode} after {timings['seconds']:.0f}s")
+        print(f"Last {len(tail)} log lines (full log: {log_path}):")
+        for line in tail:
+            print(f"  {line}")
         return False
 
+    print("Meshroom reconstruction completed successfully!")
+    print("Output files:")
+    for file in output_dir.glob("*"):
+        if file.is_file():
+            print(f"  - {file.name}")
     return True
 
-def create_meshroom_instructions(output_dir):
+def create_meshroom_instructions(output_dir, glb_path=None):
     """Create a text file with instructions for using the Meshroom output."""
 
+    if glb_path is not None:
+        game_steps = f"""- Game-ready GLB (cropped, decimated, centred): {glb_path}
+- game_asset.json next to the source mesh records the conversion"""
+    else:
+        game_steps = """- Look for .obj or .ply files in the output
+- Import into your 3D modeling software (Blender, etc.)
+- Clean up and optimize the mesh
+- Export as .glb for Three.js"""
+
     instructions = f"""
 Meshroom Reconstruction Complete!
 
@@ -119,6 +266,8 @@ Output Directory: {output_dir}
 
 Key Files:
 - meshroom_project.mg: Meshroom project file (can be reopened in Meshroom GUI)
+- meshroom_timings.json: Time spent in each pipeline node
+- logs/meshroom.log: Full Meshroom output
 - [various intermediate files]: Processing steps
 - [final mesh files]: Usually .obj or .ply files in subdirectories
 
@@ -129,10 +278,7 @@ To view/edit the results:
 4. Export final mesh
 
 For your game:
-- Look for .obj or .ply files in the output
-- Import into your 3D modeling software (Blender, etc.)
-- Clean up and optimize the mesh
-- Export as .glb for Three.js
+{game_steps}
 
 Tips for better results:
 - Ensure images have good overlap (60-80%)
@@ -147,20 +293,32 @@ Tips for better results:
 
     print(f"Instructions saved to: {instructions_file}")
 
-if __name__ == "__main__":
+def main(argv=None):
+    import argparse
     parser = argparse.ArgumentParser(description="Run Meshroom multi-view 3D reconstruction")
     parser.add_argument("input_dir", help="Directory containing input images")
     parser.add_argument("--output-dir", help="Output directory (default: meshroom_output)")
-    parser.add_argument("--meshroom-exe", help="Path to Meshroom executable")
+    parser.add_argument("--meshroom-exe", help="Path to Meshroom executable (default: $MESHROOM or discovered)")
+    parser.add_argument("--rediscover", action="store_true", help="Probe for Meshroom again instead of using the cached location")
+    parser.add_argument("--log-max-mb", type=float, default=10, help="Rotate logs/meshroom.log at this size (default: 10)")
+    add_glb_arguments(parser)
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
 
     output_dir = args.output_dir or f"meshroom_output_{Path(args.input_dir).name}"
 
-    success = run_meshroom_reconstruction(args.input_dir, output_dir, args.meshroom_exe)
+    success = run_meshroom_reconstruction(args.input_dir, output_dir, args.meshroom_exe, args.rediscover,
+                                          int(args.log_max_mb * 1024 ** 2))
 
     if success:
-        create_meshroom_instructions(output_dir)
+        report = None
+        if not args.no_glb:
+            report = try_reconstruction_to_glb(output_dir, Path(args.input_dir).name, **glb_options(args))
+        create_meshroom_instructions(output_dir, report["glb"] if report else None)
         print(f"\nSuccess! Check {output_dir} for your 3D reconstruction results.")
     else:
-        print("\nReconstruction failed. Check the error messages above.")
\ No newline at end of file
+        print("\nReconstruction failed. Check the error messages above.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Stable Diffusion web UI's /sdapi/v1/img2img endpoint,
+for testing sd_client.py and batch_gen_auto.py without a GPU.
+Answers with a generated PNG after a configurable latency (plus uniform jitter)
+and fails a fraction of requests with HTTP 500. --slots models a GPU backend
+that runs only that many generations at once and queues the rest, each image of
+a batch costing --latency. Speaks HTTP/1.1 keep-alive, and counts connections
+so connection reuse can be checked. sd_benchmark.py drives it at several
+client concurrency levels.
+Run:
+    python mock_sd_server.py --port 7861 [--latency 0.5] [--jitter 0.1] [--error-rate 0.1] [--slots 1]
+    SD_API_URL=http://127.0.0.1:7861 python batch_gen_auto.py
+"""
+
+import json
+import time
+import base64
+import random
+import contextlib
+import threading
+import multiprocessing
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+
+def make_png(size=64, seed=0):
+    import cv2
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    ok, data = cv2.imencode(".png", img)
+    return data.tobytes()
+
+class MockSDServer(ThreadingHTTPServer):
+    """Threaded mock server; start with serve_in_thread() and stop with shutdown()."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 0), latency=0.0, error_rate=0.0, image_size=64, seed=None,
+                 jitter=0.0, slots=None):
+        super().__init__(address, _Handler)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slots = threading.BoundedSemaphore(slots) if slots else None
+        self.image_base64 = base64.b64encode(make_png(image_size)).decode("ascii")
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"connections": 0, "requests": 0, "errors": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_in_thread(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def generation_time(self, images=1):
+        with self.lock:
+            jitter = self.random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency * images + jitter)
+
+def _serve(conn, options):
+    server = MockSDServer(**options)
+    conn.send(server.url)
+    conn.close()
+    server.serve_forever()
+
+def start_in_process(**options):
+    """Run a MockSDServer (options as its constructor) in a child process, so it
+    does not share the caller's GIL or memory. Returns (process, url); stop it
+    with process.terminate()."""
+    parent, child = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve, args=(child, options), daemon=True)
+    process.start()
+    url = parent.recv()
+    return process, url
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.stats["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != "/sdapi/v1/img2img":
+            return self._reply(404, {"detail": "Not Found"})
+        with server.lock:
+            server.stats["requests"] += 1
+            fail = server.random.random() < server.error_rate
+            if fail:
+                server.stats["errors"] += 1
+        count = int(payload.get("batch_size", 1)) * int(payload.get("n_iter", 1))
+        with server.slots or contextlib.nullcontext():
+            time.sleep(server.generation_time(1 if fail else count))
+        if fail:
+            return self._reply(500, {"error": "mock failure"})
+        self._reply(200, {"images": [server.image_base64] * count, "parameters": payload, "info": "{}"})
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Mock Stable Diffusion img2img server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7861)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per request (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform +/- seconds added to each request (default: 0)")
+    parser.add_argument("--slots", type=int, help="Generations run at once; the rest queue (default: unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    parser.add_argument("--image-size", type=int, default=64, help="Side of the returned PNG in pixels")
+    args = parser.parse_args(argv)
+    server = MockSDServer((args.host, args.port), args.latency, args.error_rate, args.image_size,
+                          jitter=args.jitter, slots=args.slots)
+    print(f"Mock SD server on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
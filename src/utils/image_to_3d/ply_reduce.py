@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Out-of-core reduction of large binary PLY point clouds (COLMAP's fused.ply,
+Meshroom dense clouds) to a size create_mesh_from_point_cloud can handle.
+The file is memory-mapped and read in chunks of --chunk-points vertices; pages
+are released behind each chunk, so peak memory depends on the chunk size and the
+number of occupied voxels, not on the file size. Three passes:
+    1. bounding box (and point count)
+    2. voxel downsample: each chunk's points are summed per voxel key and merged
+       into a running key -> (sum xyz, sum rgb, count) accumulator
+    3. on the reduced cloud: sparse-voxel removal (--min-voxel-points) and
+       statistical outlier removal, as in point_cloud.preprocess_for_meshing
+The reduced cloud is written as a compact binary PLY (float32 xyz, uchar rgb)
+together with a JSON report of the statistics.
+Run:
+    python ply_reduce.py colmap_output/fused.ply reduced.ply [--resolution 256] [--mesh reduced.obj]
+"""
+
+import sys
+import json
+import mmap
+import time
+import numpy as np
+from pathlib import Path
+from point_cloud import PointCloud, write_binary_ply, remove_statistical_outliers, cloud_stats
+
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+COLOR_NAMES = [("red", "green", "blue"), ("r", "g", "b"), ("diffuse_red", "diffuse_green", "diffuse_blue")]
+DEFAULT_CHUNK_POINTS = 1 << 20
+
+def read_ply_header(path):
+    """(vertex numpy dtype, vertex count, byte offset of the vertex data).
+
+    Only binary PLYs whose vertex element comes first (or after fixed-size
+    elements) can be mapped; ASCII files raise ValueError.
+    """
+    with open(path, "rb") as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"{path} is not a PLY file")
+        fmt, elements = None, []
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"{path}: header has no end_header")
+            words = line.decode("ascii", "replace").split()
+            if not words or words[0] in ("comment", "obj_info"):
+                continue
+            if words[0] == "end_header":
+                break
+            if words[0] == "format":
+                fmt = words[1]
+            elif words[0] == "element":
+                elements.append({"name": words[1], "count": int(words[2]), "properties": []})
+            elif words[0] == "property":
+                elements[-1]["properties"].append(words[1:])
+        data_offset = f.tell()
+    if fmt not in ("binary_little_endian", "binary_big_endian"):
+        raise ValueError(f"{path} is {fmt} PLY; only binary PLY can be processed out of core")
+    endian = "<" if fmt == "binary_little_endian" else ">"
+    for element in elements:
+        if any(p[0] == "list" for p in element["properties"]):
+            if element["name"] == "vertex":
+                raise ValueError(f"{path}: list properties on vertices are not supported")
+            raise ValueError(f"{path}: variable-size element {element['name']!r} precedes the vertices")
+        dtype = np.dtype([(name, endian + PLY_TYPES[kind]) for kind, name in element["properties"]])
+        if element["name"] == "vertex":
+            return dtype, element["count"], data_offset
+        data_offset += dtype.itemsize * element["count"]
+    raise ValueError(f"{path} has no vertex element")
+
+class PlyChunkReader:
+    """Memory-mapped chunked access to the vertices of a binary PLY."""
+
+    def __init__(self, path, chunk_points=DEFAULT_CHUNK_POINTS):
+        self.path = Path(path)
+        self.dtype, self.count, self.offset = read_ply_header(path)
+        self.chunk_points = chunk_points
+        names = self.dtype.names
+        self.color_fields = next((c for c in COLOR_NAMES if all(n in names for n in c)), None)
+
+    def chunks(self):
+        """Yield (points float32 Nx3, colors uint8 Nx3 or None) for consecutive vertex blocks."""
+        if self.count == 0:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start in range(0, self.count, self.chunk_points):
+                n = min(self.chunk_points, self.count - start)
+                offset = self.offset + start * self.dtype.itemsize
+                rows = np.frombuffer(mm, dtype=self.dtype, count=n, offset=offset)
+                points = np.empty((n, 3), dtype=np.float32)
+                for axis, name in enumerate("xyz"):
+                    points[:, axis] = rows[name]
+                colors = None
+                if self.color_fields:
+                    colors = np.empty((n, 3), dtype=np.uint8)
+                    for axis, name in enumerate(self.color_fields):
+                        colors[:, axis] = rows[name]
+                del rows  # release the buffer export before the map can close
+                self._release(mm, offset, n * self.dtype.itemsize)
+                yield points, colors
+
+    @staticmethod
+    def _release(mm, offset, length):
+        """Drop the pages of a processed chunk from this process's resident set."""
+        if not hasattr(mm, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        start = offset - offset % mmap.PAGESIZE
+        mm.madvise(mmap.MADV_DONTNEED, start, min(offset + length, len(mm)) - start)
+
+def ply_bounds(reader):
+    """Pass 1: (mins, maxs) of all finite points."""
+    mins = np.full(3, np.inf)
+    maxs = np.full(3, -np.inf)
+    for points, _ in reader.chunks():
+        finite = points[np.isfinite(points).all(axis=1)]
+        if len(finite):
+            mins = np.minimum(mins, finite.min(axis=0))
+            maxs = np.maximum(maxs, finite.max(axis=0))
+    return mins, maxs
+
+def _reduce_by_key(keys, sums):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    reduced = np.empty((len(unique), sums.shape[1]))
+    for column in range(sums.shape[1]):
+        reduced[:, column] = np.bincount(inverse, weights=sums[:, column], minlength=len(unique))
+    return unique, reduced
+
+def voxel_accumulate(reader, mins, voxel_size, dims):
+    """Pass 2: per occupied voxel, the sums of xyz and rgb and the point count.
+
+    Returns (keys, sums) with sums columns x, y, z, r, g, b, count. Memory is
+    bounded by the number of occupied voxels plus one chunk.
+    """
+    keys_acc = np.empty(0, dtype=np.int64)
+    sums_acc = np.empty((0, 7))
+    pending_keys, pending_sums, pending = [], [], 0
+    for points, colors in reader.chunks():
+        finite = np.isfinite(points).all(axis=1)
+        points = points[finite]
+        coords = np.floor((points - mins) / voxel_size).astype(np.int64)
+        np.clip(coords, 0, dims - 1, out=coords)
+        values = np.empty((len(points), 7))
+        values[:, :3] = points - mins  # offsets keep the float64 sums precise
+        values[:, 3:6] = colors[finite] if colors is not None else 0
+        values[:, 6] = 1
+        chunk_keys, chunk_sums = _reduce_by_key(np.ravel_multi_index(coords.T, dims), values)
+        pending_keys.append(chunk_keys)
+        pending_sums.append(chunk_sums)
+        pending += len(chunk_keys)
+        # Merge once the buffered partial sums outgrow the accumulator
+        if pending > max(len(keys_acc), reader.chunk_points):
+            keys_acc, sums_acc = _reduce_by_key(np.concatenate([keys_acc] + pending_keys),
+                                                np.concatenate([sums_acc] + pending_sums))
+            pending_keys, pending_sums, pending = [], [], 0
+    if pending_keys:
+        keys_acc, sums_acc = _reduce_by_key(np.concatenate([keys_acc] + pending_keys),
+                                            np.concatenate([sums_acc] + pending_sums))
+    return keys_acc, sums_acc
+
+def reduce_ply(input_path, output_path, voxel_size=None, resolution=128, min_voxel_points=1,
+               nb_neighbors=20, std_ratio=2.0, chunk_points=DEFAULT_CHUNK_POINTS):
+    """Reduce a large binary PLY cloud out of core; returns (PointCloud, stats).
+
+    voxel_size=None uses the bounding-box diagonal / resolution, as
+    point_cloud.auto_voxel_size does. Voxels with fewer than min_voxel_points
+    input points are dropped as sparse noise; nb_neighbors=0 disables the
+    statistical outlier removal. A voxel_size too small for the voxel grid to be
+    indexed in int64 raises ValueError naming the smallest usable size.
+    """
+    start = time.perf_counter()
+    reader = PlyChunkReader(input_path, chunk_points)
+    mins, maxs = ply_bounds(reader)
+    if not np.isfinite(mins).all():
+        raise ValueError(f"{input_path} has no finite points")
+    if voxel_size is None:
+        voxel_size = float(np.linalg.norm(maxs - mins)) / resolution or 1.0
+    if not voxel_size > 0:
+        raise ValueError(f"voxel size must be positive, got {voxel_size}")
+    cells = np.floor((maxs - mins) / voxel_size) + 1
+    # Voxel keys are linear int64 indices, so the grid must fit in one
+    if np.prod(cells) >= 2.0 ** 63:
+        raise ValueError(f"voxel size {voxel_size:.4g} is too small for this cloud "
+                         f"({' x '.join(f'{c:.3g}' for c in cells)} voxels); "
+                         f"use at least {float((maxs - mins).max()) / 2 ** 20:.4g}")
+    dims = cells.astype(np.int64)
+
+    keys, sums = voxel_accumulate(reader, mins, voxel_size, dims)
+    counts = sums[:, 6]
+    dense = counts >= min_voxel_points
+    centroids = sums[dense, :3] / counts[dense, None] + mins
+    colors = np.clip(np.round(sums[dense, 3:6] / counts[dense, None]), 0, 255).astype(np.uint8)
+    cloud = PointCloud.from_arrays(centroids.astype(np.float32), colors)
+
+    stats = {
+        "input": {"path": str(input_path), "points": reader.count, "bytes": Path(input_path).stat().st_size,
+                  "bounds": [mins.tolist(), maxs.tolist()], "has_colors": reader.color_fields is not None},
+        "voxel_size": voxel_size,
+        "occupied_voxels": len(keys),
+        "points_per_voxel": {q: float(np.percentile(counts, p)) for q, p in
+                             (("p5", 5), ("p50", 50), ("p95", 95))} if len(counts) else None,
+        "sparse_voxels_removed": int((~dense).sum()),
+    }
+    before = len(cloud)
+    if nb_neighbors > 0:
+        cloud = remove_statistical_outliers(cloud, nb_neighbors, std_ratio)
+    stats["outlier_removal"] = {"nb_neighbors": nb_neighbors, "std_ratio": std_ratio, "removed": before - len(cloud)}
+    stats["output"] = dict(cloud_stats(cloud), path=str(output_path))
+    write_binary_ply(output_path, cloud.points, cloud.colors)
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    return cloud, stats
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Reduce a large binary PLY point cloud out of core")
+    parser.add_argument("input", help="Binary PLY point cloud (e.g. COLMAP fused.ply)")
+    parser.add_argument("output", help="Reduced binary PLY to write")
+    parser.add_argument("--voxel-size", type=float, help="Voxel edge in input units (default: bounding-box diagonal / resolution)")
+    parser.add_argument("--resolution", type=int, default=128, help="Voxels along the bounding-box diagonal when --voxel-size is not given (default: 128)")
+    parser.add_argument("--min-voxel-points", type=int, default=1, help="Drop voxels holding fewer input points (default: 1, keep all)")
+    parser.add_argument("--nb-neighbors", type=int, default=20, help="Neighbours for statistical outlier removal; 0 disables (default: 20)")
+    parser.add_argument("--std-ratio", type=float, default=2.0, help="Outlier threshold in standard deviations (default: 2.0)")
+    parser.add_argument("--chunk-points", type=int, default=DEFAULT_CHUNK_POINTS, help=f"Vertices per chunk (default: {DEFAULT_CHUNK_POINTS})")
+    parser.add_argument("--report", help="Statistics JSON (default: <output>.json)")
+    parser.add_argument("--mesh", help="Also mesh the reduced cloud with create_mesh_from_point_cloud and export it here")
+    parser.add_argument("--mesher", choices=["auto", "surface", "open3d"], default="auto", help="Meshing method for --mesh (default: auto)")
+    args = parser.parse_args(argv)
+
+    try:
+        cloud, stats = reduce_ply(args.input, args.output, args.voxel_size, args.resolution, args.min_voxel_points,
+                                  args.nb_neighbors, args.std_ratio, args.chunk_points)
+    except ValueError as e:
+        sys.exit(f"❌ {e}")
+    report = args.report or str(Path(args.output).with_suffix(".json"))
+    with open(report, "w") as f:
+        json.dump(stats, f, indent=2)
+    print(f"{stats['input']['points']} points -> {stats['output']['points']} "
+          f"(voxel {stats['voxel_size']:.4g}, {stats['occupied_voxels']} voxels, "
+          f"{stats['sparse_voxels_removed']} sparse, {stats['outlier_removal']['removed']} outliers) "
+          f"in {stats['seconds']:.1f}s")
+    print(f"Reduced cloud: {args.output}  report: {report}")
+    if args.mesh:
+        from image_to_3d_trimesh import create_mesh_from_point_cloud
+        mesh = create_mesh_from_point_cloud(cloud.points, cloud.colors, method=args.mesher)
+        mesh.export(args.mesh)
+        print(f"Mesh: {args.mesh}")
+
+if __name__ == "__main__":
+    main()
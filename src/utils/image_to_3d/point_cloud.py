@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Compact point-cloud container for the image-to-3D pipeline.
+Positions are float32 and colours uint8 RGB (15 bytes per point instead of 48 for
+float64 positions plus float64 0-1 colours). Storage is preallocated from the
+known per-view upper bound and filled in place, so combining views never builds
+Python lists or vstack copies. Conversion to trimesh/open3d happens only at the
+boundary, via to_trimesh()/to_open3d(); write_ply() streams straight to binary PLY.
+"""
+
+import math
+import numpy as np
+
+def max_points_per_view(depth_shape, step=4):
+    """Upper bound on points back-projected from one depth map at the given stride."""
+    h, w = depth_shape[:2]
+    return math.ceil(h / step) * math.ceil(w / step)
+
+class PointCloud:
+    """Growable float32/uint8 point cloud; points and colors are views of the filled part."""
+
+    def __init__(self, capacity=0):
+        self._points = np.empty((capacity, 3), dtype=np.float32)
+        self._colors = np.empty((capacity, 3), dtype=np.uint8)
+        self.count = 0
+
+    @classmethod
+    def from_arrays(cls, points, colors):
+        cloud = cls(len(points))
+        cloud.append(points, colors)
+        return cloud
+
+    @property
+    def capacity(self):
+        return len(self._points)
+
+    @property
+    def points(self):
+        return self._points[:self.count]
+
+    @property
+    def colors(self):
+        return self._colors[:self.count]
+
+    @property
+    def nbytes(self):
+        return self.points.nbytes + self.colors.nbytes
+
+    def __len__(self):
+        return self.count
+
+    def reserve(self, capacity):
+        """Grow storage to hold at least capacity points (one copy of the filled part)."""
+        if capacity <= self.capacity:
+            return
+        points = np.empty((capacity, 3), dtype=np.float32)
+        colors = np.empty((capacity, 3), dtype=np.uint8)
+        points[:self.count] = self.points
+        colors[:self.count] = self.colors
+        self._points, self._colors = points, colors
+
+    def append(self, points, colors):
+        """Copy points (Nx3) and colours (Nx3 uint8, or floats in 0-1) into the next free slots."""
+        n = len(points)
+        end = self.count + n
+        if end > self.capacity:
+            self.reserve(max(end, 2 * self.capacity))
+        self._points[self.count:end] = points
+        if np.issubdtype(np.asarray(colors).dtype, np.floating):
+            colors = np.clip(np.round(np.asarray(colors) * 255.0), 0, 255)
+        self._colors[self.count:end] = colors
+        self.count = end
+        return n
+
+    def to_trimesh(self, scale=1.0):
+        import trimesh
+        points = self.points * np.float32(scale) if scale != 1.0 else self.points
+        return trimesh.PointCloud(points, colors=self.colors)
+
+    def write_ply(self, path, scale=1.0):
+        return write_binary_ply(path, self.points, self.colors, scale=scale)
+
+    def to_open3d(self):
+        import open3d as o3d
+        pcd = o3d.geometry.PointCloud()
+        pcd.points = o3d.utility.Vector3dVector(self.points.astype(np.float64))
+        pcd.colors = o3d.utility.Vector3dVector(self.colors.astype(np.float64) / 255.0)
+        return pcd
+
+_PLY_VERTEX = np.dtype([("x", "<f4"), ("y", "<f4"), ("z", "<f4"),
+                        ("red", "u1"), ("green", "u1"), ("blue", "u1")])
+
+def write_binary_ply(path, points, colors=None, scale=1.0, chunk_points=1 << 20):
+    """Stream points (and uint8 RGB colors) to a binary little-endian PLY.
+
+    Rows are packed chunk_points at a time, so memory stays bounded however large
+    the cloud is. Returns the number of bytes written.
+    """
+    points = np.asarray(points)
+    dtype = _PLY_VERTEX if colors is not None else np.dtype(_PLY_VERTEX.descr[:3])
+    properties = "".join(f"property {'float' if dtype[name].kind == 'f' else 'uchar'} {name}\n" for name in dtype.names)
+    header = f"ply\nformat binary_little_endian 1.0\nelement vertex {len(points)}\n{properties}end_header\n"
+    chunk = np.empty(min(chunk_points, max(len(points), 1)), dtype=dtype)
+    with open(path, "wb") as f:
+        f.write(header.encode("ascii"))
+        for start in range(0, len(points), chunk_points):
+            block = points[start:start + chunk_points]
+            rows = chunk[:len(block)]
+            rows["x"], rows["y"], rows["z"] = (block * np.float32(scale)).T if scale != 1.0 else block.T
+            if colors is not None:
+                c = colors[start:start + chunk_points]
+                rows["red"], rows["green"], rows["blue"] = c[:, 0], c[:, 1], c[:, 2]
+            f.write(rows.tobytes())
+        return f.tell()
+
+def cloud_stats(cloud):
+    """Summary of a cloud for metadata.json."""
+    if len(cloud) == 0:
+        return {"points": 0, "bounds": None, "bytes": 0}
+    return {
+        "points": len(cloud),
+        "bounds": [cloud.points.min(axis=0).tolist(), cloud.points.max(axis=0).tolist()],
+        "bytes": cloud.nbytes,
+    }
+
+def auto_voxel_size(cloud, resolution=128):
+    """Voxel edge giving roughly `resolution` cells along the bounding-box diagonal."""
+    if len(cloud) == 0:
+        return 0.0
+    diagonal = float(np.linalg.norm(cloud.points.max(axis=0) - cloud.points.min(axis=0)))
+    return diagonal / resolution
+
+def voxel_downsample(cloud, voxel_size):
+    """Replace all points in each occupied voxel by their centroid and mean colour.
+
+    Fully vectorized: points are bucketed by integer voxel coordinate and averaged
+    with bincount, so cost is linear in the input and output size is bounded by the
+    number of occupied voxels. Any voxel_size works; grids too fine for a linear
+    int64 voxel index fall back to grouping coordinate rows.
+    """
+    if len(cloud) == 0 or voxel_size <= 0:
+        return cloud
+    points = cloud.points
+    mins = points.min(axis=0)
+    coords = np.floor((points - mins) / np.float32(voxel_size)).astype(np.int64)
+    dims = coords.max(axis=0) + 1
+    if int(dims[0]) * int(dims[1]) * int(dims[2]) < 2 ** 63:
+        keys = np.ravel_multi_index(coords.T, dims)
+    else:
+        # Grid too fine for a linear int64 index: group the coordinate rows directly
+        keys = coords
+    _, inverse, counts = np.unique(keys, axis=0, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    n = len(counts)
+
+    out = PointCloud(n)
+    out.count = n
+    for axis in range(3):
+        out._points[:, axis] = np.bincount(inverse, weights=points[:, axis], minlength=n) / counts
+        mean_color = np.bincount(inverse, weights=cloud.colors[:, axis], minlength=n) / counts
+        out._colors[:, axis] = np.clip(np.round(mean_color), 0, 255)
+    return out
+
+def remove_statistical_outliers(cloud, nb_neighbors=20, std_ratio=2.0, workers=-1):
+    """Drop points whose mean distance to their k nearest neighbours is unusually large.
+
+    A point is kept when its mean neighbour distance is within std_ratio standard
+    deviations of the cloud-wide mean, matching Open3D's remove_statistical_outlier.
+    workers is the KD-tree query thread count (-1: all cores).
+    """
+    from scipy.spatial import cKDTree
+
+    if len(cloud) <= nb_neighbors:
+        return cloud
+    tree = cKDTree(cloud.points)
+    distances, _ = tree.query(cloud.points, k=nb_neighbors + 1, workers=workers)
+    mean_distances = distances[:, 1:].mean(axis=1)  # column 0 is the point itself
+    threshold = mean_distances.mean() + std_ratio * mean_distances.std()
+    keep = mean_distances <= threshold
+    return PointCloud.from_arrays(cloud.points[keep], cloud.colors[keep])
+
+def preprocess_for_meshing(cloud, voxel_size=None, nb_neighbors=20, std_ratio=2.0, workers=-1):
+    """Voxel-downsample then remove outliers; returns (cloud, stats dict for metadata).
+
+    voxel_size=None picks one from the bounding box (see auto_voxel_size); 0 disables
+    downsampling and nb_neighbors=0 disables outlier removal.
+    """
+    stats = {"input": cloud_stats(cloud)}
+    if voxel_size is None:
+        voxel_size = auto_voxel_size(cloud)
+    if voxel_size > 0:
+        cloud = voxel_downsample(cloud, voxel_size)
+    stats["voxel_size"] = voxel_size
+    stats["after_downsample"] = cloud_stats(cloud)
+    if nb_neighbors > 0:
+        cloud = remove_statistical_outliers(cloud, nb_neighbors, std_ratio, workers)
+    stats["outlier_removal"] = {"nb_neighbors": nb_neighbors, "std_ratio": std_ratio}
+    stats["output"] = cloud_stats(cloud)
+    return cloud, stats
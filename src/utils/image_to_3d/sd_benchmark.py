@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the image generation client (sd_client.py).
+Starts mock_sd_server.py in a child process, or targets a real web UI with --url,
+and sends the same img2img requests at each --concurrency level. Reports
+images/sec, p50/p95 request latency, retries and the client's peak RSS, then
+recommends the smallest concurrency within 5% of the best throughput; use it as
+--concurrency / SD_CONCURRENCY for batch_gen_auto.py.
+A single-GPU web UI generates one request at a time, which --slots 1 models:
+extra concurrency then only hides network and encode time.
+Run:
+    python sd_benchmark.py --latency 0.5 --jitter 0.2 --slots 1 --concurrency 1,2,4,8
+    python sd_benchmark.py --url http://127.0.0.1:7860 --init-image RoachSample.png --requests 16
+"""
+
+import time
+import json
+import base64
+import asyncio
+import tempfile
+import numpy as np
+from pathlib import Path
+from sd_client import SDClient
+from stage_profiler import StageProfiler
+
+def make_payload(init_image=None, image_size=512, steps=20):
+    if init_image:
+        image_bytes = Path(init_image).read_bytes()
+    else:
+        from mock_sd_server import make_png
+        image_bytes = make_png(image_size)
+    return {"prompt": "benchmark", "steps": steps, "width": image_size, "height": image_size,
+            "seed": 1, "denoising_strength": 0.5,
+            "init_images": [base64.b64encode(image_bytes).decode("utf-8")]}
+
+async def _run_level(url, payload, requests, concurrency, output_dir, client_options):
+    latencies, errors = [], 0
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async with SDClient(url, concurrency, **client_options) as client:
+        async def worker():
+            nonlocal errors
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                try:
+                    await client.img2img_to_files(payload, [output_dir / f"{concurrency}_{i}.png"])
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        seconds = time.perf_counter() - start
+    return latencies, errors, seconds, client.stats
+
+def benchmark(url, payload, levels, requests=32, warmup=2, client_options=None):
+    """One result dict per concurrency level."""
+    client_options = client_options or {}
+    profiler = StageProfiler()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = Path(tmp)
+        if warmup:
+            asyncio.run(_run_level(url, payload, warmup, 1, output_dir, client_options))
+        for level in levels:
+            name = f"concurrency_{level}"
+            with profiler.stage(name):
+                latencies, errors, seconds, stats = asyncio.run(
+                    _run_level(url, payload, requests, level, output_dir, client_options))
+            for f in output_dir.iterdir():
+                f.unlink()
+            peak = profiler.stages[name]["peak_rss_bytes"]
+            results.append({
+                "concurrency": level,
+                "images": len(latencies),
+                "failures": errors,
+                "retries": stats["retries"],
+                "seconds": seconds,
+                "images_per_sec": len(latencies) / seconds if seconds else 0.0,
+                "p50": float(np.percentile(latencies, 50)) if latencies else None,
+                "p95": float(np.percentile(latencies, 95)) if latencies else None,
+                "peak_rss_mb": peak / 1024 ** 2 if peak else None,
+            })
+    return results
+
+def recommend(results, tolerance=0.05):
+    """Smallest concurrency whose throughput is within tolerance of the best."""
+    best = max(r["images_per_sec"] for r in results)
+    return min(r["concurrency"] for r in results if r["images_per_sec"] >= best * (1 - tolerance))
+
+def print_results(results):
+    print(f"{'concurrency':>11} {'img/s':>7} {'p50 s':>7} {'p95 s':>7} {'fail':>5} {'retry':>6} {'peak MB':>8}")
+    for r in results:
+        p50 = f"{r['p50']:.3f}" if r["p50"] is not None else "-"
+        p95 = f"{r['p95']:.3f}" if r["p95"] is not None else "-"
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{r['concurrency']:>11} {r['images_per_sec']:>7.2f} {p50:>7} {p95:>7} "
+              f"{r['failures']:>5} {r['retries']:>6} {rss:>8}")
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark image generation throughput per client concurrency")
+    parser.add_argument("--url", help="Benchmark this web UI instead of a local mock server")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma-separated levels (default: 1,2,4,8)")
+    parser.add_argument("--requests", type=int, default=32, help="Requests per level (default: 32)")
+    parser.add_argument("--warmup", type=int, default=2, help="Untimed requests before the first level (default: 2)")
+    parser.add_argument("--init-image", help="Init image to send (default: a generated PNG)")
+    parser.add_argument("--image-size", type=int, default=512, help="Requested and mock-returned image side in pixels (default: 512)")
+    parser.add_argument("--steps", type=int, default=20, help="Sampling steps requested (default: 20)")
+    parser.add_argument("--backoff", type=float, default=0.2, help="First retry delay in seconds (default: 0.2)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Mock seconds per image (default: 0.5)")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Mock uniform +/- seconds per request (default: 0.1)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Mock fraction of HTTP 500 replies (default: 0)")
+    parser.add_argument("--slots", type=int, default=1, help="Mock generations at once, 0 for unlimited (default: 1, one GPU)")
+    parser.add_argument("--output", help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    levels = [int(c) for c in args.concurrency.split(",")]
+    payload = make_payload(args.init_image, args.image_size, args.steps)
+    process = None
+    url = args.url
+    if url is None:
+        from mock_sd_server import start_in_process
+        process, url = start_in_process(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                        image_size=args.image_size, slots=args.slots or None, seed=0)
+        print(f"Mock server {url}: latency {args.latency}s +/- {args.jitter}s, "
+              f"error rate {args.error_rate}, slots {args.slots or 'unlimited'}")
+    try:
+        results = benchmark(url, payload, levels, args.requests, args.warmup, {"backoff": args.backoff})
+    finally:
+        if process is not None:
+            process.terminate()
+
+    print_results(results)
+    print(f"Recommended concurrency: {recommend(results)}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"url": url, "requests": args.requests, "levels": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
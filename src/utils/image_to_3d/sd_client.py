@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Asyncio client for the Stable Diffusion web UI API (AUTOMATIC1111 /sdapi/v1/img2img).
+One aiohttp session keeps a pool of keep-alive connections; a semaphore bounds
+in-flight requests (the web UI queues work, so a small concurrency keeps the GPU
+busy without piling up timeouts). Connection errors, timeouts, 429 and 5xx
+responses are retried with exponential backoff and jitter; other 4xx fail at once.
+Images are written as soon as their response arrives, not in submission order.
+Responses are streamed: the base64 "images" strings are decoded chunk by chunk
+straight to disk and every other field is skipped unparsed, so a request in
+flight holds about one read chunk rather than the body, the JSON and the decoded
+image at once. Written PNGs can be validated and recompressed in a worker pool.
+Single-image jobs that differ only in consecutive seeds are merged into one
+request (batch_size / n_iter) so the server sets up the model once per batch.
+Test against the local stand-in:
+    python mock_sd_server.py --port 7861 --latency 0.5 --error-rate 0.2
+Dependencies:
+    pip install aiohttp
+"""
+
+import os
+import re
+import json
+import time
+import random
+import asyncio
+import binascii
+from pathlib import Path
+
+DEFAULT_BASE_URL = "http://127.0.0.1:7860"
+IMG2IMG_PATH = "/sdapi/v1/img2img"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class GenerationError(Exception):
+    """A request that failed for good (non-retryable status or retries exhausted)."""
+
+class _Retryable(Exception):
+    pass
+
+_STRING_STOP = re.compile(rb'["\\]')
+_STRUCTURE = re.compile(rb'["{}\[\],]')
+
+class ImageStreamWriter:
+    """Incremental parser for an img2img JSON response.
+
+    feed() takes raw body chunks in order; each string of the top-level "images"
+    array is base64-decoded as it arrives into its own file (paths from
+    make_path(index)). Other values are scanned for their structure only and never
+    stored. close() checks the document ended and returns the written paths.
+    """
+
+    _KEY_LIMIT = 64
+
+    def __init__(self, make_path):
+        self.make_path = make_path
+        self.paths = []
+        self._depth = 0
+        self._expect_key = False
+        self._key = None
+        self._in_images = False
+        self._in_string = False
+        self._escape = False
+        self._string = None  # key text being collected, or None
+        self._file = None
+        self._pending = b""  # base64 characters not yet forming a full quantum
+
+    def feed(self, chunk):
+        pos, end = 0, len(chunk)
+        while pos < end:
+            if self._in_string:
+                pos = self._feed_string(chunk, pos)
+                continue
+            match = _STRUCTURE.search(chunk, pos)
+            if match is None:
+                return
+            char, pos = match.group(), match.end()
+            if char == b'"':
+                self._start_string()
+            elif char in b"{[":
+                self._depth += 1
+                if self._depth == 1:
+                    self._expect_key = char == b"{"
+                elif self._depth == 2 and self._key == "images" and char == b"[":
+                    self._in_images = True
+            elif char in b"}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._in_images = False
+            elif char == b"," and self._depth == 1:
+                self._expect_key = True
+
+    def _start_string(self):
+        self._in_string = True
+        if self._depth == 1 and self._expect_key:
+            self._string = ""
+        elif self._in_images and self._depth == 2:
+            path = Path(self.make_path(len(self.paths)))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.paths.append(path)
+            self._file = open(path, "wb")
+
+    def _feed_string(self, chunk, pos):
+        """Consume string content from pos; returns the position after it."""
+        if self._escape:
+            # Only "\/" can occur in base64; other escapes matter for keys alone
+            self._escape = False
+            self._string_data(chunk[pos:pos + 1])
+            pos += 1
+        match = _STRING_STOP.search(chunk, pos)
+        stop = match.start() if match else len(chunk)
+        self._string_data(chunk[pos:stop])
+        if match is None:
+            return stop
+        if match.group() == b"\\":
+            self._escape = True
+            return stop + 1
+        self._end_string()
+        return stop + 1
+
+    def _string_data(self, data):
+        if not data:
+            return
+        if self._file is not None:
+            data = self._pending + data
+            usable = len(data) - len(data) % 4
+            self._file.write(binascii.a2b_base64(data[:usable]))
+            self._pending = data[usable:]
+        elif self._string is not None and len(self._string) < self._KEY_LIMIT:
+            self._string += data.decode("utf-8", "replace")
+
+    def _end_string(self):
+        self._in_string = False
+        if self._file is not None:
+            if self._pending:
+                self._file.write(binascii.a2b_base64(self._pending + b"=" * (-len(self._pending) % 4)))
+                self._pending = b""
+            self._file.close()
+            self._file = None
+        elif self._string is not None:
+            self._key, self._string = self._string, None
+            self._expect_key = False
+
+    def close(self):
+        """Finish the document and return the written paths."""
+        if self._depth != 0 or self._in_string:
+            raise _Retryable("truncated response body")
+        return self.paths
+
+    def discard(self):
+        """Close and delete whatever was written (files already moved are ignored)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for path in self.paths:
+            path.unlink(missing_ok=True)
+
+class SDClient:
+    """Pooled, bounded, retrying client; use as `async with SDClient(...) as client`.
+
+    Args:
+        base_url: Web UI address, e.g. http://127.0.0.1:7860
+        concurrency: Requests in flight at once (also the connection pool size)
+        timeout: Seconds allowed for one whole request, generation included
+        connect_timeout: Seconds allowed to open a connection
+        retries: Extra attempts after the first for retryable failures
+        backoff: First retry delay in seconds, doubled per attempt up to max_backoff
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, concurrency=4, timeout=600.0, connect_timeout=10.0,
+                 retries=4, backoff=1.0, max_backoff=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "response_bytes": 0}
+        self._session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        import aiohttp
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout, sock_connect=self.connect_timeout)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    def _delay(self, attempt):
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+    async def _read_body(self, response):
+        body = await response.read()
+        self.stats["response_bytes"] += len(body)
+        return body
+
+    async def _post_once(self, path, payload, consume):
+        import aiohttp
+        try:
+            async with self._session.post(self.base_url + path, json=payload) as response:
+                if response.status in RETRY_STATUSES:
+                    await self._read_body(response)
+                    raise _Retryable(f"HTTP {response.status}")
+                if response.status != 200:
+                    body = await self._read_body(response)
+                    raise GenerationError(f"HTTP {response.status}: {body[:200].decode('utf-8', 'replace')}")
+                return await consume(response)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            raise _Retryable(f"{type(e).__name__}: {e}") from e
+
+    async def post(self, path, payload, consume=None):
+        """POST payload as JSON; returns the raw 200 response body, or what
+        `await consume(response)` returns (consume is retried with the request)."""
+        consume = consume or self._read_body
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                self.stats["requests"] += 1
+                try:
+                    return await self._post_once(path, payload, consume)
+                except _Retryable as e:
+                    if attempt == self.retries:
+                        self.stats["failures"] += 1
+                        raise GenerationError(f"giving up after {attempt + 1} attempts: {e}") from e
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(self._delay(attempt))
+                except GenerationError:
+                    self.stats["failures"] += 1
+                    raise
+
+    async def img2img(self, payload):
+        return json.loads(await self.post(IMG2IMG_PATH, payload))
+
+    async def img2img_to_files(self, payload, paths, chunk_size=1 << 16):
+        """Run img2img and stream the returned images into paths, in order.
+
+        Images are decoded to temporary files beside their targets and renamed
+        only once the whole response has arrived; a grid image the server
+        prepends is dropped.
+        """
+        paths = [Path(p) for p in paths]
+
+        def temp_path(index):
+            target = paths[min(index, len(paths) - 1)]
+            return target.with_name(f".{target.name}.{os.getpid()}.{id(paths)}.{index}.part")
+
+        async def consume(response):
+            writer = ImageStreamWriter(temp_path)
+            try:
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    self.stats["response_bytes"] += len(chunk)
+                    # Decoding and disk writes stay off the event loop
+                    await asyncio.to_thread(writer.feed, chunk)
+                written = writer.close()
+                if len(written) == len(paths) + 1:
+                    written[0].unlink()
+                    written = written[1:]
+                if len(written) < len(paths):
+                    raise GenerationError(f"expected {len(paths)} images, got {len(written)}")
+                for part, target in zip(written, paths):
+                    os.replace(part, target)
+                return paths
+            finally:
+                writer.discard()
+
+        return await self.post(IMG2IMG_PATH, payload, consume)
+
+def _job_paths(path):
+    return [path] if isinstance(path, (str, Path)) else list(path)
+
+def optimize_png(path, compression=9):
+    """Validate a written image by decoding it and rewrite it as a maximally
+    compressed PNG when that is smaller. Raises GenerationError for corrupt data."""
+    import cv2
+    import numpy as np
+    data = np.fromfile(str(path), dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise GenerationError(f"{path} is not a valid image")
+    ok, encoded = cv2.imencode(".png", image, [cv2.IMWRITE_PNG_COMPRESSION, compression])
+    if ok and len(encoded) < len(data):
+        tmp = Path(path).with_name(Path(path).name + ".tmp")
+        encoded.tofile(str(tmp))
+        os.replace(tmp, path)
+    return path
+
+async def generate_images_async(client, jobs, png_pool=None):
+    """Run (output_path(s), payload) jobs; yields (output_path(s), error_or_None) as each finishes.
+
+    A payload with batch_size * n_iter > 1 returns several images, written in order
+    to the job's list of paths. With png_pool (a concurrent.futures executor) each
+    image is then validated and recompressed there (optimize_png).
+    """
+    loop = asyncio.get_running_loop()
+
+    async def run(path, payload):
+        try:
+            paths = await client.img2img_to_files(payload, _job_paths(path))
+            if png_pool is not None:
+                await asyncio.gather(*[loop.run_in_executor(png_pool, optimize_png, p) for p in paths])
+            return path, None
+        except Exception as e:
+            return path, e
+
+    for finished in asyncio.as_completed([run(path, payload) for path, payload in jobs]):
+        yield await finished
+
+# Fields that may differ between the single-image jobs merged into one request
+_BATCH_FIELDS = ("seed", "init_images", "mask", "batch_size", "n_iter")
+
+def _seed(payload):
+    seed = payload.get("seed", -1)
+    return -1 if seed is None else int(seed)
+
+def batch_jobs(jobs, max_batch_size=4, max_n_iter=4):
+    """Merge single-image (path, payload) jobs into server-side batches.
+
+    The web UI gives image i of a batch the seed seed + i, so jobs whose payloads
+    are identical apart from consecutive seeds (or all seed -1) become one request
+    with batch_size up to max_batch_size and n_iter up to max_n_iter; the model and
+    conditioning are then set up once per request instead of once per image.
+    Returns [(paths, payload, member_payloads)].
+    """
+    groups = {}
+    for path, payload in jobs:
+        params = json.dumps({k: v for k, v in payload.items() if k not in _BATCH_FIELDS}, sort_keys=True)
+        # init images are compared as strings; a shared encoding makes this cheap
+        key = (params, tuple(payload.get("init_images", ())), payload.get("mask"))
+        groups.setdefault(key, []).append((path, payload))
+
+    batched = []
+    for group in groups.values():
+        group.sort(key=lambda job: _seed(job[1]))
+        runs = []
+        for job in group:
+            seed = _seed(job[1])
+            last = _seed(runs[-1][-1][1]) if runs else None
+            if runs and (seed == last == -1 or (seed != -1 and last != -1 and seed == last + 1)):
+                runs[-1].append(job)
+            else:
+                runs.append([job])
+        for run in runs:
+            while run:
+                batch_size = min(len(run), max_batch_size)
+                n_iter = min(len(run) // batch_size, max_n_iter)
+                chunk, run = run[:batch_size * n_iter], run[batch_size * n_iter:]
+                payload = dict(chunk[0][1], batch_size=batch_size, n_iter=n_iter)
+                batched.append(([path for path, _ in chunk], payload, [p for _, p in chunk]))
+    return batched
+
+def plan_requests(jobs, cache=None, max_batch_size=4, max_n_iter=4):
+    """Split single-image jobs into cache hits and the batched requests still needed.
+
+    Returns (hits, batched, keys): hits are (path, key) pairs, batched as from
+    batch_jobs, keys maps each cacheable path to its cache key. Jobs with seed -1
+    are random by design and never cached.
+    """
+    keys, hits, misses = {}, [], []
+    for path, payload in jobs:
+        if cache is not None and _seed(payload) != -1:
+            keys[path] = cache.make_key(payload)
+            if keys[path] in cache:
+                hits.append((path, keys[path]))
+                continue
+        misses.append((path, payload))
+    return hits, batch_jobs(misses, max_batch_size, max_n_iter), keys
+
+def generate_images(jobs, base_url=DEFAULT_BASE_URL, concurrency=4, cache=None, manifest_path=None,
+                    max_batch_size=1, max_n_iter=1, png_workers=0, **client_options):
+    """Blocking wrapper: run single-image (path, payload) jobs, print progress and
+    return [(path, error_or_None)] and stats.
+
+    With a generation_cache.GenerationCache, jobs whose payload was generated before
+    are copied from the cache without any HTTP call and new images are added to it.
+    max_batch_size / max_n_iter > 1 merge compatible jobs into server-side batches
+    (see batch_jobs). png_workers > 0 validates and recompresses each new image in
+    that many threads (see optimize_png). manifest_path writes a JSON record of
+    every output (see generation_cache.write_manifest).
+    """
+    hits, batched, keys = plan_requests(jobs, cache, max_batch_size, max_n_iter)
+    sources = {}
+    for path, key in hits:
+        if cache.fetch(key, path):
+            sources[path] = "cache"
+            print(f"♻️  Cached: {path}")
+        else:  # evicted since planning
+            batched.extend(batch_jobs([(path, dict(jobs)[path])], 1, 1))
+    members = {tuple(paths): payloads for paths, _, payloads in batched}
+
+    async def main():
+        results = [(path, None) for path in sources]
+        start = time.perf_counter()
+        stats = {"requests": 0, "retries": 0, "failures": 0, "response_bytes": 0}
+        if batched:
+            from concurrent.futures import ThreadPoolExecutor
+            png_pool = ThreadPoolExecutor(max_workers=png_workers) if png_workers > 0 else None
+            async with SDClient(base_url, concurrency, **client_options) as client:
+                requests = [(paths, payload) for paths, payload, _ in batched]
+                async for paths, error in generate_images_async(client, requests, png_pool):
+                    for path, payload in zip(paths, members[tuple(paths)]):
+                        results.append((path, error))
+                        if error is None:
+                            sources[path] = "generated"
+                            if path in keys:
+                                await asyncio.to_thread(cache.put, keys[path], path, payload)
+                            print(f"✅ Saved: {path}")
+                        else:
+                            sources[path] = f"error: {error}"
+                            print(f"❌ Failed {path}: {error}")
+            if png_pool is not None:
+                png_pool.shutdown()
+            stats = dict(client.stats)
+        stats.update(seconds=time.perf_counter() - start, cache_hits=len(hits), batches=len(batched))
+        return results, stats
+
+    results, stats = asyncio.run(main())
+    if manifest_path is not None:
+        from generation_cache import describe_payload, write_manifest
+        entries = []
+        for path, payload in jobs:
+            described = describe_payload(payload)
+            entries.append({"path": str(path), "key": keys.get(path), "source": sources[path],
+                            "prompt": payload.get("prompt"), "seed": payload.get("seed"),
+                            "init_images": described.get("init_images"),
+                            "parameters": {k: v for k, v in described.items()
+                                           if k not in ("prompt", "seed", "init_images")}})
+        write_manifest(manifest_path, entries)
+    return results, stats
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Per-stage wall time, CPU time and peak memory for the image-to-3D pipeline.
+Wrap each stage in `with profiler.stage("name"):`; repeated or concurrent spans
+of the same name (e.g. per-image decode on a thread pool) are aggregated.
+Peak memory is the process resident set size, sampled on a background thread
+while any stage is open, so overlapping stages share the same peak.
+Spans can be written as a Chrome trace (chrome://tracing or ui.perfetto.dev).
+Set IMAGE_TO_3D_PROFILE=/some/dir to also dump a cProfile file per stage
+({stage}.prof, view with `python -m pstats` or snakeviz). Each span is profiled in
+the thread that runs it, since a cProfile.Profile only sees the thread that enabled
+it, so stages on worker threads (decode, depth_inference, masking, the exports) are
+covered; spans of the same stage are merged into one file. A span nested in
+another profiled span of the same thread is covered by the outer one. Where only
+one profiler can be active per process (Python 3.12+), a span that starts while
+another is being profiled is left out.
+"""
+
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+PROFILE_ENV = "IMAGE_TO_3D_PROFILE"
+
+def current_rss():
+    """Resident set size of this process in bytes, or None if it cannot be read."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+def max_rss():
+    """Lifetime peak RSS of this process in bytes, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StageProfiler:
+    """Collects stage spans; see the module docstring.
+
+    Args:
+        profile_dir: Directory for per-stage cProfile dumps (default: $IMAGE_TO_3D_PROFILE)
+        sample_interval: Seconds between RSS samples while a stage is open
+    """
+
+    def __init__(self, profile_dir=None, sample_interval=0.01):
+        profile_dir = profile_dir or os.environ.get(PROFILE_ENV)
+        self.profile_dir = Path(profile_dir) if profile_dir else None
+        self.sample_interval = sample_interval
+        self.stages = {}
+        self.events = []
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._open = {}
+        self._next_span = 0
+        self._profiling = threading.local()
+        self._profiles = {}
+        self._sampler = None
+
+    def _sample(self):
+        """Sampler thread; exits once no stage is open and is restarted by the next one."""
+        while True:
+            time.sleep(self.sample_interval)
+            rss = current_rss()
+            with self._lock:
+                if not self._open:
+                    self._sampler = None
+                    return
+                for span in self._open.values():
+                    span["peak"] = max(span["peak"], rss)
+
+    def _start_profile(self, name):
+        """A cProfile.Profile for this span in the current thread, or None."""
+        if self.profile_dir is None or getattr(self._profiling, "active", False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (an outer cProfile run, or another thread's span on 3.12+) is active
+            return None
+        self._profiling.active = True
+        return profile
+
+    def _finish_profile(self, profile, name):
+        profile.disable()
+        self._profiling.active = False
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            stats = self._profiles.get(name)
+            if stats is None:
+                stats = self._profiles[name] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            stats.dump_stats(str(self.profile_dir / f"{name}.prof"))
+
+    @contextmanager
+    def stage(self, name):
+        rss = current_rss()
+        with self._lock:
+            span_id = self._next_span
+            self._next_span += 1
+            span = self._open[span_id] = {"peak": rss or 0}
+            if self._sampler is None and rss is not None:
+                self._sampler = threading.Thread(target=self._sample, daemon=True)
+                self._sampler.start()
+        profile = self._start_profile(name)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            end, cpu = time.perf_counter(), time.thread_time() - cpu
+            rss_end = current_rss()
+            with self._lock:
+                del self._open[span_id]
+                peak = max(span["peak"], rss_end or 0)
+                entry = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_bytes": None})
+                entry["calls"] += 1
+                entry["seconds"] += end - wall
+                entry["cpu_seconds"] += cpu
+                if rss is not None:
+                    entry["peak_rss_bytes"] = max(entry["peak_rss_bytes"] or 0, peak)
+                self.events.append({
+                    "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                    "ts": (wall - self._start) * 1e6, "dur": (end - wall) * 1e6,
+                })
+            if profile is not None:
+                self._finish_profile(profile, name)
+
+    def summary(self):
+        """Stage table for metadata.json: seconds are summed over calls (and threads)."""
+        with self._lock:
+            stages = {name: dict(entry, seconds=round(entry["seconds"], 4), cpu_seconds=round(entry["cpu_seconds"], 4))
+                      for name, entry in self.stages.items()}
+        return {
+            "stages": stages,
+            "total_seconds": round(time.perf_counter() - self._start, 4),
+            "max_rss_bytes": max_rss(),
+            "profile_dir": str(self.profile_dir) if self.profile_dir else None,
+        }
+
+    def write_chrome_trace(self, path):
+        with self._lock:
+            events = list(self.events)
+        events.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "image_to_3d"}})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def print_table(self):
+        print(f"{'stage':<18} {'calls':>5} {'seconds':>9} {'cpu s':>9} {'peak MiB':>9}")
+        for name, entry in self.stages.items():
+            peak = entry["peak_rss_bytes"]
+            peak = f"{peak / 1024 ** 2:.1f}" if peak else "-"
+            print(f"{name:<18} {entry['calls']:>5} {entry['seconds']:>9.3f} {entry['cpu_seconds']:>9.3f} {peak:>9}")
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the `colmap` executable, for testing colmap_reconstruction.py without
+COLMAP or a GPU. Understands the subcommands the pipeline runs and writes
+small placeholder outputs where COLMAP would: a database, sparse and dense
+workspaces, a fused point cloud (a coloured sphere, binary PLY like COLMAP's) and a mesh
+(a UV sphere, ASCII PLY). Every call is echoed, and also appended to $STUB_COLMAP_LOG if set.
+Environment:
+    STUB_COLMAP_FAIL=poisson_mesher   comma-separated subcommands that exit with status 1
+    STUB_COLMAP_SECONDS=0.5           sleep per call, to exercise concurrency
+Run:
+    python colmap_reconstruction.py images/roach --colmap ./stub_colmap.py
+"""
+
+import os
+import sys
+import math
+import struct
+import time
+from pathlib import Path
+
+def parse_options(args):
+    options = {}
+    for key, value in zip(args[::2], args[1::2]):
+        options[key.lstrip("-")] = value
+    return options
+
+def sphere_points(n=2000, radius=1.0):
+    golden = math.pi * (3 - math.sqrt(5))
+    for i in range(n):
+        y = 1 - 2 * (i + 0.5) / n
+        r = math.sqrt(1 - y * y)
+        yield radius * r * math.cos(golden * i), radius * y, radius * r * math.sin(golden * i)
+
+def write_point_cloud(path, n=2000):
+    """Binary PLY laid out like COLMAP's fused.ply: xyz, normals, rgb."""
+    points = list(sphere_points(n))
+    with open(path, "wb") as f:
+        f.write((f"ply\nformat binary_little_endian 1.0\nelement vertex {len(points)}\n"
+                 "property float x\nproperty float y\nproperty float z\n"
+                 "property float nx\nproperty float ny\nproperty float nz\n"
+                 "property uchar red\nproperty uchar green\nproperty uchar blue\nend_header\n").encode("ascii"))
+        for x, y, z in points:
+            f.write(struct.pack("<6f3B", x, y, z, x, y, z, int(127 + 127 * x), int(127 + 127 * y), 80))
+
+def write_mesh(path, rings=24, segments=48):
+    vertices = [(0.0, 1.0, 0.0)]
+    for i in range(1, rings):
+        phi = math.pi * i / rings
+        for j in range(segments):
+            theta = 2 * math.pi * j / segments
+            vertices.append((math.sin(phi) * math.cos(theta), math.cos(phi), math.sin(phi) * math.sin(theta)))
+    vertices.append((0.0, -1.0, 0.0))
+    bottom = len(vertices) - 1
+    ring = lambda i, j: 1 + (i - 1) * segments + j % segments
+    faces = [(0, ring(1, j + 1), ring(1, j)) for j in range(segments)]
+    for i in range(1, rings - 1):
+        for j in range(segments):
+            faces.append((ring(i, j), ring(i, j + 1), ring(i + 1, j + 1)))
+            faces.append((ring(i, j), ring(i + 1, j + 1), ring(i + 1, j)))
+    faces += [(bottom, ring(rings - 1, j), ring(rings - 1, j + 1)) for j in range(segments)]
+    with open(path, "w") as f:
+        f.write(f"ply\nformat ascii 1.0\nelement vertex {len(vertices)}\n"
+                "property float x\nproperty float y\nproperty float z\n"
+                f"element face {len(faces)}\nproperty list uchar int vertex_indices\nend_header\n")
+        for v in vertices:
+            f.write("%.6f %.6f %.6f\n" % v)
+        for face in faces:
+            f.write("3 %d %d %d\n" % face)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        print("usage: stub_colmap.py <command> [options]", file=sys.stderr)
+        return 1
+    command, options = argv[0], parse_options(argv[1:])
+    print(f"stub colmap {' '.join(argv)}")
+    if os.environ.get("STUB_COLMAP_LOG"):
+        with open(os.environ["STUB_COLMAP_LOG"], "a") as f:
+            f.write(" ".join(argv) + "\n")
+    time.sleep(float(os.environ.get("STUB_COLMAP_SECONDS", "0")))
+    if command in os.environ.get("STUB_COLMAP_FAIL", "").split(","):
+        print(f"stub colmap: {command} failed (STUB_COLMAP_FAIL)", file=sys.stderr)
+        return 1
+
+    if command in ("feature_extractor", "exhaustive_matcher", "sequential_matcher", "matches_importer"):
+        with open(options["database_path"], "a") as f:
+            f.write(f"{command}\n")
+    elif command == "mapper":
+        output = Path(options["output_path"])
+        if not output.is_dir():
+            print(f"stub colmap: {output} does not exist", file=sys.stderr)
+            return 1
+        (output / "0").mkdir(exist_ok=True)
+        for name in ("cameras.bin", "images.bin", "points3D.bin"):
+            (output / "0" / name).write_bytes(b"stub")
+    elif command == "image_undistorter":
+        output = Path(options["output_path"])
+        for sub in ("images", "sparse", "stereo"):
+            (output / sub).mkdir(parents=True, exist_ok=True)
+        for image in sorted(Path(options["image_path"]).iterdir()):
+            if image.is_file():
+                (output / "images" / image.name).write_bytes(image.read_bytes())
+        (output / "sparse" / "cameras.bin").write_bytes(b"stub")
+        (output / "stereo" / "patch-match.cfg").write_text("")
+    elif command == "patch_match_stereo":
+        depth_maps = Path(options["workspace_path"]) / "stereo" / "depth_maps"
+        depth_maps.mkdir(parents=True, exist_ok=True)
+        for image in sorted((Path(options["workspace_path"]) / "images").iterdir()):
+            (depth_maps / f"{image.name}.geometric.bin").write_bytes(b"stub")
+    elif command == "stereo_fusion":
+        write_point_cloud(options["output_path"])
+    elif command == "poisson_mesher":
+        write_mesh(options["output_path"])
+    else:
+        print(f"stub colmap: unknown command {command}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Stand-in for `meshroom_batch`, for testing meshroom_reconstruction.py without
+Meshroom. Prints node headers and chunk lines the way Meshroom's photogrammetry
+pipeline does, with filler log lines in between, and writes a textured-mesh
+placeholder (an OBJ sphere) to the output directory.
+Environment:
+    STUB_MESHROOM_FAIL=DepthMap      node that fails with a traceback and exit status 1
+    STUB_MESHROOM_SECONDS=0.2        sleep per node
+    STUB_MESHROOM_LINES=1000         filler lines per node, to exercise log streaming
+Run:
+    python meshroom_reconstruction.py images/roach --meshroom-exe ./stub_meshroom.py
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+from pathlib import Path
+
+NODES = ["CameraInit", "FeatureExtraction", "ImageMatching", "FeatureMatching", "StructureFromMotion",
+         "PrepareDenseScene", "DepthMap", "DepthMapFilter", "Meshing", "MeshFiltering", "Texturing"]
+CHUNKED = {"FeatureExtraction": 3, "DepthMap": 4, "DepthMapFilter": 2}
+
+def write_obj(path, rings=16, segments=32):
+    with open(path, "w") as f:
+        f.write("# stub_meshroom texturedMesh\n")
+        for i in range(rings + 1):
+            phi = math.pi * i / rings
+            for j in range(segments):
+                theta = 2 * math.pi * j / segments
+                f.write(f"v {math.sin(phi) * math.cos(theta):.6f} {math.cos(phi):.6f} {math.sin(phi) * math.sin(theta):.6f}\n")
+        for i in range(rings):
+            for j in range(segments):
+                a = i * segments + j + 1
+                b = i * segments + (j + 1) % segments + 1
+                f.write(f"f {a} {b} {b + segments}\nf {a} {b + segments} {a + segments}\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stub meshroom_batch")
+    parser.add_argument("--input")
+    parser.add_argument("--output")
+    parser.add_argument("--pipeline")
+    parser.add_argument("--save")
+    args = parser.parse_args(argv)
+
+    fail = os.environ.get("STUB_MESHROOM_FAIL")
+    seconds = float(os.environ.get("STUB_MESHROOM_SECONDS", "0"))
+    lines = int(os.environ.get("STUB_MESHROOM_LINES", "5"))
+    print(f"Nodes to execute:  {[f'{n}_1' for n in NODES]}", flush=True)
+    for index, node in enumerate(NODES, start=1):
+        print(f"\n[{index}/{len(NODES)}] {node}", flush=True)
+        chunks = CHUNKED.get(node, 1)
+        for chunk in range(chunks):
+            if chunks > 1:
+                print(f" - process chunk {chunk + 1}/{chunks}", flush=True)
+            for i in range(lines // chunks):
+                print(f"[{node}] stub log line {i}")
+            time.sleep(seconds / chunks)
+        if node == fail:
+            print("Traceback (most recent call last):")
+            print(f'RuntimeError: Error on node "{node}_1"', flush=True)
+            return 1
+    if args.output:
+        Path(args.output).mkdir(parents=True, exist_ok=True)
+        write_obj(Path(args.output) / "texturedMesh.obj")
+    if args.save:
+        Path(args.save).write_text("{}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
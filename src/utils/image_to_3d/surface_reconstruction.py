@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+KD-tree based surface reconstruction for dense point clouds.
+Normals come from PCA over each point's k nearest neighbours (scipy cKDTree) and
+are oriented away from the cloud centroid. The surface is the zero level set of
+a signed distance built from those oriented points (Hoppe et al. 1992): each grid
+voxel near the cloud takes the mean signed plane distance to its nearest points,
+and marching cubes extracts the mesh. Only voxels in a narrow band around the
+points are evaluated, so cost grows with surface area rather than volume and
+100k+ point clouds mesh in seconds. Triangle filtering is fully vectorized.
+Dependencies:
+    pip install scipy scikit-image
+"""
+
+import numpy as np
+
+def estimate_normals(points, k=16, tree=None, workers=-1):
+    """Unit normals from the smallest principal axis of each point's k-neighbourhood.
+    workers is the KD-tree query thread count (-1: all cores)."""
+    from scipy.spatial import cKDTree
+
+    points = np.asarray(points, dtype=np.float64)
+    k = min(k, len(points))
+    tree = tree or cKDTree(points)
+    _, idx = tree.query(points, k=k, workers=workers)
+    neighbours = points[idx] - points[idx].mean(axis=1, keepdims=True)
+    cov = np.einsum("nki,nkj->nij", neighbours, neighbours)
+    _, eigvecs = np.linalg.eigh(cov)  # eigenvalues ascending
+    return eigvecs[:, :, 0]
+
+def orient_normals(points, normals, center=None):
+    """Flip normals to point away from center (default: the cloud centroid)."""
+    center = np.mean(points, axis=0) if center is None else center
+    flip = np.einsum("ij,ij->i", points - center, normals) < 0
+    normals = normals.copy()
+    normals[flip] *= -1
+    return normals
+
+def filter_triangles(vertices, faces, min_area=1e-12, max_edge=None):
+    """Drop degenerate triangles (area <= min_area) and, if given, any with an edge
+    longer than max_edge. Vectorized over all faces; returns the kept faces."""
+    faces = np.asarray(faces)
+    if len(faces) == 0:
+        return faces
+    tri = np.asarray(vertices)[faces]
+    e0 = tri[:, 1] - tri[:, 0]
+    e1 = tri[:, 2] - tri[:, 0]
+    area = 0.5 * np.linalg.norm(np.cross(e0, e1), axis=1)
+    keep = area > min_area
+    if max_edge is not None:
+        e2 = tri[:, 2] - tri[:, 1]
+        longest = np.sqrt(np.max(np.stack([(e0 ** 2).sum(1), (e1 ** 2).sum(1), (e2 ** 2).sum(1)]), axis=0))
+        keep &= longest <= max_edge
+    return faces[keep]
+
+def reconstruct_surface(points, colors=None, resolution=128, k=8, normal_k=16, band=2.5, workers=-1):
+    """Mesh an unorganized point cloud; returns (vertices, faces, vertex_colors_or_None).
+
+    Args:
+        resolution: Grid cells along the longest bounding-box side
+        k: Neighbours averaged for each voxel's signed distance
+        normal_k: Neighbours used for normal estimation
+        band: Voxels further than band * voxel size from every point are left
+            unevaluated, which also stops the surface bridging large gaps
+        workers: Threads for the KD-tree queries (-1: all cores)
+    """
+    from scipy import ndimage
+    from scipy.spatial import cKDTree
+    from skimage.measure import marching_cubes
+
+    points = np.asarray(points, dtype=np.float64)
+    empty = (np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64), None)
+    if len(points) < 4:
+        return empty
+
+    tree = cKDTree(points)
+    normals = orient_normals(points, estimate_normals(points, normal_k, tree, workers))
+
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    voxel = float((hi - lo).max()) / resolution
+    if voxel <= 0:
+        return empty
+    pad = int(np.ceil(band)) + 1
+    origin = lo - pad * voxel
+    shape = tuple(np.ceil((hi - lo) / voxel).astype(int) + 2 * pad + 1)
+
+    # Narrow band: voxels holding points, dilated by the band width
+    occupied = np.zeros(shape, dtype=bool)
+    cells = np.floor((points - origin) / voxel).astype(int)
+    occupied[cells[:, 0], cells[:, 1], cells[:, 2]] = True
+    structure = ndimage.generate_binary_structure(3, 3)
+    in_band = ndimage.binary_dilation(occupied, structure, iterations=int(np.ceil(band)))
+
+    band_idx = np.argwhere(in_band)
+    centres = origin + (band_idx + 0.5) * voxel
+    k = min(k, len(points))
+    dist, nearest = tree.query(centres, k=k, workers=workers)
+    if k == 1:
+        dist, nearest = dist[:, None], nearest[:, None]
+    offsets = centres[:, None, :] - points[nearest]
+    signed = np.einsum("nki,nki->nk", offsets, normals[nearest]).mean(axis=1)
+
+    sdf = np.full(shape, voxel * band, dtype=np.float32)
+    sdf[band_idx[:, 0], band_idx[:, 1], band_idx[:, 2]] = signed
+    valid = np.zeros(shape, dtype=bool)
+    valid[band_idx[:, 0], band_idx[:, 1], band_idx[:, 2]] = dist[:, 0] <= band * voxel
+    if not valid.any() or sdf[valid].min() >= 0 or sdf[valid].max() <= 0:
+        return empty
+
+    verts, faces, _, _ = marching_cubes(sdf, level=0.0, mask=valid)
+    vertices = origin + (verts + 0.5) * voxel
+    faces = filter_triangles(vertices, faces, min_area=(voxel ** 2) * 1e-6, max_edge=3 * voxel)
+
+    vertex_colors = None
+    if colors is not None and len(vertices):
+        _, vertex_nearest = tree.query(vertices, k=1, workers=workers)
+        vertex_colors = np.asarray(colors)[vertex_nearest]
+    return vertices, faces, vertex_colors
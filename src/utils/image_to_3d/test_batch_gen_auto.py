@@ -0,0 +1,51 @@
+"""
+The file layout batch_gen_auto.expand_matrix writes must give every generated view
+the camera pose images_to_3d uses for it.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import json
+import numpy as np
+from pathlib import Path
+from batch_gen_auto import DEFAULT_CONFIG, expand_matrix
+from image_to_3d_trimesh import VIEW_ORDER, find_images, get_camera_pose, image_views
+
+def expected_view(config_view):
+    name = config_view.replace("_", "-")
+    return name if name in VIEW_ORDER else "close-up"
+
+def test_generated_files_get_their_view_pose(tmp_path):
+    views = json.loads(DEFAULT_CONFIG.read_text())["views"]
+    (tmp_path / "ref.png").write_bytes(b"reference")
+    config = {
+        "root": tmp_path,
+        "prompt_template": "{description}, {view}",
+        "views": views,
+        "creatures": {
+            "roach": {"reference": "ref.png"},
+            "beetle": {"reference": "ref.png", "images_per_view": 2, "params": {"seed": 7}},
+        },
+    }
+    jobs, output_dir = expand_matrix(config)
+
+    expected = {}
+    for creature, count in (("roach", 1), ("beetle", 2)):
+        for view in views:
+            for _ in range(count):
+                expected[len(expected)] = (creature, view)
+    assert len(jobs) == len(expected)
+    wanted = {}
+    for index, (path, _) in enumerate(jobs):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_bytes(b"")
+        wanted[Path(path).resolve()] = expected_view(expected[index][1])
+
+    for creature in ("roach", "beetle"):
+        # images_to_3d sees the files in find_images order, not generation order
+        files = find_images(output_dir / creature)
+        for path, view in zip(files, image_views(files)):
+            assert view == wanted[path.resolve()], path.name
+            pose, want = get_camera_pose(view), get_camera_pose(wanted[path.resolve()])
+            assert np.array_equal(pose["position"], want["position"])
+            assert np.array_equal(pose["rotation"], want["rotation"])
@@ -0,0 +1,87 @@
+"""
+COLMAP stage checkpoints, run against stub_colmap.py: a finished reconstruction
+reruns nothing, a missing output reruns only its stage and those after it, and a
+failing set reports its own error without stopping the others.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import shutil
+import pytest
+from pathlib import Path
+from colmap_reconstruction import RING_VIEWS, run_colmap_reconstruction, run_many
+
+STUB = str(Path(__file__).resolve().with_name("stub_colmap.py"))
+STAGES = ["feature_extractor", "exhaustive_matcher", "mapper", "image_undistorter",
+          "patch_match_stereo", "stereo_fusion", "poisson_mesher"]
+
+@pytest.fixture
+def colmap_log(tmp_path, monkeypatch):
+    path = tmp_path / "colmap.log"
+    monkeypatch.setenv("STUB_COLMAP_LOG", str(path))
+    monkeypatch.delenv("STUB_COLMAP_FAIL", raising=False)
+    monkeypatch.delenv("STUB_COLMAP_SECONDS", raising=False)
+    return path
+
+def invoked(colmap_log):
+    """Subcommands the stub ran since the last call, in order."""
+    if not colmap_log.exists():
+        return []
+    commands = [line.split()[0] for line in colmap_log.read_text().splitlines()]
+    colmap_log.unlink()
+    return commands
+
+def image_set(root, name):
+    image_dir = root / name
+    image_dir.mkdir()
+    for view in RING_VIEWS:
+        (image_dir / f"{view}.png").write_bytes(f"{name} {view}".encode())
+    return image_dir
+
+def reconstruct(image_dir, output_dir, messages=None):
+    log = messages.append if messages is not None else (lambda message: None)
+    return run_colmap_reconstruction(image_dir, output_dir, colmap=STUB, log=log)
+
+def test_second_run_invokes_nothing(tmp_path, colmap_log):
+    image_dir, output_dir = image_set(tmp_path, "roach"), tmp_path / "out"
+    assert reconstruct(image_dir, output_dir)
+    assert invoked(colmap_log) == STAGES
+    assert (output_dir / "mesh.ply").is_file()
+
+    messages = []
+    assert reconstruct(image_dir, output_dir, messages)
+    assert invoked(colmap_log) == []
+    assert sum("already done, skipping" in m for m in messages) == len(STAGES)
+
+def test_missing_depth_maps_rerun_from_patch_match(tmp_path, colmap_log):
+    image_dir, output_dir = image_set(tmp_path, "roach"), tmp_path / "out"
+    assert reconstruct(image_dir, output_dir)
+    invoked(colmap_log)
+    shutil.rmtree(output_dir / "dense" / "stereo" / "depth_maps")
+
+    assert reconstruct(image_dir, output_dir)
+    assert invoked(colmap_log) == ["patch_match_stereo", "stereo_fusion", "poisson_mesher"]
+    # The undistorter's config beside the depth maps is kept
+    assert (output_dir / "dense" / "stereo" / "patch-match.cfg").is_file()
+    assert reconstruct(image_dir, output_dir)
+    assert invoked(colmap_log) == []
+
+def test_failing_set_reports_its_own_error(tmp_path, colmap_log, monkeypatch, capsys):
+    done, broken = image_set(tmp_path, "roach"), image_set(tmp_path, "beetle")
+    assert reconstruct(done, tmp_path / "out_roach")
+    invoked(colmap_log)
+
+    monkeypatch.setenv("STUB_COLMAP_FAIL", "mapper")
+    jobs = [(done, tmp_path / "out_roach"), (broken, tmp_path / "out_beetle")]
+    results = run_many(jobs, cpus=2, workers=2, colmap=STUB)
+    assert results == {done: True, broken: False}
+    assert invoked(colmap_log) == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    out = capsys.readouterr().out
+    assert "[beetle] ❌ COLMAP failed" in out
+    assert "[roach] ✅ COLMAP reconstruction completed successfully!" in out
+    assert not (tmp_path / "out_beetle" / "stages" / "mapper.json").exists()
+
+    # Once the tool works again the broken set resumes at the failed stage
+    monkeypatch.delenv("STUB_COLMAP_FAIL")
+    assert reconstruct(broken, tmp_path / "out_beetle")
+    assert invoked(colmap_log) == STAGES[2:]
@@ -0,0 +1,31 @@
+"""
+Quadric decimation must reach its triangle budget, and its face cleanup must drop
+exactly the degenerate and duplicate faces, however many vertices the mesh has.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import numpy as np
+import trimesh
+from decimation import _clean_faces, decimate_quadric
+
+def test_clean_faces_past_int64_key_range():
+    n = 2 ** 22  # n ** 3 overflows int64
+    rng = np.random.default_rng(0)
+    faces = np.unique(np.sort(rng.integers(0, n, (2000, 3)), axis=1), axis=0)
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2])]
+    # Distinct faces whose (a * n + b) * n + c keys differ by exactly 2 ** 64
+    collide = [[1, 2 ** 21, 2 ** 21 + 1], [1 + 2 ** 20, 2 ** 21, 2 ** 21 + 1]]
+    faces = np.unique(np.concatenate([faces, collide]), axis=0)
+    # Every face again with its vertices rotated, plus degenerate faces
+    messy = np.concatenate([faces, np.roll(faces, 1, axis=1), [[n - 1, n - 1, 0], [5, 7, 5]]])
+    cleaned = _clean_faces(messy, n)
+    assert len(cleaned) == len(faces)
+    assert np.array_equal(np.unique(np.sort(cleaned, axis=1), axis=0), faces)
+
+def test_decimate_quadric_reaches_budget():
+    sphere = trimesh.creation.icosphere(subdivisions=4)
+    v, f, _, stats = decimate_quadric(sphere.vertices, sphere.faces, 500)
+    assert len(f) <= 500 * 1.1
+    assert stats["faces"] == len(f)
+    assert f.max() < len(v)
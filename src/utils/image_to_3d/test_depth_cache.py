@@ -0,0 +1,59 @@
+"""
+DepthCache must stay under its size cap, evicting least recently used entries
+down to EVICT_TO of it, and count hits and misses exactly under concurrent reads.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from depth_cache import EVICT_TO, DepthCache
+
+def depth(value):
+    return np.full((32, 32), float(value))
+
+def put_aged(cache, key, value, age):
+    cache.put(key, depth(value))
+    t = 1_000_000 + age
+    os.utime(cache._path(key), (t, t))
+
+def test_size_cap_evicts_least_recently_used_down_to_evict_to(tmp_path):
+    filler = DepthCache(tmp_path, max_bytes=None)
+    for i in range(10):
+        put_aged(filler, f"k{i}", i, i)
+    sizes = {p.stem: size for p, size, _ in filler.entries()}
+    max_bytes = sum(sizes.values()) + min(sizes.values()) // 2
+    cache = DepthCache(tmp_path, max_bytes=max_bytes)
+
+    # Reading the oldest entry makes it the most recently used
+    assert np.array_equal(cache.get("k0"), depth(0))
+    put_aged(cache, "k10", 10, 10)
+
+    kept = {p.stem for p, _, _ in cache.entries()}
+    assert "k0" in kept and "k10" in kept
+    evicted = [f"k{i}" for i in range(1, 10) if f"k{i}" not in kept]
+    assert evicted == [f"k{i}" for i in range(1, len(evicted) + 1)]
+    assert cache.size_bytes() <= max_bytes * EVICT_TO
+    # ... and no more than needed to get there
+    assert cache.size_bytes() + sizes[evicted[-1]] > max_bytes * EVICT_TO
+    assert cache._total == cache.size_bytes()
+
+def test_reopened_cache_starts_from_the_size_on_disk(tmp_path):
+    cache = DepthCache(tmp_path, max_bytes=None)
+    for i in range(4):
+        cache.put(f"k{i}", depth(i))
+    max_bytes = cache.size_bytes()
+    reopened = DepthCache(tmp_path, max_bytes=max_bytes)
+    assert reopened._total == max_bytes
+    reopened.put("k4", depth(4))
+    assert reopened.size_bytes() <= max_bytes * EVICT_TO
+
+def test_hit_and_miss_counts_are_exact_across_threads(tmp_path):
+    cache = DepthCache(tmp_path, max_bytes=None)
+    cache.put("present", np.ones((8, 8)))
+    keys = ["present", "absent"] * 200
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(cache.get, keys))
+    assert cache.hits == 200
+    assert cache.misses == 200
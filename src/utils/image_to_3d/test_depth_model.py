@@ -0,0 +1,46 @@
+"""
+The stub depth model must load through load_midas_model without network access
+and give predict_depth output shaped like the transformed input, as float32.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import numpy as np
+import pytest
+import torch
+from depth_model import STUB_MODEL_TYPE, load_midas_model, optimize_model, predict_depth
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    def no_hub(*args, **kwargs):
+        raise AssertionError("torch.hub.load called for the stub model")
+    monkeypatch.setattr(torch.hub, "load", no_hub)
+
+def image(h, w):
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+
+@pytest.mark.parametrize("optimize, input_size, shape", [
+    ("none", None, (160, 256)),
+    ("script", None, (160, 256)),
+    ("none", 128, (64, 128)),
+])
+def test_stub_model_depth_shape_and_dtype(optimize, input_size, shape):
+    midas, transform = load_midas_model(STUB_MODEL_TYPE, optimize=optimize, input_size=input_size)
+    depth = predict_depth(image(120, 200), midas, transform)
+    assert depth.shape == shape
+    assert depth.dtype == np.float32
+    assert np.isfinite(depth).all()
+
+def test_stub_model_reads_brighter_pixels_as_closer():
+    midas, transform = load_midas_model(STUB_MODEL_TYPE)
+    img = np.zeros((64, 64, 3), dtype=np.uint8)
+    img[:, 32:] = 255
+    depth = predict_depth(img, midas, transform)
+    # Larger values are closer in MiDaS relative inverse depth
+    assert depth[:, -4:].mean() > depth[:, :4].mean()
+
+def test_int8_is_not_an_optimize_mode():
+    midas, _ = load_midas_model(STUB_MODEL_TYPE)
+    with pytest.raises(ValueError):
+        optimize_model(midas, "int8")
@@ -0,0 +1,20 @@
+"""
+write_optimized_glb must write a readable quantized GLB, and only spend the ACMR
+simulation when asked to.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import trimesh
+from glb_export import read_glb, write_optimized_glb
+
+def test_acmr_is_measured_only_on_request(tmp_path):
+    sphere = trimesh.creation.icosphere(subdivisions=3)
+    report = write_optimized_glb(sphere, tmp_path / "plain.glb")
+    assert "acmr_before" not in report["meshes"][0]
+    gltf, _ = read_glb((tmp_path / "plain.glb").read_bytes())
+    assert gltf["extensionsRequired"] == ["KHR_mesh_quantization"]
+
+    measured = write_optimized_glb(sphere, tmp_path / "measured.glb", measure_acmr=True)["meshes"][0]
+    assert measured["acmr_after"] < measured["acmr_before"]
+    assert (tmp_path / "plain.glb").read_bytes() == (tmp_path / "measured.glb").read_bytes()
@@ -0,0 +1,103 @@
+"""
+Meshroom runs against stub_meshroom.py: node timings come from its streamed
+output, the log rotates at max_bytes, a failing node is reported with the log
+tail, and the probed executable is cached without running `--help` again.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import os
+import json
+import shutil
+import pytest
+from pathlib import Path
+import meshroom_reconstruction
+from meshroom_reconstruction import MeshroomProgress, find_meshroom, run_meshroom_reconstruction, stream_process
+
+STUB = Path(__file__).resolve().with_name("stub_meshroom.py")
+NODES = ["CameraInit", "FeatureExtraction", "ImageMatching", "FeatureMatching", "StructureFromMotion",
+         "PrepareDenseScene", "DepthMap", "DepthMapFilter", "Meshing", "MeshFiltering", "Texturing"]
+
+@pytest.fixture(autouse=True)
+def stub_env(monkeypatch):
+    for name in ("STUB_MESHROOM_FAIL", "STUB_MESHROOM_SECONDS", "STUB_MESHROOM_LINES", "MESHROOM"):
+        monkeypatch.delenv(name, raising=False)
+
+def run(tmp_path):
+    image_dir = tmp_path / "roach"
+    image_dir.mkdir(exist_ok=True)
+    output_dir = tmp_path / "out"
+    ok = run_meshroom_reconstruction(image_dir, output_dir, meshroom_exe=STUB)
+    return ok, output_dir, json.loads((output_dir / "meshroom_timings.json").read_text())
+
+def test_node_timings_from_streamed_output(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MESHROOM_SECONDS", "0.05")
+    ok, output_dir, timings = run(tmp_path)
+    assert ok
+    assert timings["returncode"] == 0
+    assert timings["total_nodes"] == len(NODES)
+    assert [n["node"] for n in timings["nodes"]] == NODES
+    assert [n["index"] for n in timings["nodes"]] == list(range(1, len(NODES) + 1))
+    assert all(n["status"] == "done" and n["seconds"] >= 0.04 for n in timings["nodes"])
+    assert timings["seconds"] >= sum(n["seconds"] for n in timings["nodes"])
+    assert (output_dir / "texturedMesh.obj").is_file()
+
+def test_progress_reports_nodes_and_chunks():
+    ticks = iter(range(100))
+    messages = []
+    progress = MeshroomProgress(report=messages.append, clock=lambda: next(ticks))
+    for line in ["Nodes to execute:  ['A_1', 'B_1']", "", "[1/2] A", " - process chunk 1/2",
+                 " - process chunk 2/2", "noise", "[2/2] B"]:
+        progress.feed(line)
+    timings = progress.close(0)
+    assert messages == ["2 nodes to execute", "[1/2] A (0% done, 2s elapsed)", "    A chunk 1/2",
+                        "    A chunk 2/2", "[2/2] B (50% done, 5s elapsed)"]
+    assert [(n["node"], n["seconds"]) for n in timings["nodes"]] == [("A", 2), ("B", 2)]
+
+def test_log_rotates_at_max_bytes(tmp_path, monkeypatch):
+    monkeypatch.setenv("STUB_MESHROOM_LINES", "200")
+    log_path = tmp_path / "logs" / "meshroom.log"
+    returncode, tail = stream_process([str(STUB)], log_path, MeshroomProgress(report=lambda m: None),
+                                      max_bytes=4096, backups=2, tail_lines=5)
+    assert returncode == 0
+    logs = sorted(p.name for p in log_path.parent.iterdir())
+    assert logs == ["meshroom.log", "meshroom.log.1", "meshroom.log.2"]
+    assert all(p.stat().st_size <= 4096 for p in log_path.parent.iterdir())
+    assert tail == [f"[Texturing] stub log line {i}" for i in range(195, 200)]
+    assert log_path.read_text().rstrip("\n").endswith(tail[-1])
+
+def test_failed_node_status_and_tail(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("STUB_MESHROOM_FAIL", "DepthMap")
+    ok, _, timings = run(tmp_path)
+    assert not ok
+    assert timings["returncode"] == 1
+    assert [n["node"] for n in timings["nodes"]] == NODES[:NODES.index("DepthMap") + 1]
+    assert [n["status"] for n in timings["nodes"]][-2:] == ["done", "failed"]
+    out = capsys.readouterr().out
+    assert "Meshroom failed with exit code 1" in out
+    assert 'RuntimeError: Error on node "DepthMap_1"' in out.split("Last ")[-1]
+
+def test_find_meshroom_reuses_cached_probe(tmp_path, monkeypatch):
+    exe = tmp_path / "bin" / "meshroom_batch"
+    exe.parent.mkdir()
+    shutil.copy2(STUB, exe)
+    cache = tmp_path / "toolchain.json"
+    assert find_meshroom(cache, candidates=[str(tmp_path / "missing"), str(exe)]) == str(exe)
+    assert json.loads(cache.read_text())["exe"] == str(exe)
+
+    probes = []
+    real_run = meshroom_reconstruction.subprocess.run
+    def counting_run(cmd, *args, **kwargs):
+        probes.append(cmd)
+        return real_run(cmd, *args, **kwargs)
+    monkeypatch.setattr(meshroom_reconstruction.subprocess, "run", counting_run)
+    assert find_meshroom(cache, candidates=[str(exe)]) == str(exe)
+    assert probes == []
+
+    # A changed executable is probed again, as is any run with refresh
+    st = exe.stat()
+    os.utime(exe, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert find_meshroom(cache, candidates=[str(exe)]) == str(exe)
+    assert probes == [[str(exe), "--help"]]
+    assert find_meshroom(cache, refresh=True, candidates=[str(exe)]) == str(exe)
+    assert len(probes) == 2
@@ -0,0 +1,35 @@
+"""
+ply_reduce must give the same reduced cloud whatever the chunk size, and reject
+voxel sizes too small for its int64 voxel keys.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import numpy as np
+import pytest
+from ply_reduce import reduce_ply
+from stub_colmap import write_point_cloud
+
+@pytest.fixture
+def fused_ply(tmp_path):
+    path = tmp_path / "fused.ply"
+    write_point_cloud(path, n=2000)
+    return path
+
+def test_output_does_not_depend_on_chunk_size(fused_ply, tmp_path):
+    outputs = {}
+    for chunk_points in (300, 1_000_000):
+        output = tmp_path / f"reduced_{chunk_points}.ply"
+        cloud, stats = reduce_ply(fused_ply, output, resolution=32, chunk_points=chunk_points)
+        outputs[chunk_points] = (output.read_bytes(), stats["occupied_voxels"], len(cloud))
+    assert outputs[300] == outputs[1_000_000]
+    assert stats["input"]["points"] == 2000
+    assert 0 < outputs[300][2] < 2000
+
+def test_voxel_size_past_int64_grid_is_rejected(fused_ply, tmp_path):
+    with pytest.raises(ValueError, match="too small"):
+        reduce_ply(fused_ply, tmp_path / "reduced.ply", voxel_size=1e-9)
+    assert not (tmp_path / "reduced.ply").exists()
+    # The smallest size it suggests works
+    cloud, stats = reduce_ply(fused_ply, tmp_path / "reduced.ply", voxel_size=2e-6, nb_neighbors=0)
+    assert stats["occupied_voxels"] == 2000
@@ -0,0 +1,33 @@
+"""
+voxel_downsample must average each occupied voxel for any voxel size, including
+grids too fine to index linearly in int64.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import numpy as np
+from point_cloud import PointCloud, voxel_downsample
+
+def cloud(n=1000, extent=10.0):
+    rng = np.random.default_rng(0)
+    points = rng.random((n, 3)).astype(np.float32) * extent
+    colors = rng.integers(0, 256, (n, 3), dtype=np.uint8)
+    return PointCloud.from_arrays(points, colors)
+
+def test_voxel_downsample_merges_points_sharing_a_voxel():
+    c = cloud()
+    doubled = PointCloud.from_arrays(np.concatenate([c.points, c.points + 0.01]),
+                                     np.concatenate([c.colors, c.colors]))
+    out = voxel_downsample(doubled, 10.0 / 64)
+    assert 0 < len(out) < len(doubled)
+    assert np.allclose(out.points.mean(axis=0), doubled.points.mean(axis=0), atol=0.2)
+
+def test_voxel_downsample_with_a_grid_past_int64():
+    c = cloud()
+    # 1e7 cells per axis: 1e21 voxels, more than an int64 index can hold
+    out = voxel_downsample(c, 1e-6)
+    assert len(out) == len(c)
+    order = np.lexsort(c.points.T[::-1])
+    out_order = np.lexsort(out.points.T[::-1])
+    assert np.allclose(out.points[out_order], c.points[order])
+    assert np.array_equal(out.colors[out_order], c.colors[order])
@@ -0,0 +1,100 @@
+"""
+SDClient must retry failed generations with backoff against mock_sd_server and
+give up cleanly, and ImageStreamWriter must decode the same files however the
+response body is split into chunks.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import json
+import base64
+import asyncio
+import pytest
+from mock_sd_server import MockSDServer, make_png
+from sd_client import GenerationError, ImageStreamWriter, SDClient, _Retryable
+
+@pytest.fixture
+def server():
+    servers = []
+
+    def start(**options):
+        s = MockSDServer(**options)
+        s.serve_in_thread()
+        servers.append(s)
+        return s
+
+    yield start
+    for s in servers:
+        s.shutdown()
+        s.server_close()
+
+async def generate(url, jobs, **options):
+    async with SDClient(url, concurrency=2, backoff=0.001, max_backoff=0.01, **options) as client:
+        results = await asyncio.gather(*(client.img2img_to_files({"seed": i}, [path]) for i, path in enumerate(jobs)))
+        return client, results
+
+def test_failed_requests_are_retried_until_they_succeed(server, tmp_path):
+    s = server(error_rate=0.5, seed=3)
+    jobs = [tmp_path / f"view_{i}.png" for i in range(8)]
+    client, results = asyncio.run(generate(s.url, jobs, retries=20))
+    assert results == [[path] for path in jobs]
+    assert all(path.read_bytes() == make_png() for path in jobs)
+    assert s.stats["errors"] > 0
+    assert client.stats["retries"] == s.stats["errors"]
+    assert client.stats["requests"] == s.stats["requests"] == len(jobs) + s.stats["errors"]
+    assert client.stats["failures"] == 0
+    assert not list(tmp_path.glob(".*.part"))
+
+def test_retries_are_bounded(server, tmp_path):
+    s = server(error_rate=1.0)
+    with pytest.raises(GenerationError, match="giving up after 3 attempts"):
+        asyncio.run(generate(s.url, [tmp_path / "view.png"], retries=2))
+    assert s.stats["requests"] == 3
+    assert not list(tmp_path.iterdir())
+
+def test_client_errors_are_not_retried(server):
+    s = server()
+
+    async def post_unknown():
+        async with SDClient(s.url, backoff=0.001) as client:
+            await client.post("/sdapi/v1/unknown", {})
+
+    with pytest.raises(GenerationError, match="HTTP 404"):
+        asyncio.run(post_unknown())
+    assert s.stats["requests"] == 0  # the mock counts img2img requests only
+
+def escaped_body(images):
+    """An img2img response with every "/" escaped (as some JSON encoders do) and
+    escapes in the fields around the images."""
+    encoded = [base64.b64encode(data).decode("ascii") for data in images]
+    body = json.dumps({"para\"meters": {"prompt": "a \\ \"quoted\" roach"},
+                       "images": encoded, "info": "{\"seed\": [1, 2]}"})
+    return body.replace("/", "\\/").encode("ascii")
+
+def decode(chunks, tmp_path):
+    writer = ImageStreamWriter(lambda i: tmp_path / f"{i}.png")
+    for chunk in chunks:
+        writer.feed(chunk)
+    return [path.read_bytes() for path in writer.close()]
+
+def test_stream_writer_with_one_byte_chunks(tmp_path):
+    # Bytes whose base64 is full of "/" so escapes split base64 quads
+    images = [bytes([0xFF, 0xFF, 0xFF] * 7 + [1]), make_png(8), b"\xfb\xff"]
+    body = escaped_body(images)
+    assert b"\\/" in body
+    assert decode([body[i:i + 1] for i in range(len(body))], tmp_path) == images
+
+def test_stream_writer_at_every_split_point(tmp_path):
+    images = [bytes([0xFF, 0xFF, 0xFE] * 5 + [7, 9])]
+    body = escaped_body(images)
+    for split in range(len(body) + 1):
+        assert decode([body[:split], body[split:]], tmp_path) == images, split
+
+def test_truncated_stream_is_retryable(tmp_path):
+    body = escaped_body([make_png(8)])
+    writer = ImageStreamWriter(lambda i: tmp_path / f"{i}.png")
+    writer.feed(body[:len(body) // 2])
+    with pytest.raises(_Retryable):
+        writer.close()
+    writer.discard()
+    assert not list(tmp_path.iterdir())
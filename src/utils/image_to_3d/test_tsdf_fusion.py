@@ -0,0 +1,36 @@
+"""
+The TSDF volume fixed by the first view must hold later views when their poses are
+known up front (or a bound is set), and count the samples it drops otherwise.
+Run:
+    python -m pytest src/utils/image_to_3d
+"""
+
+import numpy as np
+from tsdf_fusion import TSDFVolume
+
+NEAR = {"position": np.array([0.0, 0.0, 2.0]), "rotation": np.eye(3)}
+FAR = {"position": np.array([0.0, 0.0, 6.0]), "rotation": np.eye(3)}
+
+def depth():
+    return np.ones((32, 32), dtype=np.float32)
+
+def fuse(**options):
+    volume = TSDFVolume(resolution=32, **options)
+    volume.integrate(depth(), NEAR)
+    volume.integrate(depth(), FAR)
+    return volume.stats()
+
+def test_first_view_only_volume_counts_dropped_samples():
+    stats = fuse()
+    assert stats["samples_integrated"] == 2 * 16 * 16
+    # The far view's surface sits beyond the cube sized from the near view
+    assert stats["samples_outside"] == 16 * 16
+
+def test_volume_sized_from_every_pose_keeps_later_views():
+    stats = fuse(poses=[NEAR, FAR])
+    assert stats["samples_outside"] == 0
+
+def test_configured_bound():
+    stats = fuse(bound=10.0)
+    assert stats["samples_outside"] == 0
+    assert np.isclose(stats["voxel_size"], 20.0 / 32)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Truncated signed distance field (TSDF) fusion of multi-view depth maps.
+Each view is integrated into a sparse, block-hashed voxel grid as it arrives, so
+views can be streamed in and memory is bounded by the volume resolution rather
+than by views x image size. A mesh is extracted with marching cubes at the end.
+Camera conventions match image_to_3d_trimesh.py: fx = fy = depth width, principal
+point at the image centre, camera Y flipped, world = R @ p_cam + position, with
+poses from get_camera_pose.
+The volume is fixed when the first view arrives: a cube centred on the camera ring
+that encloses the first view's depth range seen from every pose passed in (or a
+configured bound). Surface samples that still fall outside are dropped and
+counted in stats() as samples_outside.
+Dependencies:
+    pip install scikit-image   # marching cubes for extract_mesh
+"""
+
+import numpy as np
+
+class TSDFVolume:
+    """Sparse TSDF volume of block_size^3 voxel blocks inside a fixed cubic grid.
+
+    Args:
+        resolution: Voxels along each side of the cubic volume
+        voxel_size: Voxel edge length; None derives it from bound
+        truncation: Truncation distance in world units (default: 4 voxels)
+        origin: Minimum corner of the volume; None centres it on the camera ring
+        bound: Half the side of the volume; None derives it from the first view
+        poses: Poses of every view to be integrated, used with the first view's
+            depths to size the volume (default: the first view's pose only)
+        step: Pixel stride when sampling depth maps to find touched blocks
+    """
+
+    def __init__(self, resolution=128, voxel_size=None, truncation=None, origin=None,
+                 bound=None, poses=None, block_size=8, step=2, max_weight=64.0):
+        self.block_size = block_size
+        self.blocks_per_axis = int(np.ceil(resolution / block_size))
+        self.resolution = self.blocks_per_axis * block_size
+        self.voxel_size = voxel_size
+        self.truncation = truncation
+        self.origin = None if origin is None else np.asarray(origin, dtype=np.float32)
+        self.bound = bound
+        self.poses = poses
+        self.step = step
+        self.max_weight = max_weight
+        self.views_integrated = 0
+        self.samples_integrated = 0
+        self.samples_outside = 0
+
+        n = block_size ** 3
+        local = np.stack(np.unravel_index(np.arange(n), (block_size,) * 3), axis=1)
+        self._local = local.astype(np.int64)
+        # Block hash: sorted linear block keys and the pool slot each one occupies
+        self._keys = np.empty(0, dtype=np.int64)
+        self._slots = np.empty(0, dtype=np.int64)
+        self._tsdf = np.empty((0, n), dtype=np.float32)
+        self._weight = np.empty((0, n), dtype=np.float32)
+        self._color = np.empty((0, n, 3), dtype=np.uint8)
+        self.num_blocks = 0
+
+    @property
+    def max_blocks(self):
+        return self.blocks_per_axis ** 3
+
+    @property
+    def nbytes(self):
+        return self._tsdf.nbytes + self._weight.nbytes + self._color.nbytes + self._keys.nbytes + self._slots.nbytes
+
+    def _init_geometry(self, cam_points, pose):
+        """Fix voxel size and origin from the first view: a cube centred on the
+        origin of the camera ring that encloses the first view's camera-space
+        points placed at every known pose, unless bound is set."""
+        radius = self.bound
+        if radius is None:
+            radius = 1.0
+            if len(cam_points):
+                radius = 1.1 * max(float(np.abs(cam_points @ p['rotation'].astype(np.float32).T
+                                                + p['position'].astype(np.float32)).max())
+                                   for p in (self.poses or [pose]))
+        if self.voxel_size is None:
+            self.voxel_size = 2.0 * radius / self.resolution
+        if self.origin is None:
+            half = self.voxel_size * self.resolution / 2.0
+            self.origin = np.full(3, -half, dtype=np.float32)
+        if self.truncation is None:
+            self.truncation = 4.0 * self.voxel_size
+
+    def _lookup(self, keys):
+        """Pool slots for already-allocated linear block keys."""
+        return self._slots[np.searchsorted(self._keys, keys)]
+
+    def _allocate(self, keys):
+        new_keys = np.setdiff1d(keys, self._keys, assume_unique=False)
+        if len(new_keys) == 0:
+            return
+        n = self.block_size ** 3
+        start = self.num_blocks
+        end = start + len(new_keys)
+        if end > len(self._tsdf):
+            capacity = max(end, 2 * len(self._tsdf))
+            for name, shape, fill in (("_tsdf", (n,), 1.0), ("_weight", (n,), 0.0), ("_color", (n, 3), 0)):
+                old = getattr(self, name)
+                grown = np.full((capacity,) + shape, fill, dtype=old.dtype)
+                grown[:len(old)] = old
+                setattr(self, name, grown)
+        keys = np.concatenate([self._keys, new_keys])
+        slots = np.concatenate([self._slots, np.arange(start, end, dtype=np.int64)])
+        order = np.argsort(keys)
+        self._keys, self._slots = keys[order], slots[order]
+        self.num_blocks = end
+
+    def _block_keys(self, world_points):
+        coords = np.floor((world_points - self.origin) / (self.voxel_size * self.block_size)).astype(np.int64)
+        inside = np.all((coords >= 0) & (coords < self.blocks_per_axis), axis=1)
+        return np.unique(np.ravel_multi_index(coords[inside].T, (self.blocks_per_axis,) * 3))
+
+    def integrate(self, depth, pose, img=None, mask=None, min_depth_ratio=0.1, chunk_blocks=512):
+        """Fuse one depth map seen from pose; returns the number of depth samples used."""
+        h, w = depth.shape
+        fx = fy = w
+        cx, cy = w / 2, h / 2
+        rotation = pose['rotation'].astype(np.float32)
+        position = pose['position'].astype(np.float32)
+        min_depth = float(np.max(depth)) * min_depth_ratio
+        valid_depth = depth > min_depth
+        if mask is not None:
+            valid_depth &= mask
+
+        # Surface samples, pushed +-truncation along each ray, mark the touched blocks
+        ys, xs = np.mgrid[0:h:self.step, 0:w:self.step]
+        keep = valid_depth[ys, xs]
+        ys, xs = ys[keep], xs[keep]
+        Z = depth[ys, xs].astype(np.float32)
+        cam = np.empty((len(Z), 3), dtype=np.float32)
+        cam[:, 0] = (xs - cx) * Z / fx
+        cam[:, 1] = -(ys - cy) * Z / fy
+        cam[:, 2] = Z
+        surface = cam @ rotation.T + position
+        if self.origin is None or self.voxel_size is None or self.truncation is None:
+            self._init_geometry(cam, pose)
+        upper = self.origin + self.voxel_size * self.resolution
+        self.samples_outside += int(np.count_nonzero(~np.all((surface >= self.origin) & (surface < upper), axis=1)))
+        self.samples_integrated += len(Z)
+        keys = [self._block_keys(surface)]
+        for offset in (-self.truncation, self.truncation):
+            scale = (1.0 + offset / Z)[:, None]
+            keys.append(self._block_keys((cam * scale) @ rotation.T + position))
+        keys = np.unique(np.concatenate(keys))
+        self._allocate(keys)
+        slots = self._lookup(keys)
+
+        if img is not None:
+            ih, iw = img.shape[:2]
+        bs = self.block_size
+        for start in range(0, len(keys), chunk_blocks):
+            chunk_keys = keys[start:start + chunk_blocks]
+            chunk_slots = slots[start:start + chunk_blocks]
+            block_coords = np.stack(np.unravel_index(chunk_keys, (self.blocks_per_axis,) * 3), axis=1)
+            voxel_idx = block_coords[:, None, :] * bs + self._local[None]
+            centres = self.origin + (voxel_idx.reshape(-1, 3) + 0.5).astype(np.float32) * self.voxel_size
+            # World -> camera: R^T (v - t), written for row vectors
+            p = (centres - position) @ rotation
+            z = p[:, 2]
+            in_front = z > 1e-6
+            z_safe = np.where(in_front, z, 1.0)
+            u = np.round(p[:, 0] * fx / z_safe + cx).astype(np.int64)
+            v = np.round(-p[:, 1] * fy / z_safe + cy).astype(np.int64)
+            visible = in_front & (u >= 0) & (u < w) & (v >= 0) & (v < h)
+            u = np.where(visible, u, 0)
+            v = np.where(visible, v, 0)
+            measured = depth[v, u]
+            visible &= valid_depth[v, u]
+            sdf = measured - z
+            update = visible & (sdf > -self.truncation)
+            if not update.any():
+                continue
+
+            flat = np.flatnonzero(update)
+            block_of = chunk_slots[flat // (bs ** 3)]
+            voxel_of = flat % (bs ** 3)
+            old_w = self._weight[block_of, voxel_of]
+            new_tsdf = np.clip(sdf[flat] / self.truncation, -1.0, 1.0)
+            self._tsdf[block_of, voxel_of] = (self._tsdf[block_of, voxel_of] * old_w + new_tsdf) / (old_w + 1.0)
+            if img is not None:
+                sample = img[v[flat] * ih // h, u[flat] * iw // w].astype(np.float32)
+                old_c = self._color[block_of, voxel_of].astype(np.float32)
+                blended = (old_c * old_w[:, None] + sample) / (old_w[:, None] + 1.0)
+                self._color[block_of, voxel_of] = np.clip(np.round(blended), 0, 255).astype(np.uint8)
+            self._weight[block_of, voxel_of] = np.minimum(old_w + 1.0, self.max_weight)
+
+        self.views_integrated += 1
+        return len(Z)
+
+    def _dense(self):
+        """Assemble allocated blocks into dense tsdf/weight/colour arrays over their bounding box."""
+        bs = self.block_size
+        coords = np.stack(np.unravel_index(self._keys, (self.blocks_per_axis,) * 3), axis=1)
+        lo = coords.min(axis=0)
+        shape = tuple((coords.max(axis=0) - lo + 1) * bs)
+        idx = ((coords - lo)[:, None, :] * bs + self._local[None]).reshape(-1, 3)
+        slots = self._slots
+        tsdf = np.ones(shape, dtype=np.float32)
+        weight = np.zeros(shape, dtype=np.float32)
+        color = np.zeros(shape + (3,), dtype=np.uint8)
+        tsdf[idx[:, 0], idx[:, 1], idx[:, 2]] = self._tsdf[slots].reshape(-1)
+        weight[idx[:, 0], idx[:, 1], idx[:, 2]] = self._weight[slots].reshape(-1)
+        color[idx[:, 0], idx[:, 1], idx[:, 2]] = self._color[slots].reshape(-1, 3)
+        return tsdf, weight, color, lo * bs
+
+    def extract_mesh(self):
+        """Marching-cubes the zero level set into a vertex-coloured trimesh.Trimesh."""
+        import trimesh
+        from skimage.measure import marching_cubes
+
+        if self.num_blocks == 0:
+            return trimesh.Trimesh()
+        tsdf, weight, color, offset = self._dense()
+        observed = weight > 0
+        if not observed.any() or tsdf[observed].min() > 0 or tsdf[observed].max() < 0:
+            return trimesh.Trimesh()
+        verts, faces, _, _ = marching_cubes(tsdf, level=0.0, mask=observed)
+        nearest = np.clip(np.round(verts).astype(np.int64), 0, np.array(tsdf.shape) - 1)
+        vertex_colors = color[nearest[:, 0], nearest[:, 1], nearest[:, 2]]
+        world = self.origin + (verts + offset + 0.5) * self.voxel_size
+        return trimesh.Trimesh(vertices=world, faces=faces, vertex_colors=vertex_colors)
+
+    def stats(self):
+        return {
+            "resolution": self.resolution,
+            "voxel_size": self.voxel_size,
+            "truncation": self.truncation,
+            "blocks": self.num_blocks,
+            "max_blocks": self.max_blocks,
+            "bytes": self.nbytes,
+            "views_integrated": self.views_integrated,
+            "samples_integrated": self.samples_integrated,
+            "samples_outside": self.samples_outside,
+        }